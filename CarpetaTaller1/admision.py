@@ -0,0 +1,143 @@
+import time
+import threading
+
+# ==========================================
+# CONTROL DE ADMISIÓN (coordinador + workers)
+# ==========================================
+#
+# Cada proceso acepta como máximo max_inflight solicitudes en proceso y
+# max_queue esperando turno. Lo que no entra se responde de inmediato
+#
+#   {"ok": false, "error": "overloaded", "retry_after": segundos}
+#
+# en vez de acumularse hasta que el cliente se canse de esperar.
+#
+# Plazo (deadline): el cliente puede mandar "deadline_ms", el tiempo que
+# está dispuesto a esperar. Cada salto lo pasa a un instante de su propio
+# reloj al recibir y al reenviar manda lo que queda, así el presupuesto
+# se achica en cada salto sin comparar relojes de máquinas distintas. Lo
+# que ya venció se descarta con {"ok": false, "error": "deadline_exceeded"}.
+
+OVERLOADED = "overloaded"
+DEADLINE_EXCEEDED = "deadline_exceeded"
+
+
+# Se venció el plazo mientras se esperaba a otro: no es culpa de ese otro
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class AdmissionControl:
+
+    def __init__(self, max_inflight, max_queue, retry_after=0.5):
+
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+
+        self.lock = threading.Lock()
+        self.admitted = 0
+        self.rejected = 0
+
+    # Ocupa un lugar (en proceso o en la cola); False si no hay
+    def try_admit(self):
+
+        with self.lock:
+
+            if self.admitted >= self.max_inflight + self.max_queue:
+                self.rejected += 1
+                return False
+
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.admitted -= 1
+
+    # Esperando turno (lo admitido que no entra en max_inflight)
+    def queued(self):
+        return max(0, self.admitted - self.max_inflight)
+
+    def overloaded(self, request_id=None):
+
+        response = {"ok": False, "error": OVERLOADED, "retry_after": self.retry_after}
+
+        if request_id is not None:
+            response["request_id"] = request_id
+
+        return response
+
+    def snapshot(self):
+
+        with self.lock:
+            return {
+                "max_inflight": self.max_inflight,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "queued": max(0, self.admitted - self.max_inflight),
+                "rejected": self.rejected
+            }
+
+
+# ==========================================
+# PLAZOS
+# ==========================================
+
+# Instante (time.monotonic) en que vence la solicitud; None si no trae plazo.
+# received_at es cuándo llegó a este salto.
+def deadline_from(payload, received_at):
+
+    budget = payload.get("deadline_ms")
+
+    if budget is None:
+        return None
+
+    try:
+        return received_at + float(budget) / 1000
+    except (TypeError, ValueError):
+        return None
+
+
+# Segundos que quedan (None = sin plazo)
+def remaining(deadline):
+
+    if deadline is None:
+        return None
+
+    return max(0.0, deadline - time.monotonic())
+
+
+def expired(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+
+# El mensaje para el siguiente salto, con el presupuesto que queda
+def with_budget(payload, deadline):
+
+    if deadline is None:
+        return payload
+
+    return dict(payload, deadline_ms=round(remaining(deadline) * 1000, 3))
+
+
+def deadline_exceeded(request_id=None):
+
+    response = {"ok": False, "error": DEADLINE_EXCEEDED}
+
+    if request_id is not None:
+        response["request_id"] = request_id
+
+    return response
+
+
+# Plazo de la solicitud que atiende este hilo (igual que la traza activa)
+_local = threading.local()
+
+
+def current_deadline():
+    return getattr(_local, "deadline", None)
+
+
+def set_deadline(deadline):
+    _local.deadline = deadline
@@ -0,0 +1,741 @@
+import os
+import math
+import time
+import random
+import asyncio
+import itertools
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from protocolo import encode_message, read_message_async, MAX_MESSAGE_SIZE
+from pool_conexiones import WorkerPool
+from balanceo_coordinadores import CoordinatorBalancer, parse_address
+
+# ==========================================
+# API DE CLIENTE (sin input(), para generar tráfico de verdad)
+# ==========================================
+#
+#   with QuadraticClient(["10.43.97.251:5000"]) as client:
+#       client.solve(1, -3, 2)                      # {"ok": True, "x1": 2.0, "x2": 1.0, ...}
+#       for result in client.solve_many(rows):      # rows: (a, b, c) o {"a", "b", "c"}
+#           ...
+#
+#   async with AsyncQuadraticClient(["10.43.97.251:5000"]) as client:
+#       await client.solve(1, -3, 2)
+#       async for result in client.solve_many(rows):
+#           ...
+#
+# Las conexiones con cada coordinador quedan abiertas y se reutilizan;
+# por cada una pueden ir varias solicitudes a la vez (cada una con su
+# request_id, el coordinador lo devuelve en la respuesta). solve_many
+# deja hasta "window" solicitudes en vuelo y entrega los resultados en
+# el orden de las filas; con batch=N agrupa N filas por solicitud "batch".
+# La ventana se achica sola cuando el coordinador responde "overloaded"
+# y vuelve a crecer de a poco con cada respuesta buena.
+#
+# Las filas se validan acá antes de salir (lo de la Prueba 6): texto,
+# vacíos, NaN/infinito y a = 0 no llegan a la red; su resultado es
+# {"ok": False, "error": ...} en su lugar, como los errores del
+# coordinador. El discriminante negativo no es un error de entrada, lo
+# responde el coordinador.
+#
+# Failover y saturación igual que client.request: si un coordinador no
+# responde se prueba el siguiente; si todos responden "overloaded" se
+# espera retry_after y se reintenta. En solve_many la fila rechazada
+# vuelve a la ventana con su espera y las demás siguen en vuelo.
+
+EPS = 1e-12
+
+# Solicitudes en vuelo por defecto en solve_many. Un coordinador con
+# los valores por defecto admite MAX_INFLIGHT + MAX_QUEUE = 32 a la vez
+# y lo comparten todos los clientes: con 16 un cliente solo no lo satura.
+WINDOW = 16
+
+# Máximo de filas por solicitud "batch" (MAX_BATCH del coordinador)
+MAX_BATCH = 100000
+
+NO_RESPONSE = "Sin respuesta del coordinador"
+
+
+class InvalidInput(ValueError):
+    pass
+
+
+# ==========================================
+# VALIDACIÓN
+# ==========================================
+
+def parse_number(name, value):
+
+    if isinstance(value, bool):
+        raise InvalidInput(f"{name} debe ser numérico")
+
+    if isinstance(value, str):
+        value = value.strip()
+        # "1,5" como se escribe acá; "1,5.2" sigue siendo inválido
+        if "," in value and "." not in value:
+            value = value.replace(",", ".", 1)
+
+    if value is None or value == "":
+        raise InvalidInput(f"{name} no puede estar vacío")
+
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise InvalidInput(f"{name} debe ser numérico (se recibió {value!r})") from None
+
+    if not math.isfinite(number):
+        raise InvalidInput(f"{name} debe ser un número finito")
+
+    return number
+
+
+# Devuelve (a, b, c) como float o lanza InvalidInput con el motivo
+def parse_coefficients(a, b, c):
+
+    a, b, c = parse_number("a", a), parse_number("b", b), parse_number("c", c)
+
+    if abs(a) < EPS:
+        raise InvalidInput("Valor inválido: a no puede ser 0")
+
+    return a, b, c
+
+
+# Una fila de entrada -> (a, b, c) validados. Una fila puede ser una
+# secuencia de tres valores, un dict con a, b, c, o directamente un
+# InvalidInput (la fila ya se sabe mala, p. ej. JSON roto en un archivo).
+def parse_row(row):
+
+    if isinstance(row, InvalidInput):
+        raise row
+
+    if isinstance(row, dict):
+        return parse_coefficients(row.get("a"), row.get("b"), row.get("c"))
+
+    if isinstance(row, (str, bytes)) or len(row) != 3:
+        raise InvalidInput("Se esperaban 3 valores: a, b, c")
+
+    return parse_coefficients(*row)
+
+
+def error_result(message):
+    return {"ok": False, "error": message}
+
+
+# ==========================================
+# TRABAJOS (compartidos por el cliente síncrono y el asyncio)
+# ==========================================
+#
+# Cada trabajo es (payload, finish): payload es lo que se manda (None si
+# no hay nada que mandar) y finish(respuesta) arma lo que se entrega.
+
+def row_jobs(rows, new_id, extra):
+
+    for row in rows:
+
+        try:
+            a, b, c = parse_row(row)
+        except InvalidInput as e:
+            yield None, (lambda _, message=str(e): error_result(message))
+            continue
+
+        payload = {"request_id": new_id(), "a": a, "b": b, "c": c}
+        payload.update(extra)
+
+        yield payload, (lambda response: response or error_result(NO_RESPONSE))
+
+
+# Agrupa las filas de a "size" por solicitud; finish devuelve la lista de
+# resultados del grupo, con los inválidos en su lugar
+def batch_jobs(rows, size, new_id, extra):
+
+    rows = iter(rows)
+
+    while True:
+
+        group = list(itertools.islice(rows, size))
+
+        if not group:
+            return
+
+        results = [None] * len(group)
+        positions, a, b, c = [], [], [], []
+
+        for i, row in enumerate(group):
+            try:
+                ai, bi, ci = parse_row(row)
+            except InvalidInput as e:
+                results[i] = error_result(str(e))
+                continue
+            positions.append(i)
+            a.append(ai)
+            b.append(bi)
+            c.append(ci)
+
+        if not positions:
+            yield None, (lambda _, results=results: results)
+            continue
+
+        payload = {"request_id": new_id(), "op": "batch", "a": a, "b": b, "c": c}
+        payload.update(extra)
+
+        yield payload, (lambda response, results=results, positions=positions:
+                        merge_batch(results, positions, response))
+
+
+def merge_batch(results, positions, response):
+
+    if response is None:
+        response = error_result(NO_RESPONSE)
+
+    answers = response.get("results") if response.get("ok") else None
+
+    for n, i in enumerate(positions):
+        results[i] = answers[n] if answers is not None else error_result(response.get("error"))
+
+    return results
+
+
+def make_jobs(rows, batch, new_id, extra):
+
+    if batch > MAX_BATCH:
+        raise ValueError(f"batch no puede pasar de {MAX_BATCH}")
+
+    if batch > 0:
+        return batch_jobs(rows, batch, new_id, extra)
+
+    return row_jobs(rows, new_id, extra)
+
+
+def _address_key(address):
+    return f"{address[0]}:{address[1]}"
+
+
+def retry_delay(overloaded):
+    return overloaded.get("retry_after", 0.5) * random.uniform(0.5, 1.5)
+
+
+# Ventana de solve_many: arranca en "size"; un "overloaded" la parte a la
+# mitad (mínimo 1) y cada respuesta buena la agranda en 1/ventana, hasta
+# volver a "size". Los rechazos de solicitudes que salieron antes del
+# último recorte son de la misma tanda y no la achican de nuevo.
+class AdaptiveWindow:
+
+    def __init__(self, size):
+        self.size = size
+        self.limit = float(size)
+        self.sent = 0
+        self.cut = 0
+
+    def allowed(self):
+        return max(1, int(self.limit))
+
+    # Numera cada envío, para saber de qué tanda es un rechazo
+    def send(self):
+        self.sent += 1
+        return self.sent
+
+    def overloaded(self, seq):
+
+        if seq > self.cut:
+            self.limit = max(1.0, self.limit / 2)
+            self.cut = self.sent
+
+    def ok(self):
+        self.limit = min(float(self.size), self.limit + 1 / self.limit)
+
+
+# ==========================================
+# CLIENTE SÍNCRONO
+# ==========================================
+
+# Una fila (o grupo) de solve_many en el cliente síncrono
+class SyncJob:
+
+    def __init__(self, payload, finish):
+
+        self.payload = payload
+        self.finish = finish
+        self.done = payload is None
+        self.response = None
+
+        self.call = None        # (dirección, inicio, PendingCall, envío) si está en vuelo
+        self.retry_at = None    # cuándo reintentar, si está esperando
+        self.tried = set()      # coordinadores probados en esta ronda
+        self.overloaded = None  # último "overloaded" de esta ronda
+        self.rounds = 0
+
+
+class QuadraticClient:
+
+    # coordinators: lista de (host, puerto) o "host:puerto"
+    # connections: conexiones máximas por coordinador
+    # timeout: segundos esperando cada respuesta
+    def __init__(self, coordinators, balance="hash", connections=4, timeout=30.0,
+                 connect_timeout=1.0, binary=False, retries=3):
+
+        self.timeout = timeout
+        self.retries = retries
+
+        self.pool = WorkerPool(parse_address, connections, connect_timeout, binary)
+        self.balancer = CoordinatorBalancer(coordinators, balance, connect_timeout, timeout,
+                                            transport=self._send)
+
+        self.prefix = f"cli-{os.getpid()}"
+        self.ids = itertools.count(1)
+
+    def new_id(self):
+        return f"{self.prefix}-{next(self.ids)}"
+
+    def _send(self, address, payload):
+        return self.pool.call(_address_key(address), payload, self.timeout)
+
+    # Una solicitud cualquiera con failover; None si nadie respondió
+    def request(self, payload):
+
+        payload = dict(payload)
+        payload.setdefault("request_id", self.new_id())
+
+        return self.balancer.request(payload, self.retries)
+
+    # extra: campos que se agregan a la solicitud (deadline_ms, trace)
+    def solve(self, a, b, c, **extra):
+
+        try:
+            a, b, c = parse_coefficients(a, b, c)
+        except InvalidInput as e:
+            return error_result(str(e))
+
+        payload = {"a": a, "b": b, "c": c}
+        payload.update(extra)
+
+        return self.request(payload) or error_result(NO_RESPONSE)
+
+    # Lote en una sola lista de resultados (en trozos de MAX_BATCH)
+    def solve_batch(self, a, b, c, **extra):
+        return list(self.solve_many(zip(a, b, c), window=4, batch=MAX_BATCH, **extra))
+
+    # Generador con un resultado por fila, en orden
+    def solve_many(self, rows, window=WINDOW, batch=0, **extra):
+
+        control = AdaptiveWindow(window)
+        jobs = make_jobs(rows, batch, self.new_id, extra)
+        pending = deque()
+        exhausted = False
+
+        while True:
+
+            in_flight = sum(job.call is not None for job in pending)
+            now = time.monotonic()
+
+            # Primero los reintentos que ya esperaron lo suyo, después filas nuevas
+            for job in pending:
+                if in_flight >= control.allowed():
+                    break
+                if job.retry_at is not None and job.retry_at <= now:
+                    in_flight += self._launch(job, control)
+
+            while not exhausted and len(pending) < window and in_flight < control.allowed():
+
+                entry = next(jobs, None)
+
+                if entry is None:
+                    exhausted = True
+                    break
+
+                job = SyncJob(*entry)
+                pending.append(job)
+
+                if not job.done:
+                    in_flight += self._launch(job, control)
+
+            while pending and pending[0].done:
+                job = pending.popleft()
+                result = job.finish(job.response)
+                yield from (result if batch > 0 else (result,))
+
+            if not pending:
+                if exhausted:
+                    return
+                continue
+
+            self._wait(pending, control)
+
+    # Manda la solicitud al primer coordinador de esta ronda que no se
+    # probó, sin esperar la respuesta. Devuelve 1 si quedó en vuelo.
+    def _launch(self, job, control):
+
+        candidates = self.balancer.candidates(job.payload)
+        address = next((a for a in candidates if a not in job.tried), candidates[0])
+
+        job.tried.add(address)
+        job.retry_at = None
+        started = self.balancer.begin(address)
+
+        try:
+            call = self.pool.start_call(_address_key(address), job.payload)
+        except (OSError, ValueError):
+            self.balancer.end(address, started, ok=False)
+            self._requeue(job)
+            return 0
+
+        job.call = (address, started, call, control.send())
+        return 1
+
+    # Espera a que llegue alguna respuesta, venza algún timeout o le toque
+    # a algún reintento, y procesa las respuestas que hayan llegado
+    def _wait(self, pending, control):
+
+        flying = [job for job in pending if job.call is not None]
+        waiting = [job.retry_at for job in pending if job.retry_at is not None]
+
+        wake = [job.call[1] + self.timeout for job in flying]
+        if waiting and len(flying) < control.allowed():
+            wake.append(min(waiting))
+
+        timeout = max(0.0, min(wake) - time.monotonic()) if wake else None
+
+        if flying:
+            wait([job.call[2].future for job in flying], timeout, return_when=FIRST_COMPLETED)
+        elif timeout:
+            time.sleep(timeout)
+
+        now = time.monotonic()
+
+        for job in flying:
+            if job.call[2].future.done() or now >= job.call[1] + self.timeout:
+                self._collect(job, control)
+
+    def _collect(self, job, control):
+
+        address, started, call, seq = job.call
+        job.call = None
+
+        try:
+            response = call.result(max(0.0, started + self.timeout - time.monotonic()))
+        except (OSError, ValueError):
+            self.balancer.end(address, started, ok=False)
+            self._requeue(job)
+            return
+
+        self.balancer.end(address, started, ok=True)
+
+        if response.get("error") == "overloaded":
+            control.overloaded(seq)
+            self._requeue(job, response)
+            return
+
+        control.ok()
+        job.response = response
+        job.done = True
+
+    # Igual que CoordinatorBalancer.request, pero sin bloquear: la fila
+    # sigue por el próximo coordinador sin probar; si todos fallaron se
+    # da por perdida y si todos estaban saturados se reintenta la ronda
+    # cuando pase retry_after
+    def _requeue(self, job, overloaded=None):
+
+        job.overloaded = overloaded or job.overloaded
+
+        if len(job.tried) < len(self.balancer.coordinators):
+            job.retry_at = time.monotonic()
+            return
+
+        if job.overloaded is None or job.rounds == self.retries:
+            job.response = job.overloaded
+            job.done = True
+            return
+
+        job.rounds += 1
+        job.tried = set()
+        job.retry_at = time.monotonic() + retry_delay(job.overloaded)
+        job.overloaded = None
+
+    def close(self):
+        self.pool.close_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ==========================================
+# CLIENTE ASYNCIO
+# ==========================================
+
+class AsyncConnection:
+
+    def __init__(self, reader, writer, binary):
+
+        self.reader = reader
+        self.writer = writer
+        self.binary = binary
+
+        self.pending = {}
+        self.closed = False
+
+        self.task = asyncio.ensure_future(self._read_loop())
+
+    @classmethod
+    async def open(cls, address, connect_timeout, binary):
+
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(address[0], address[1], limit=MAX_MESSAGE_SIZE),
+            connect_timeout
+        )
+
+        return cls(reader, writer, binary)
+
+    def in_flight(self):
+        return len(self.pending)
+
+    async def call(self, wire_id, payload, timeout):
+
+        if self.closed:
+            raise ConnectionError("Conexión con el coordinador cerrada")
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[wire_id] = future
+
+        try:
+            self.writer.write(encode_message(dict(payload, request_id=wire_id), self.binary))
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(wire_id, None)
+
+    async def _read_loop(self):
+
+        error = None
+
+        try:
+            while True:
+
+                msg, _ = await read_message_async(self.reader)
+
+                if msg is None:
+                    error = ConnectionError("El coordinador cerró la conexión")
+                    break
+
+                future = self.pending.pop(msg.get("request_id"), None)
+
+                if future is not None and not future.done():
+                    future.set_result(msg)
+
+        except Exception as e:
+            error = e
+
+        self.close(error)
+
+    def close(self, error=None):
+
+        self.closed = True
+        pending, self.pending = self.pending, {}
+
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error or ConnectionError("Conexión con el coordinador cerrada"))
+
+        self.writer.close()
+
+
+class AsyncQuadraticClient:
+
+    def __init__(self, coordinators, balance="hash", connections=4, timeout=30.0,
+                 connect_timeout=1.0, binary=False, retries=3):
+
+        self.connections = connections
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.binary = binary
+        self.retries = retries
+
+        # Solo para elegir el orden y llevar las estadísticas
+        self.balancer = CoordinatorBalancer(coordinators, balance, connect_timeout, timeout)
+
+        self.channels = {}
+        self.opening = {}
+        self.prefix = f"cli-{os.getpid()}"
+        self.ids = itertools.count(1)
+        self.seq = itertools.count(1)
+
+    def new_id(self):
+        return f"{self.prefix}-{next(self.ids)}"
+
+    # Misma elección que WorkerPool: la menos ocupada, o una nueva si
+    # todas tienen trabajo y quedan lugares. Las conexiones nuevas se
+    # abren de a una por coordinador (con su lock): mientras una se abre
+    # las demás corrutinas esperan y vuelven a mirar, así no se pasa de
+    # "connections" aunque muchas lleguen juntas.
+    async def _channel(self, address):
+
+        best = self._idle_channel(address)
+
+        if best is not None:
+            return best, False
+
+        async with self.opening.setdefault(address, asyncio.Lock()):
+
+            best = self._idle_channel(address)
+
+            if best is not None:
+                return best, False
+
+            channel = await AsyncConnection.open(address, self.connect_timeout, self.binary)
+            self.channels.setdefault(address, []).append(channel)
+
+        return channel, True
+
+    # La conexión a usar si no hace falta abrir otra, o None
+    def _idle_channel(self, address):
+
+        channels = [ch for ch in self.channels.get(address, []) if not ch.closed]
+        self.channels[address] = channels
+
+        if not channels:
+            return None
+
+        best = min(channels, key=lambda ch: ch.in_flight())
+
+        if best.in_flight() == 0 or len(channels) >= self.connections:
+            return best
+
+        return None
+
+    async def _send(self, address, payload):
+
+        wire_id = f"{payload.get('request_id')}#{next(self.seq)}"
+        channel, fresh = await self._channel(address)
+
+        try:
+            response = await channel.call(wire_id, payload, self.timeout)
+
+        except (ConnectionError, OSError) as e:
+            # Conexión reutilizada que el coordinador ya había cerrado
+            # (keep-alive vencido): una vez más por una nueva
+            if fresh or isinstance(e, TimeoutError):
+                raise
+
+            channel, _ = await self._channel(address)
+            response = await channel.call(wire_id, payload, self.timeout)
+
+        response["request_id"] = payload.get("request_id")
+        return response
+
+    # Una solicitud con failover; None si nadie respondió. control: la
+    # ventana de solve_many, para avisarle de los rechazos por saturación
+    async def request(self, payload, control=None):
+
+        payload = dict(payload)
+        payload.setdefault("request_id", self.new_id())
+
+        for attempt in range(self.retries + 1):
+
+            overloaded = None
+
+            for address in self.balancer.candidates(payload):
+
+                started = self.balancer.begin(address)
+                seq = control.send() if control else 0
+
+                try:
+                    response = await self._send(address, payload)
+                except (OSError, ValueError, asyncio.TimeoutError):
+                    self.balancer.end(address, started, ok=False)
+                    continue
+
+                self.balancer.end(address, started, ok=True)
+
+                if response.get("error") == "overloaded":
+                    if control:
+                        control.overloaded(seq)
+                    overloaded = response
+                    continue
+
+                if control:
+                    control.ok()
+                return response
+
+            if overloaded is None or attempt == self.retries:
+                return overloaded
+
+            await asyncio.sleep(retry_delay(overloaded))
+
+    async def solve(self, a, b, c, **extra):
+
+        try:
+            a, b, c = parse_coefficients(a, b, c)
+        except InvalidInput as e:
+            return error_result(str(e))
+
+        payload = {"a": a, "b": b, "c": c}
+        payload.update(extra)
+
+        return await self.request(payload) or error_result(NO_RESPONSE)
+
+    async def solve_batch(self, a, b, c, **extra):
+        return [result async for result in
+                self.solve_many(zip(a, b, c), window=4, batch=MAX_BATCH, **extra)]
+
+    # Generador asíncrono con un resultado por fila, en orden
+    async def solve_many(self, rows, window=WINDOW, batch=0, **extra):
+
+        control = AdaptiveWindow(window)
+        pending = deque()
+
+        async def nothing():
+            return None
+
+        try:
+            for payload, finish in make_jobs(rows, batch, self.new_id, extra):
+
+                # Con el coordinador saturado la ventana se achica: se
+                # espera a que termine alguna antes de mandar otra
+                while True:
+                    running = [task for task, _ in pending if not task.done()]
+                    if len(running) < control.allowed():
+                        break
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+                task = asyncio.ensure_future(
+                    self.request(payload, control) if payload is not None else nothing())
+                pending.append((task, finish))
+
+                while len(pending) >= window:
+                    task, finish = pending.popleft()
+                    result = finish(await task)
+                    for item in (result if batch > 0 else (result,)):
+                        yield item
+
+            while pending:
+                task, finish = pending.popleft()
+                result = finish(await task)
+                for item in (result if batch > 0 else (result,)):
+                    yield item
+
+        finally:
+            # Si el que consume corta antes, no quedan tareas colgadas
+            for task, _ in pending:
+                task.cancel()
+
+    async def close(self):
+
+        channels = [ch for chs in self.channels.values() for ch in chs]
+        self.channels = {}
+
+        for channel in channels:
+            channel.close()
+
+        for channel in channels:
+            try:
+                await channel.writer.wait_closed()
+            except OSError:
+                pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
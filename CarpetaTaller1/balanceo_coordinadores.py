@@ -0,0 +1,294 @@
+import sys
+import time
+import random
+import socket
+import bisect
+import hashlib
+import threading
+
+from protocolo import send_json, recv_json
+from cache_resultados import ResultCache
+
+# ==========================================
+# BALANCEO ENTRE COORDINADORES (lado cliente)
+# ==========================================
+#
+# Se pueden correr varios coordinadores contra los mismos workers (cada
+# uno con su cache, su pool y su registro de salud; no comparten nada).
+# El cliente tiene la lista y elige a cuál mandar cada solicitud:
+#
+#   hash    -> hashing consistente sobre (a, b, c): la misma ecuación va
+#              siempre al mismo coordinador y encuentra su resultado en
+#              la cache de ese coordinador. Si se agrega o se quita uno,
+#              solo cambia de dueño la parte del anillo que le tocaba.
+#   latency -> primero el de menor latencia promedio (EWMA), multiplicada
+#              por (en vuelo + 1) como la estrategia ewma de los workers
+#
+# Failover: si un coordinador no acepta la conexión o no responde, se
+# marca caído por unos segundos (cooldown) y la solicitud sigue con el
+# siguiente (en hash, el siguiente del anillo). Los caídos se dejan al
+# final, así si todos están caídos igual se prueban. Si uno responde
+# "overloaded" se pasa al siguiente sin marcarlo caído; solo cuando todos
+# están saturados se espera el retry_after que sugieren.
+
+# Puntos por coordinador en el anillo (más puntos = reparto más parejo)
+RING_REPLICAS = 64
+
+# Segundos que un coordinador que falló queda al final de la lista
+COOLDOWN = 2.0
+
+STRATEGIES = ("hash", "latency")
+
+
+# "host:puerto" -> (host, puerto)
+def parse_address(text, default_port=5000):
+
+    host, sep, port = text.strip().rpartition(":")
+
+    if not sep:
+        return text.strip(), default_port
+
+    return host, int(port)
+
+
+def _ring_hash(text):
+    return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "big")
+
+
+# Clave de la solicitud para el anillo: la misma normalización que usa la
+# cache del coordinador ("1" y 1.0 son la misma ecuación). Lotes y
+# operaciones sin a, b, c no tienen clave.
+def request_key(payload):
+
+    if payload.get("op") is not None:
+        return None
+
+    try:
+        key = ResultCache.key(payload.get("a"), payload.get("b"), payload.get("c"))
+    except (TypeError, ValueError):
+        # Entrada inválida: el coordinador la rechaza igual, da lo mismo cuál
+        key = (payload.get("a"), payload.get("b"), payload.get("c"))
+
+    return None if key is None else repr(key)
+
+
+class CoordinatorStats:
+
+    def __init__(self):
+        self.in_flight = 0
+        self.ewma = None
+        self.calls = 0
+        self.failures = 0
+        self.down_until = 0.0
+
+
+class CoordinatorBalancer:
+
+    # coordinators: lista de (host, puerto) o "host:puerto"
+    # transport(dirección, mensaje) -> respuesta: cómo se manda cada
+    # solicitud (por defecto, una conexión nueva por solicitud)
+    def __init__(self, coordinators, strategy="hash", connect_timeout=1.0,
+                 timeout=None, cooldown=COOLDOWN, replicas=RING_REPLICAS, alpha=0.2,
+                 transport=None):
+
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Estrategia desconocida: {strategy}")
+
+        self.coordinators = [parse_address(c) if isinstance(c, str) else tuple(c)
+                             for c in coordinators]
+
+        if not self.coordinators:
+            raise ValueError("Hace falta al menos un coordinador")
+
+        self.strategy = strategy
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.cooldown = cooldown
+        self.alpha = alpha
+        self.transport = transport or self.send_once
+
+        self.lock = threading.Lock()
+        self.stats = {address: CoordinatorStats() for address in self.coordinators}
+
+        self.ring = sorted(
+            (_ring_hash(f"{host}:{port}#{i}"), (host, port))
+            for host, port in self.coordinators
+            for i in range(replicas)
+        )
+        self.ring_keys = [point for point, _ in self.ring]
+
+    # ---- ORDEN DE PRUEBA ----
+
+    # Coordinadores en el orden en que se prueban para esta solicitud
+    def candidates(self, payload):
+
+        key = request_key(payload) if self.strategy == "hash" else None
+
+        if key is not None:
+            order = self._ring_order(key)
+        else:
+            order = self._latency_order()
+
+        now = time.monotonic()
+
+        with self.lock:
+            up = [a for a in order if self.stats[a].down_until <= now]
+            down = [a for a in order if self.stats[a].down_until > now]
+
+        return up + down
+
+    # Recorre el anillo desde la clave: dueño primero, después los siguientes
+    def _ring_order(self, key):
+
+        start = bisect.bisect(self.ring_keys, _ring_hash(key))
+        order = []
+
+        for i in range(len(self.ring)):
+            address = self.ring[(start + i) % len(self.ring)][1]
+            if address not in order:
+                order.append(address)
+                if len(order) == len(self.coordinators):
+                    break
+
+        return order
+
+    def _latency_order(self):
+
+        with self.lock:
+            # Sin muestras todavía: 0, así se prueba al menos una vez
+            scores = {
+                address: (s.ewma or 0.0) * (s.in_flight + 1)
+                for address, s in self.stats.items()
+            }
+
+        order = list(self.coordinators)
+        random.shuffle(order)   # desempate al azar entre iguales
+
+        return sorted(order, key=lambda address: scores[address])
+
+    # ---- ESTADÍSTICAS ----
+
+    def begin(self, address):
+
+        with self.lock:
+            self.stats[address].in_flight += 1
+
+        return time.monotonic()
+
+    # sample=False: funcionó pero el tiempo no es de una solicitud completa
+    def end(self, address, started, ok, sample=True):
+
+        elapsed = time.monotonic() - started
+
+        with self.lock:
+
+            s = self.stats[address]
+            s.in_flight -= 1
+            s.calls += 1
+
+            if ok:
+                if sample:
+                    s.ewma = elapsed if s.ewma is None else \
+                        self.alpha * elapsed + (1 - self.alpha) * s.ewma
+                s.down_until = 0.0
+            else:
+                s.failures += 1
+                s.down_until = time.monotonic() + self.cooldown
+
+    def snapshot(self):
+
+        now = time.monotonic()
+
+        with self.lock:
+            return {
+                f"{host}:{port}": {
+                    "in_flight": s.in_flight,
+                    "ewma_ms": None if s.ewma is None else round(s.ewma * 1000, 3),
+                    "calls": s.calls,
+                    "failures": s.failures,
+                    "down": s.down_until > now
+                }
+                for (host, port), s in self.stats.items()
+            }
+
+    # ---- LLAMADAS ----
+
+    # Abre la conexión con el primer coordinador que la acepte.
+    # Devuelve (socket, dirección); si ninguno acepta, el último error.
+    def connect(self, payload):
+
+        error = None
+
+        for address in self.candidates(payload):
+
+            started = self.begin(address)
+
+            try:
+                s = socket.create_connection(address, timeout=self.connect_timeout)
+            except OSError as e:
+                self.end(address, started, ok=False)
+                error = e
+                continue
+
+            self.end(address, started, ok=True, sample=False)
+            s.settimeout(self.timeout)
+            return s, address
+
+        raise error
+
+    # Una solicitud con failover. Devuelve la respuesta o None si ningún
+    # coordinador respondió. Si todos están saturados, espera retry_after
+    # (±50% al azar) y vuelve a empezar, hasta retries veces.
+    def request(self, payload, retries=3):
+
+        for attempt in range(retries + 1):
+
+            response, overloaded = self._request_round(payload)
+
+            if not overloaded or attempt == retries:
+                return response
+
+            delay = overloaded.get("retry_after", 0.5) * random.uniform(0.5, 1.5)
+            print(f"Coordinadores saturados, reintentando en {delay:.2f}s...", file=sys.stderr)
+            time.sleep(delay)
+
+    # Prueba cada candidato una vez. Devuelve (respuesta, None) o, si
+    # todos rechazaron por saturación, (última respuesta, esa respuesta).
+    def _request_round(self, payload):
+
+        overloaded = None
+
+        for address in self.candidates(payload):
+
+            started = self.begin(address)
+
+            try:
+                response = self.transport(address, payload)
+
+            except (OSError, ValueError) as e:
+                self.end(address, started, ok=False)
+                print(f"Coordinador {address[0]}:{address[1]} no respondió ({e}), probando otro...",
+                      file=sys.stderr)
+                continue
+
+            if response is None:
+                self.end(address, started, ok=False)
+                continue
+
+            self.end(address, started, ok=True)
+
+            if response.get("error") == "overloaded":
+                overloaded = response
+                continue
+
+            return response, None
+
+        return overloaded, overloaded
+
+    # Una solicitud por una conexión nueva (el transporte por defecto)
+    def send_once(self, address, payload):
+
+        with socket.create_connection(address, timeout=self.connect_timeout) as s:
+            s.settimeout(self.timeout)
+            send_json(s, payload)
+            return recv_json(s)
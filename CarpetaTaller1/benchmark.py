@@ -0,0 +1,497 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from protocolo import send_message, open_reader, read_message
+
+# ==========================================
+# BENCHMARK / GENERADOR DE CARGA
+# ==========================================
+#
+# Levanta el coordinador y tres workers en puertos de localhost, les
+# manda carga y al final imprime un JSON con throughput y percentiles
+# de latencia, para poder comparar corridas.
+#
+#   python3 benchmark.py --duration 10 --concurrency 8
+#   python3 benchmark.py --rate 500 --batch 100 --hit-ratio 0.5
+#   python3 benchmark.py --kill op3@3 --restart op3@6
+#   python3 benchmark.py --coordinator-args "--plan auto --routing ewma"
+#
+# Carga:
+#   lazo cerrado (por defecto): --concurrency clientes, cada uno manda
+#     la siguiente solicitud apenas recibe la respuesta
+#   lazo abierto (--rate N): llegan N solicitudes por segundo (Poisson)
+#     sin importar cuánto tarden; la latencia se mide desde el momento
+#     en que la solicitud debía salir (así una cola no se esconde).
+#     Si ya hay --max-outstanding en vuelo, la que llega se descarta y
+#     se cuenta en "dropped": el cliente no arma su propia cola.
+#
+# Ritmos del reporte:
+#   offered_rps    solicitudes que se quisieron mandar (incluye descartadas)
+#   completed_rps  las que tuvieron respuesta o error (cualquiera)
+#   throughput_rps solo las que salieron bien
+#
+# --hit-ratio: fracción de ecuaciones tomadas de un grupo chico que se
+# repite (aciertos de cache); el resto son ecuaciones nuevas.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+BASE_PORT = 7000
+WORKERS = ["op1", "op2", "op3"]
+
+# Ecuaciones del grupo que se repite
+HOT_KEYS = 256
+
+# Tiempo máximo esperando que todo responda antes de medir
+STARTUP_TIMEOUT = 15.0
+
+PERCENTILES = {"p50": 50, "p95": 95, "p99": 99, "p999": 99.9}
+
+
+# ==========================================
+# PROCESOS (coordinador + workers)
+# ==========================================
+
+class Cluster:
+
+    def __init__(self, base_port, coordinator_args, worker_args, log_dir):
+
+        self.coordinator = ("127.0.0.1", base_port)
+        self.ports = {op: base_port + i + 1 for i, op in enumerate(WORKERS)}
+        self.coordinator_args = coordinator_args
+        self.worker_args = worker_args
+        self.log_dir = log_dir
+        self.procs = {}
+
+    def _spawn(self, key, argv):
+
+        log = open(os.path.join(self.log_dir, f"{key}.log"), "ab")
+
+        self.procs[key] = subprocess.Popen(
+            [sys.executable, "-u"] + argv,
+            cwd=HERE,
+            stdout=log,
+            stderr=subprocess.STDOUT
+        )
+
+    # Sin puerto de métricas (los tres workers chocarían en el mismo);
+    # se puede pedir uno con --worker-args / --coordinator-args
+    def start_worker(self, op):
+        self._spawn(op, ["worker.py", "--name", op, "--host", "127.0.0.1",
+                         "--port", str(self.ports[op]), "--metrics-port", "0"]
+                    + self.worker_args)
+
+    def start(self):
+
+        for op in WORKERS:
+            self.start_worker(op)
+
+        workers = []
+        for op in WORKERS:
+            workers += ["--worker", f"{op}=127.0.0.1:{self.ports[op]}"]
+
+        self._spawn("coordinator", ["coordinador.py", "--host", "127.0.0.1",
+                                    "--port", str(self.coordinator[1]),
+                                    "--metrics-port", "0"]
+                    + workers + self.coordinator_args)
+
+    def kill(self, op):
+
+        proc = self.procs.get(op)
+
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+            proc.wait()
+
+    def stop(self):
+        for key in list(self.procs):
+            self.kill(key)
+
+
+# ==========================================
+# SOLICITUDES
+# ==========================================
+
+def send_request(address, payload, binary=False, timeout=30.0):
+
+    with socket.create_connection(address, timeout=timeout) as s:
+        send_message(s, payload, binary)
+        response, _ = read_message(open_reader(s))
+
+    return response
+
+
+# Ecuación con raíces reales conocidas: a(x - r1)(x - r2)
+def random_equation(rnd):
+
+    a = rnd.uniform(0.5, 2.0)
+    r1 = rnd.uniform(-10.0, 10.0)
+    r2 = rnd.uniform(-10.0, 10.0)
+
+    return a, -a * (r1 + r2), a * r1 * r2
+
+
+class Workload:
+
+    def __init__(self, batch, hit_ratio, seed):
+
+        self.batch = batch
+        self.hit_ratio = hit_ratio
+        self.seed = seed
+
+        rnd = random.Random(seed)
+        self.hot = [random_equation(rnd) for _ in range(HOT_KEYS)]
+
+        self.local = threading.local()
+        self.counter = 0
+        self.lock = threading.Lock()
+
+    # Un generador aleatorio por hilo (random.Random no es seguro entre hilos)
+    def _rnd(self):
+
+        rnd = getattr(self.local, "rnd", None)
+
+        if rnd is None:
+            with self.lock:
+                self.counter += 1
+                rnd = self.local.rnd = random.Random(self.seed * 1000 + self.counter)
+
+        return rnd
+
+    def _equation(self, rnd):
+
+        if self.hit_ratio > 0 and rnd.random() < self.hit_ratio:
+            return rnd.choice(self.hot)
+
+        return random_equation(rnd)
+
+    # (solicitud, ecuaciones que lleva)
+    def next_payload(self):
+
+        rnd = self._rnd()
+
+        if self.batch <= 1:
+            a, b, c = self._equation(rnd)
+            return {"a": a, "b": b, "c": c}, 1
+
+        eqs = [self._equation(rnd) for _ in range(self.batch)]
+
+        return {
+            "op": "batch",
+            "a": [e[0] for e in eqs],
+            "b": [e[1] for e in eqs],
+            "c": [e[2] for e in eqs]
+        }, self.batch
+
+    def warm_up_payload(self):
+
+        return {
+            "op": "batch",
+            "a": [e[0] for e in self.hot],
+            "b": [e[1] for e in self.hot],
+            "c": [e[2] for e in self.hot]
+        }
+
+
+# ==========================================
+# MEDICIÓN
+# ==========================================
+
+class Recorder:
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.counts = Counter()
+        self.modes = Counter()
+        self.items = 0
+        self.dropped = 0
+
+    # Lazo abierto: llegó con el tope de solicitudes en vuelo ocupado
+    def drop(self):
+        with self.lock:
+            self.dropped += 1
+
+    def record(self, seconds, response, items):
+
+        with self.lock:
+
+            if response is None:
+                self.counts["errors"] += 1
+                self.latencies.append(seconds)
+                return
+
+            if response.get("error") == "overloaded":
+                self.counts["rejected"] += 1
+                return
+
+            if response.get("ok"):
+                self.counts["ok"] += 1
+                self.items += items
+                self.modes[response.get("mode", "cache")] += 1
+            else:
+                self.counts["errors"] += 1
+
+            self.latencies.append(seconds)
+
+
+def percentile(ordered, p):
+
+    if not ordered:
+        return None
+
+    pos = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[pos]
+
+
+def one_request(address, workload, recorder, binary, scheduled=None):
+
+    payload, items = workload.next_payload()
+    started = scheduled if scheduled is not None else time.monotonic()
+
+    try:
+        response = send_request(address, payload, binary)
+    except Exception:
+        response = None
+
+    recorder.record(time.monotonic() - started, response, items)
+
+
+def closed_loop(address, workload, recorder, binary, concurrency, deadline):
+
+    def client():
+        while time.monotonic() < deadline:
+            one_request(address, workload, recorder, binary)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+
+    for t in threads:
+        t.start()
+
+    for t in threads:
+        t.join()
+
+
+def open_loop(address, workload, recorder, binary, rate, deadline, max_outstanding):
+
+    rnd = random.Random(workload.seed)
+
+    # El pool tiene una cola sin límite: el cupo se toma antes de mandarle
+    # nada, así lo que espera en el cliente no se mide como latencia
+    slots = threading.BoundedSemaphore(max_outstanding)
+
+    def bounded_request(scheduled):
+        try:
+            one_request(address, workload, recorder, binary, scheduled)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=max_outstanding) as pool:
+
+        next_at = time.monotonic()
+
+        while next_at < deadline:
+
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            if slots.acquire(blocking=False):
+                pool.submit(bounded_request, next_at)
+            else:
+                recorder.drop()
+
+            next_at += rnd.expovariate(rate)
+
+
+# Fallas programadas: [("kill" | "restart", op, segundos desde el inicio)]
+def run_failures(cluster, events, started):
+
+    for action, op, at in sorted(events, key=lambda e: e[2]):
+
+        time.sleep(max(0.0, started + at - time.monotonic()))
+
+        print(f"[BENCH] {action} {op} (t={at}s)", file=sys.stderr)
+
+        if action == "kill":
+            cluster.kill(op)
+        else:
+            cluster.start_worker(op)
+
+
+def parse_event(text, action):
+
+    op, _, at = text.partition("@")
+
+    if op not in WORKERS or not at:
+        raise argparse.ArgumentTypeError(f"se espera opN@segundos, no {text!r}")
+
+    return action, op, float(at)
+
+
+def wait_ready(address, timeout):
+
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        try:
+            response = send_request(address, {"a": 1, "b": -3, "c": 2}, timeout=2.0)
+            workers = send_request(address, {"op": "stats"}, timeout=2.0).get("workers", {})
+            if response.get("ok") and all(w["state"] == "closed" for w in workers.values()):
+                return True
+        except (OSError, ValueError, AttributeError):
+            pass
+        time.sleep(0.2)
+
+    return False
+
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description="Benchmark del coordinador + workers")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos de carga")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="clientes simultáneos (lazo cerrado)")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="solicitudes por segundo (lazo abierto); 0 = lazo cerrado")
+    parser.add_argument("--max-outstanding", type=int, default=256,
+                        help="solicitudes en vuelo como máximo en lazo abierto "
+                             "(las que lleguen con el tope lleno se descartan)")
+    parser.add_argument("--batch", type=int, default=1, help="ecuaciones por solicitud")
+    parser.add_argument("--hit-ratio", type=float, default=0.0,
+                        help="fracción de ecuaciones repetidas (aciertos de cache)")
+    parser.add_argument("--binary", action="store_true", help="hablar binario con el coordinador")
+    parser.add_argument("--kill", action="append", default=[],
+                        type=lambda t: parse_event(t, "kill"), metavar="opN@SEG",
+                        help="apagar un worker a los SEG segundos")
+    parser.add_argument("--restart", action="append", default=[],
+                        type=lambda t: parse_event(t, "restart"), metavar="opN@SEG",
+                        help="volver a levantar un worker a los SEG segundos")
+    parser.add_argument("--coordinator-args", default="",
+                        help="argumentos extra para coordinador.py")
+    parser.add_argument("--worker-args", default="", help="argumentos extra para worker.py")
+    parser.add_argument("--target", default=None, metavar="HOST:PUERTO",
+                        help="usar un coordinador ya levantado (sin fallas programadas)")
+    parser.add_argument("--base-port", type=int, default=BASE_PORT)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="guardar el JSON también en este archivo")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    log_dir = tempfile.mkdtemp(prefix="benchmark-")
+    cluster = None
+
+    if args.target:
+        host, _, port = args.target.rpartition(":")
+        address = (host, int(port))
+    else:
+        cluster = Cluster(args.base_port, args.coordinator_args.split(),
+                          args.worker_args.split(), log_dir)
+        cluster.start()
+        address = cluster.coordinator
+
+    try:
+        if not wait_ready(address, STARTUP_TIMEOUT):
+            print(f"[BENCH] El sistema no respondió (logs en {log_dir})", file=sys.stderr)
+            return 1
+
+        workload = Workload(args.batch, args.hit_ratio, args.seed)
+
+        if args.hit_ratio > 0:
+            send_request(address, workload.warm_up_payload(), args.binary)
+
+        recorder = Recorder()
+
+        started = time.monotonic()
+        deadline = started + args.duration
+
+        if cluster is not None and (args.kill or args.restart):
+            threading.Thread(
+                target=run_failures,
+                args=(cluster, args.kill + args.restart, started),
+                daemon=True
+            ).start()
+
+        if args.rate > 0:
+            open_loop(address, workload, recorder, args.binary, args.rate,
+                      deadline, args.max_outstanding)
+        else:
+            closed_loop(address, workload, recorder, args.binary,
+                        args.concurrency, deadline)
+
+        elapsed = time.monotonic() - started
+
+        try:
+            coordinator_stats = send_request(address, {"op": "stats"}, timeout=5.0)
+        except OSError:
+            coordinator_stats = None
+
+    finally:
+        if cluster is not None:
+            cluster.stop()
+
+    ordered = sorted(recorder.latencies)
+    total = sum(recorder.counts.values())
+    offered = total + recorder.dropped
+
+    latency = {name: percentile(ordered, p) * 1000 if ordered else None
+               for name, p in PERCENTILES.items()}
+    latency["max"] = ordered[-1] * 1000 if ordered else None
+    latency["mean"] = sum(ordered) / len(ordered) * 1000 if ordered else None
+
+    report = {
+        "config": {
+            "loop": "open" if args.rate > 0 else "closed",
+            "duration_s": args.duration,
+            "concurrency": None if args.rate > 0 else args.concurrency,
+            "rate": args.rate or None,
+            "batch": args.batch,
+            "hit_ratio": args.hit_ratio,
+            "binary": args.binary,
+            "failures": [f"{a} {op}@{at}" for a, op, at in args.kill + args.restart],
+            "coordinator_args": args.coordinator_args,
+            "worker_args": args.worker_args
+        },
+        "requests": total,
+        "ok": recorder.counts["ok"],
+        "errors": recorder.counts["errors"],
+        "rejected": recorder.counts["rejected"],
+        "dropped": recorder.dropped,
+        "elapsed_s": elapsed,
+        "offered_rps": offered / elapsed,
+        "completed_rps": total / elapsed,
+        "throughput_rps": recorder.counts["ok"] / elapsed,
+        "equations_per_s": recorder.items / elapsed,
+        "latency_ms": latency,
+        "modes": dict(recorder.modes),
+        "coordinator": coordinator_stats,
+        "logs": log_dir
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
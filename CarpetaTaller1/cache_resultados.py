@@ -0,0 +1,99 @@
+import math
+import time
+import threading
+from collections import OrderedDict
+
+# ==========================================
+# CACHE DE RESULTADOS (LRU + TTL)
+# ==========================================
+#
+# Guarda el resultado de cada (a, b, c) ya resuelto. Un acierto evita
+# las tres idas y vueltas a los workers. Al llenarse se descarta el
+# menos usado recientemente; las entradas vencen después de ttl
+# segundos (ttl = 0: no vencen).
+
+
+class ResultCache:
+
+    def __init__(self, max_entries=10000, ttl=300.0):
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # Clave normalizada: floats, con -0.0 igual a 0.0.
+    # Con NaN no hay clave (NaN != NaN, nunca acertaría).
+    @staticmethod
+    def key(a, b, c):
+
+        key = (float(a) + 0.0, float(b) + 0.0, float(c) + 0.0)
+
+        if any(math.isnan(v) for v in key):
+            return None
+
+        return key
+
+    def get(self, key):
+
+        if key is None or self.max_entries <= 0:
+            return None
+
+        with self.lock:
+
+            entry = self.entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at = entry
+
+            if self.ttl > 0 and time.monotonic() - stored_at > self.ttl:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+
+        if key is None or self.max_entries <= 0:
+            return
+
+        with self.lock:
+
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+
+        with self.lock:
+            total = self.hits + self.misses
+
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": self.hits / total if total else 0.0
+            }
@@ -1,6 +1,16 @@
-import socket
+import os
+import sys
+import csv
 import json
 import time
+import argparse
+import itertools
+import threading
+
+from protocolo import send_json, open_reader, read_json
+from balanceo_coordinadores import CoordinatorBalancer, STRATEGIES
+from api_cliente import QuadraticClient, InvalidInput, parse_number, EPS, WINDOW, MAX_BATCH
+import trazas
 
 # ==========================================
 # CONFIGURACIÓN
@@ -10,43 +20,402 @@ import time
 COORDINATOR_IP = "10.43.97.251"
 COORDINATOR_PORT = 5000
 
+# Varios coordinadores ("host:puerto,host:puerto"); vacío = solo el de
+# arriba. Ver balanceo_coordinadores.py.
+COORDINATORS = os.environ.get("COORDINATORS", "")
+
+# Cómo se elige el coordinador: "hash" (la misma ecuación siempre al
+# mismo, su cache queda caliente) o "latency" (el más rápido)
+BALANCE = os.environ.get("CLIENT_BALANCE", "hash")
+
+# Ecuaciones por trozo en solve_stream
+STREAM_CHUNK = 4096
+
+# Reintentos cuando el coordinador responde "overloaded". Se espera el
+# retry_after que sugiere, con ±50% al azar para que los clientes
+# rechazados juntos no vuelvan todos en el mismo instante.
+MAX_RETRIES = 3
+
+BALANCER = None
+
+
+# Los de la línea de comandos, si no los de COORDINATORS, si no el de arriba
+def coordinator_list(coordinators=None):
+
+    if coordinators:
+        return coordinators
+
+    return [c for c in COORDINATORS.split(",") if c.strip()] \
+        or [(COORDINATOR_IP, COORDINATOR_PORT)]
+
+
+def configure(coordinators=None, strategy=BALANCE):
+
+    global BALANCER
+
+    BALANCER = CoordinatorBalancer(coordinator_list(coordinators), strategy)
+
+
+def balancer():
+
+    if BALANCER is None:
+        configure()
+
+    return BALANCER
+
 
 # ==========================================
-# FUNCIONES AUXILIARES JSON
+# LLAMADAS AL COORDINADOR
 # ==========================================
 
-# Enviamos JSON terminado en salto de línea
-def send_json(conn, data):
-    msg = json.dumps(data) + "\n"
-    conn.sendall(msg.encode("utf-8"))
+# Envía una solicitud y espera la respuesta (None si ningún coordinador
+# respondió). Si uno está caído o saturado se prueba con otro; si todos
+# están saturados se reintenta hasta retries veces.
+def request(payload, retries=MAX_RETRIES):
+    return balancer().request(payload, retries)
+
+
+def request_once(payload):
+    return balancer().request(payload, retries=0)
+
+
+# Resuelve muchas ecuaciones en un solo viaje.
+# a, b, c son listas del mismo tamaño; la respuesta trae "results"
+# con un {"ok", "x1", "x2"} o {"ok": false, "error"} por ecuación.
+def solve_batch(a, b, c):
+
+    return request({
+        "request_id": f"cli-batch-{int(time.time())}",
+        "op": "batch",
+        "a": list(a),
+        "b": list(b),
+        "c": list(c)
+    })
+
+
+# Lotes grandes: el coordinador responde por trozos a medida que los
+# resuelve. Devuelve un generador con un mensaje por trozo
+# ({"chunk", "offset", "count", "x1", "x2", "errors"}); el último
+# mensaje trae "done": true.
+#
+# Los coeficientes también se mandan por partes ("more": true) desde
+# otro hilo, así el coordinador empieza con el primer trozo sin esperar
+# a recibir todo y ninguno de los dos lados se queda esperando al otro.
+def solve_stream(a, b, c, chunk_size=STREAM_CHUNK):
+
+    a, b, c = list(a), list(b), list(c)
+
+    def send_all(s):
+        for start in range(0, max(len(a), 1), chunk_size):
+            end = start + chunk_size
+            payload = {"a": a[start:end], "b": b[start:end], "c": c[start:end],
+                       "more": end < len(a)}
+            if start == 0:
+                payload.update({
+                    "request_id": f"cli-stream-{int(time.time())}",
+                    "op": "batch",
+                    "stream": True,
+                    "chunk_size": chunk_size
+                })
+            send_json(s, payload)
+
+    # Failover solo al conectar: a mitad de la respuesta ya no se puede
+    s, _ = balancer().connect({"op": "batch"})
+
+    with s:
+
+        sender = threading.Thread(target=send_all, args=(s,), daemon=True)
+        sender.start()
+
+        reader = open_reader(s)
+
+        while True:
+
+            message = read_json(reader)
+
+            if message is None:
+                return
+
+            yield message
+
+            if message.get("done"):
+                return
+
+
+# ==========================================
+# ARCHIVOS DE ENTRADA Y SALIDA (modo no interactivo)
+# ==========================================
+#
+#   python3 client.py --input ecuaciones.csv --output resultados.jsonl
+#   cat ecuaciones.jsonl | python3 client.py --input - --batch 1000
+#
+# CSV: una ecuación por línea, "a,b,c" (también con ";" o tabulador).
+# Si la primera fila tiene columnas a, b y c se toma como encabezado y
+# las demás columnas se ignoran.
+# JSONL: un objeto por línea con a, b y c.
+# Las líneas vacías y las que empiezan con "#" se saltan.
+#
+# Sale una línea por ecuación, en el mismo orden, apenas está lista:
+#   {"line": 3, "a": "1", "b": "-3", "c": "2", "ok": true, "x1": 2.0, "x2": 1.0}
+#   {"line": 4, "a": "hola", "b": "1", "c": "1", "ok": false, "error": "a debe ser numérico ..."}
+
+RESULT_FIELDS = ("ok", "x1", "x2", "error")
+
+
+def detect_format(path, first_line):
+
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+
+    if extension in (".csv", ".tsv", ".txt"):
+        return "csv"
+
+    return "jsonl" if first_line.lstrip().startswith("{") else "csv"
+
+
+def data_lines(stream):
+
+    for line_no, line in enumerate(stream, 1):
+        text = line.strip()
+        if text and not text.startswith("#"):
+            yield line_no, text
+
+
+# (número de línea, valores originales, fila para la API)
+def read_jsonl(lines):
+
+    for line_no, text in lines:
+
+        try:
+            obj = json.loads(text)
+        except ValueError:
+            yield line_no, {}, InvalidInput("JSON inválido")
+            continue
+
+        if not isinstance(obj, dict):
+            yield line_no, {}, InvalidInput("Se esperaba un objeto con a, b, c")
+            continue
+
+        values = {name: obj.get(name) for name in ("a", "b", "c")}
+        yield line_no, values, values
+
+
+def read_csv(lines):
 
+    lines = iter(lines)
+    first = next(lines, None)
 
-# Leemos hasta encontrar el salto de línea
-def recv_json(conn):
-    buffer = b""
+    if first is None:
+        return
 
-    while b"\n" not in buffer:
-        chunk = conn.recv(4096)
-        if not chunk:
-            return None
-        buffer += chunk
+    delimiter = max((",", ";", "\t"), key=first[1].count)
+    current = [first[0]]
 
-    line = buffer.split(b"\n", 1)[0]
-    return json.loads(line.decode("utf-8"))
+    # El lector de csv pide las líneas de a una: así se sabe de qué
+    # línea del archivo salió cada fila
+    def texts():
+        for line_no, text in itertools.chain([first], lines):
+            current[0] = line_no
+            yield text
+
+    columns = None
+
+    for cells in csv.reader(texts(), delimiter=delimiter):
+
+        line_no = current[0]
+        cells = [cell.strip() for cell in cells]
+
+        if columns is None and line_no == first[0]:
+            header = [cell.lower() for cell in cells]
+            if all(name in header for name in ("a", "b", "c")):
+                columns = [header.index(name) for name in ("a", "b", "c")]
+                continue
+
+        if columns is not None:
+            row = [cells[i] if i < len(cells) else "" for i in columns]
+        else:
+            row = cells
+
+        values = dict(zip(("a", "b", "c"), row))
+        yield line_no, values, row
+
+
+def read_rows(stream, fmt, path):
+
+    lines = data_lines(stream)
+    first = next(lines, None)
+
+    if first is None:
+        return iter(())
+
+    if fmt == "auto":
+        fmt = detect_format(path, first[1])
+
+    lines = itertools.chain([first], lines)
+
+    return read_jsonl(lines) if fmt == "jsonl" else read_csv(lines)
+
+
+class ResultWriter:
+
+    def __init__(self, stream, fmt):
+
+        self.stream = stream
+        self.fmt = fmt
+
+        if fmt == "csv":
+            self.csv = csv.writer(stream, lineterminator="\n")
+            self.csv.writerow(("line", "a", "b", "c") + RESULT_FIELDS)
+
+    def write(self, line_no, values, result):
+
+        record = {"line": line_no}
+        record.update(values)
+        record.update({k: result[k] for k in RESULT_FIELDS if k in result})
+
+        if self.fmt == "csv":
+            self.csv.writerow([record.get(k, "") for k in ("line", "a", "b", "c") + RESULT_FIELDS])
+        else:
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def run_file(args):
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    target = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+
+    extra = {} if args.deadline_ms is None else {"deadline_ms": args.deadline_ms}
+    client = QuadraticClient(coordinator_list(args.coordinator), args.balance,
+                             connections=args.connections, timeout=args.timeout,
+                             binary=args.binary, retries=args.retries)
+
+    writer = ResultWriter(target, args.output_format)
+    total = failed = 0
+    started = time.perf_counter()
+
+    try:
+
+        # Dos copias de la misma lectura: una va a la API y la otra
+        # acompaña cada resultado (tee guarda solo lo que está en vuelo)
+        rows, originals = itertools.tee(read_rows(source, args.format, args.input))
+        results = client.solve_many((row for _, _, row in rows), args.window, args.batch, **extra)
+
+        for (line_no, values, _), result in zip(originals, results):
+            writer.write(line_no, values, result)
+            total += 1
+            failed += not result.get("ok")
+
+    finally:
+
+        client.close()
+
+        if target is not sys.stdout:
+            target.close()
+        else:
+            target.flush()
+
+        if source is not sys.stdin:
+            source.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"{total} ecuaciones, {total - failed} resueltas, {failed} con error, "
+          f"{elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f}/s)", file=sys.stderr)
 
 
 # ==========================================
 # CLIENTE
 # ==========================================
 
-def main():
+# Pide un coeficiente hasta que sea válido (Prueba 6): texto o vacío no
+# salen a la red, se vuelve a preguntar
+def ask(name, nonzero=False):
+
+    while True:
+
+        try:
+            value = parse_number(name, input(f"Ingrese {name}: "))
+        except InvalidInput as e:
+            print(f"  {e}. Intente de nuevo.")
+            continue
+
+        if nonzero and abs(value) < EPS:
+            print(f"  Valor inválido: {name} no puede ser 0. Intente de nuevo.")
+            continue
+
+        return value
+
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description="Cliente cálculo cuadrático")
+    parser.add_argument("--trace", metavar="ARCHIVO", default=None,
+                        help="pedir la traza de la solicitud y guardarla en formato Chrome "
+                             "(abrir en chrome://tracing o ui.perfetto.dev)")
+    parser.add_argument("--deadline-ms", type=float, default=None,
+                        help="tiempo máximo que se espera la respuesta; lo que venza "
+                             "en el camino se descarta")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES,
+                        help="reintentos si el coordinador está saturado")
+    parser.add_argument("--coordinator", action="append", default=[],
+                        metavar="HOST:PUERTO",
+                        help="coordinador (repetir por cada uno); reemplaza COORDINATORS")
+    parser.add_argument("--balance", choices=STRATEGIES, default=BALANCE,
+                        help="cómo elegir el coordinador si hay varios")
+
+    files = parser.add_argument_group("modo no interactivo")
+    files.add_argument("--input", metavar="ARCHIVO", default=None,
+                       help="leer las ecuaciones de un archivo CSV/JSONL ('-' = entrada estándar)")
+    files.add_argument("--format", choices=("auto", "csv", "jsonl"), default="auto",
+                       help="formato de --input (auto: por la extensión o la primera línea)")
+    files.add_argument("--output", metavar="ARCHIVO", default="-",
+                       help="dónde escribir los resultados ('-' = salida estándar)")
+    files.add_argument("--output-format", choices=("jsonl", "csv"), default="jsonl")
+    files.add_argument("--batch", type=int, default=0,
+                       help=f"ecuaciones por solicitud 'batch' (0 = una por solicitud, "
+                            f"máximo {MAX_BATCH})")
+    files.add_argument("--window", type=int, default=WINDOW,
+                       help="solicitudes en vuelo a la vez (como máximo: se achica sola "
+                            "si el coordinador responde saturado)")
+    files.add_argument("--connections", type=int, default=4,
+                       help="conexiones abiertas por coordinador")
+    files.add_argument("--timeout", type=float, default=30.0,
+                       help="segundos esperando cada respuesta")
+    files.add_argument("--binary", action="store_true",
+                       help="usar el formato binario del protocolo")
+
+    args = parser.parse_args(argv)
+
+    if args.window < 1:
+        parser.error("--window debe ser al menos 1")
+
+    if not 0 <= args.batch <= MAX_BATCH:
+        parser.error(f"--batch debe estar entre 0 y {MAX_BATCH}")
+
+    return args
+
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    if args.input is not None:
+        run_file(args)
+        return
+
+    configure(args.coordinator, args.balance)
 
     print("=== Cliente cálculo cuadrático distribuido ===")
 
     # Pedimos datos al usuario
-    a = input("Ingrese a: ").strip()
-    b = input("Ingrese b: ").strip()
-    c = input("Ingrese c: ").strip()
+    try:
+        a = ask("a", nonzero=True)
+        b = ask("b")
+        c = ask("c")
+    except (EOFError, KeyboardInterrupt):
+        print("\nEntrada cancelada.")
+        return
 
     # Creamos payload para enviar al coordinador
     payload = {
@@ -56,26 +425,29 @@ def main():
         "c": c
     }
 
-    try:
-
-        # Abrimos conexión TCP con el coordinador
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    if args.trace:
+        payload["trace"] = True
 
-            s.connect((COORDINATOR_IP, COORDINATOR_PORT))
+    if args.deadline_ms is not None:
+        payload["deadline_ms"] = args.deadline_ms
 
-            # Enviamos datos
-            send_json(s, payload)
+    try:
 
-            # Esperamos respuesta
-            response = recv_json(s)
+        response = request(payload, args.retries)
 
         if response is None:
             print("No se recibió respuesta del coordinador.")
             return
 
+        spans = response.pop("spans", None)
+
         print("\n=== Respuesta del coordinador ===")
         print(json.dumps(response, indent=2, ensure_ascii=False))
 
+        if args.trace and spans:
+            trazas.write_chrome(args.trace, spans, name=payload["request_id"])
+            print(f"\nTraza ({len(spans)} tramos) guardada en {args.trace}")
+
     except Exception as e:
         print(f"Error conectando al coordinador: {e}")
 
@@ -1,6 +1,26 @@
+import os
+import math
 import socket
-import json
 import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from protocolo import send_message, open_reader, read_message, NOT_AN_OBJECT
+from pool_conexiones import WorkerPool
+from registro_workers import WorkerRegistry
+from cache_resultados import ResultCache
+from latencias import LatencyWindow
+from enrutamiento import RoutingPolicy, STRATEGIES
+from planificador import ExecutionPlanner, MODES as PLAN_MODES, SINGLE_HOP, LOCAL
+import motor_vectorial
+import metricas
+import trazas
+import admision
+from admision import AdmissionControl, DeadlineExceeded
+from membresia import Membership
+from grafo_etapas import SERIAL, SPLIT, run_dag
 
 # =====================================================
 # CONFIGURACIÓN GENERAL
@@ -10,13 +30,40 @@ import time
 COORDINATOR_HOST = "0.0.0.0"
 COORDINATOR_PORT = 5000
 
-# Timeout para esperar respuesta de un worker
+# Timeout para esperar respuesta de un worker (lectura)
 TIMEOUT = 3.0
 
+# Timeout para abrir la conexión con un worker. Es corto a propósito: un
+# worker vivo acepta en milisegundos, y uno caído no debe frenar la
+# solicitud los TIMEOUT segundos completos.
+CONNECT_TIMEOUT = 0.5
+
 # Para evitar problemas con floats
 EPS = 1e-12
 
-# IPs de los workers (cada uno en su VM)
+# Máximo de ecuaciones en una solicitud por lotes
+MAX_BATCH = 100000
+
+# Lotes en streaming ("stream": true): el trabajo se parte en trozos de
+# STREAM_CHUNK ecuaciones y hay como máximo STREAM_WINDOW trozos en
+# vuelo por trabajo. STREAM_THREADS hilos (compartidos por todos los
+# trabajos) llevan los trozos por el pipeline.
+STREAM_CHUNK = 4096
+STREAM_WINDOW = 4
+STREAM_THREADS = 16
+
+# Grafo de etapas (ver grafo_etapas.py): los lotes de al menos
+# DAG_SPLIT_MIN ecuaciones mandan x1 y x2 por ramas separadas, en
+# workers distintos (0 = siempre las tres etapas en serie). Conviene
+# cuando el cálculo en los workers pesa más que la red (workers sin
+# NumPy): cada rama calcula la mitad, pero el coordinador envía b, sqrt_d
+# y a a las dos ramas. DAG_THREADS hilos (compartidos) llevan los nodos
+# que corren a la vez.
+DAG_SPLIT_MIN = 0
+DAG_THREADS = 32
+
+# IPs de los workers (cada uno en su VM). Se pueden cambiar sin tocar
+# el código: ver "WORKERS POR ENTORNO / LÍNEA DE COMANDOS" más abajo
 OP_SERVERS = {
     "op1": ("10.43.99.136", 5001),
     "op2": ("10.43.99.139", 5001),
@@ -32,59 +79,442 @@ ROLE_PLAN = {
 
 ALL_OPS = ["op1", "op2", "op3"]
 
+# Etapas del pipeline, en orden
+STAGES = ["sqrt_discriminant", "numerator", "division"]
+
+# Segundos que dura el registro de un worker que se anunció solo
+# ({"op": "register"}); el worker lo renueva mientras está vivo
+MEMBER_LEASE = 15.0
+
+# Conexiones persistentes como máximo por worker
+POOL_SIZE = 4
+
+# Salud de los workers (circuit breaker + heartbeats)
+# FAILURE_THRESHOLD: fallos seguidos para marcar un worker como caído
+# OPEN_TIMEOUT: segundos que se salta un worker caído antes de volver a probarlo
+# HEARTBEAT_INTERVAL: cada cuánto se hace ping a cada worker (0 = sin heartbeats)
+FAILURE_THRESHOLD = 1
+OPEN_TIMEOUT = 5.0
+HEARTBEAT_INTERVAL = 1.0
+HEARTBEAT_TIMEOUT = 1.0
+
+# Cache de resultados por (a, b, c)
+# CACHE_MAX_ENTRIES: entradas como máximo (0 = sin cache)
+# CACHE_TTL: segundos que vale una entrada (0 = no vence)
+CACHE_MAX_ENTRIES = 10000
+CACHE_TTL = 300.0
+
+# Errores que dependen solo de (a, b, c) y por eso se pueden cachear
+CACHEABLE_ERRORS = {
+    "Valor inválido: a no puede ser 0",
+    "No hay raíces reales",
+}
+
+# Enrutamiento: en qué orden se prueban los candidatos de cada etapa
+# "static" (ROLE_PLAN tal cual), "least_outstanding", "ewma" o "p2c"
+ROUTING_STRATEGY = "static"
+EWMA_ALPHA = 0.2
+
+# Hedging: si el worker principal de una etapa no respondió dentro del
+# percentil HEDGE_PERCENTILE de latencia de esa etapa, se manda la misma
+# etapa al siguiente worker vivo de ROLE_PLAN. Gana la primera respuesta
+# válida y la otra se descarta. Solo para solicitudes individuales (un
+# lote duplicado costaría demasiado trabajo extra).
+# Hasta juntar HEDGE_MIN_SAMPLES latencias se espera HEDGE_DEFAULT_DELAY.
+HEDGE_ENABLED = False
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_DELAY = 0.002
+HEDGE_DEFAULT_DELAY = 0.05
+HEDGE_MIN_SAMPLES = 20
+
+# Planificador: cómo se resuelve cada solicitud
+#   "pipeline"   -> 3 etapas repartidas entre workers (comportamiento original)
+#   "single_hop" -> full_quadratic completo en un worker (1 ida y vuelta)
+#   "local"      -> lo calcula el coordinador, sin red
+#   "auto"       -> el más barato según RTT medido, costo de cálculo y
+#                   tamaño del lote
+# PLANNER_EXPLORE: fracción de solicitudes que en "auto" prueban un plan
+#   remoto para mantener al día su costo por elemento
+EXECUTION_PLAN = "pipeline"
+PLANNER_EXPLORE = 0.01
+
+# Formato con los workers: "binary" (float64 empaquetados, se negocia
+# al conectar y cae a JSON si el worker no lo soporta) o "json"
+WIRE_FORMAT = "binary"
+
+# Concurrencia del coordinador (control de admisión, ver admision.py)
+# MAX_INFLIGHT: solicitudes en proceso a la vez (un hilo cada una)
+# MAX_QUEUE: solicitudes aceptadas esperando un hilo libre. Si también
+#   está llena, se rechaza de inmediato con "overloaded".
+# BACKLOG: cola de conexiones pendientes en el kernel (listen)
+MAX_INFLIGHT = 16
+MAX_QUEUE = 16
+BACKLOG = 128
+
+# Conexiones de clientes abiertas a la vez (un hilo lector cada una).
+# Una conexión puede llevar muchas solicitudes seguidas (y sin esperar
+# cada respuesta); si no llega nada en KEEPALIVE_TIMEOUT segundos se cierra.
+MAX_CONNECTIONS = 1024
+KEEPALIVE_TIMEOUT = 5.0
+
+# Tiempo máximo para leer la solicitud de un cliente que vamos a rechazar
+REJECT_READ_TIMEOUT = 0.5
+
+# Rechazos con respuesta "overloaded" pendientes (en curso + en cola).
+# Pasado este número, la conexión se cierra sin leer ni responder: en
+# una avalancha el rechazo no puede acumular sockets ni tareas. Con 2
+# hilos, un rechazo espera como mucho REJECT_QUEUE / 2 * REJECT_READ_TIMEOUT.
+REJECT_QUEUE = 8
+
+# Segundos sugeridos al cliente antes de reintentar cuando estamos saturados
+RETRY_AFTER = 0.5
+
+# Puerto HTTP con las métricas en formato Prometheus (0 = desactivado)
+METRICS_PORT = 9100
+
 # =====================================================
-# FUNCIONES AUXILIARES SOCKET + JSON
+# WORKERS POR ENTORNO / LÍNEA DE COMANDOS
 # =====================================================
+#
+#   OP_SERVERS="op1=10.43.99.136:5001,op2=10.43.99.139:5001"  (o --worker)
+#   ROLE_PLAN="sqrt_discriminant=op1,op2;numerator=op2,op1;division=op1,op2"
+#                                                              (o --roles)
+#
+# Si se dan los workers pero no los roles, cada etapa empieza por un
+# worker distinto y sigue rotando la lista (con op1, op2, op3 queda el
+# ROLE_PLAN original). Lo mismo cuando se suman o salen workers
+# registrados: los roles se rearman para los N que haya.
+
+# Roles dados a mano (ROLE_PLAN / --roles). None = se rotan los workers
+FIXED_ROLES = None
+
+def parse_servers(text):
+
+    servers = {}
+
+    for item in text.split(","):
+        name, _, address = item.strip().partition("=")
+        host, _, port = address.rpartition(":")
+
+        if not name or not host or not port.isdigit():
+            raise ValueError(f"Worker inválido: {item!r} (se espera nombre=host:puerto)")
+
+        servers[name] = (host, int(port))
+
+    return servers
+
+
+def parse_role_plan(text):
+
+    plan = {}
+
+    for item in text.split(";"):
+        stage, _, ops = item.strip().partition("=")
+        plan[stage] = [op.strip() for op in ops.split(",") if op.strip()]
+
+    return plan
+
+
+def rotate_roles(ops):
+
+    if not ops:
+        return {stage: [] for stage in STAGES}
+
+    return {stage: ops[i % len(ops):] + ops[:i % len(ops)] for i, stage in enumerate(STAGES)}
+
+
+# Roles a mano con otro conjunto de workers: se quitan los que ya no
+# están y los nuevos quedan como sustitutos al final de cada etapa
+def extend_roles(role_plan, ops):
+
+    return {
+        stage: [op for op in role_plan.get(stage, []) if op in ops]
+        + [op for op in ops if op not in role_plan.get(stage, [])]
+        for stage in STAGES
+    }
+
+
+# Cambia los workers y roles (en el lugar, todo el módulo usa estos objetos)
+def configure_workers(servers, role_plan=None):
+
+    role_plan = role_plan or rotate_roles(list(servers))
+
+    if sorted(role_plan) != sorted(STAGES):
+        raise ValueError(f"ROLE_PLAN debe tener las etapas {STAGES}")
 
-# Enviamos JSON terminando en \n para saber cuándo termina el mensaje
-def send_json(conn, data):
-    msg = json.dumps(data) + "\n"
-    conn.sendall(msg.encode("utf-8"))
+    for stage, ops in role_plan.items():
+        unknown = [op for op in ops if op not in servers]
+        if unknown or (servers and not ops):
+            raise ValueError(f"ROLE_PLAN de {stage}: workers desconocidos {unknown}")
 
+    # Las solicitudes en curso leen estos objetos sin lock: primero se
+    # agregan direcciones, después cambian los roles y al final se quitan
+    # las direcciones que sobran (nunca queda un rol sin dirección)
+    OP_SERVERS.update(servers)
 
-# Leemos hasta encontrar el salto de línea
-def recv_json(conn):
-    buffer = b""
-    while b"\n" not in buffer:
-        chunk = conn.recv(4096)
-        if not chunk:
-            return None
-        buffer += chunk
+    ALL_OPS[:] = list(servers)
+    ROLE_PLAN.update(role_plan)
 
-    line = buffer.split(b"\n", 1)[0]
-    return json.loads(line.decode("utf-8"))
+    for name in [name for name in OP_SERVERS if name not in servers]:
+        del OP_SERVERS[name]
+
+
+if os.environ.get("ROLE_PLAN"):
+    FIXED_ROLES = parse_role_plan(os.environ["ROLE_PLAN"])
+
+if os.environ.get("OP_SERVERS"):
+    configure_workers(parse_servers(os.environ["OP_SERVERS"]), FIXED_ROLES)
+
+
+# =====================================================
+# MÉTRICAS
+# =====================================================
+#
+# Se registran en el momento (contadores e histogramas en memoria) y se
+# leen por HTTP en METRICS_PORT. Lo que ya se cuenta en otro lado (cache,
+# estado de los workers) se lee recién cuando alguien consulta.
+
+REQUEST_SECONDS = metricas.histogram(
+    "coordinator_request_seconds", "Tiempo total de una solicitud", ["op", "mode"])
+QUEUE_WAIT_SECONDS = metricas.histogram(
+    "coordinator_queue_wait_seconds", "Espera entre accept() y un hilo libre")
+STAGE_SECONDS = metricas.histogram(
+    "coordinator_stage_seconds", "Tiempo por etapa (incluye reintentos)", ["stage"])
+WORKER_CALL_SECONDS = metricas.histogram(
+    "coordinator_worker_call_seconds", "Ida y vuelta a un worker", ["worker", "op"])
+FAILOVERS = metricas.counter(
+    "coordinator_failovers_total", "Llamadas a un worker que fallaron y pasaron al siguiente", ["worker"])
+FULL_QUADRATIC_FALLBACKS = metricas.counter(
+    "coordinator_full_quadratic_fallbacks_total", "Solicitudes resueltas con full_quadratic por quedar un solo worker")
+HEDGES = metricas.counter(
+    "coordinator_hedges_total", "Respaldos enviados por etapas lentas", ["stage"])
+PLANS = metricas.counter(
+    "coordinator_plan_total", "Plan elegido por el planificador", ["plan"])
+REJECTED = metricas.counter(
+    "coordinator_rejected_total", "Conexiones rechazadas por saturación")
+DEADLINE_DROPS = metricas.counter(
+    "coordinator_deadline_exceeded_total", "Solicitudes descartadas por plazo vencido")
+BUSY_WORKERS = metricas.counter(
+    "coordinator_worker_overloaded_total", "Respuestas overloaded de un worker", ["worker"])
+
+# Valores posibles de la etiqueta "op" (cualquier otro queda "unknown")
+REQUEST_OPS = frozenset(["solve", "batch", "register", "deregister", "hello", "stats"])
+WORKER_OPS = frozenset(["ping", "sqrt_discriminant", "numerator", "division",
+                        "numerator_plus", "numerator_minus", "division_plus",
+                        "division_minus", "full_quadratic", "bulk"])
+
+# Cupos de solicitudes (en proceso + en cola); main() aplica la configuración
+ADMISSION = AdmissionControl(MAX_INFLIGHT, MAX_QUEUE, retry_after=RETRY_AFTER)
+
+metricas.callback(
+    "coordinator_queued", "Solicitudes aceptadas esperando un hilo libre",
+    lambda: ADMISSION.queued())
 
 
 # =====================================================
 # LLAMAR A UN WORKER
 # =====================================================
 
+# Conexiones persistentes por worker (se reutilizan entre solicitudes)
+POOL = WorkerPool(
+    lambda op_name: OP_SERVERS[op_name],
+    size=POOL_SIZE,
+    connect_timeout=CONNECT_TIMEOUT,
+    binary=WIRE_FORMAT == "binary"
+)
+
+
+# Orden de candidatos por etapa según carga/latencia de cada worker
+ROUTER = RoutingPolicy(ROUTING_STRATEGY, alpha=EWMA_ALPHA)
+
+
 def call_worker(op_name, payload):
 
-    host, port = OP_SERVERS[op_name]
+    # Con traza activa el worker también devuelve sus tiempos
+    tracer = trazas.current()
+    if tracer is not None:
+        payload = dict(payload, trace=True)
 
-    # Abrimos conexión TCP hacia el worker
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+    # Con plazo: el worker recibe lo que queda y no esperamos más que eso
+    deadline = admision.current_deadline()
 
-        s.settimeout(TIMEOUT)
-        s.connect((host, port))
+    try:
+        timeout = call_timeout(deadline)
+    except DeadlineExceeded:
+        REGISTRY.release(op_name)
+        raise
 
-        send_json(s, payload)
+    payload = admision.with_budget(payload, deadline)
+
+    # Usamos una conexión ya abierta del pool; solo se hace el handshake
+    # TCP la primera vez o si la conexión anterior se cayó
+    started = ROUTER.stats.begin(op_name)
+    call_started = time.perf_counter()
+
+    try:
+        resp = POOL.call(op_name, payload, timeout)
+    except Exception as e:
+        ROUTER.stats.end(op_name, started, ok=False)
+        if tracer is not None:
+            tracer.add(f"{payload.get('op')} -> {op_name}", started, time.monotonic(),
+                       ok=False, error=str(e) or type(e).__name__)
+        # Se acabó el plazo de la solicitud, no el worker
+        if admision.expired(deadline):
+            REGISTRY.release(op_name)
+            raise DeadlineExceeded(f"plazo vencido esperando a {op_name}") from e
+        REGISTRY.record_failure(op_name)
+        raise
+
+    ROUTER.stats.end(op_name, started)
+    WORKER_CALL_SECONDS.observe(time.perf_counter() - call_started,
+                                worker=op_name,
+                                op=metricas.known_label(payload.get("op"), WORKER_OPS))
+
+    trace_worker_reply(tracer, f"{payload.get('op')} -> {op_name}", op_name, started, resp)
+
+    # Cualquier respuesta (aunque sea un error matemático) prueba que está vivo
+    REGISTRY.record_success(op_name)
+    return resp
+
+
+# Lo que se espera a un worker: TIMEOUT o lo que quede del plazo.
+# Si ya no queda nada no se llama.
+def call_timeout(deadline):
+
+    left = admision.remaining(deadline)
+
+    if left is None:
+        return TIMEOUT
+
+    if left <= 0:
+        raise DeadlineExceeded("plazo vencido")
+
+    return min(TIMEOUT, left)
+
+
+# Anota un intento que respondió (con los tiempos del worker, si vinieron)
+def trace_worker_reply(tracer, name, op_name, started, resp):
+
+    timing = resp.pop("timing", None)
+
+    if tracer is None:
+        return
 
-        response = recv_json(s)
+    ended = time.monotonic()
+    tracer.add(name, started, ended, ok=True)
 
-        if response is None:
-            raise RuntimeError("Worker cerró conexión sin responder")
+    if timing:
+        tracer.add_worker_timing(op_name, started, ended, timing)
 
-        return response
+
+# Heartbeat: cualquier respuesta cuenta, incluso "Operación no soportada"
+# El tiempo de ida y vuelta le sirve al planificador como RTT medido
+def ping_worker(op_name):
+    started = time.monotonic()
+    POOL.call(op_name, {"op": "ping", "request_id": "heartbeat"}, HEARTBEAT_TIMEOUT)
+    PLANNER.observe_rtt(time.monotonic() - started)
+
+
+# Estado de salud compartido por todas las solicitudes
+REGISTRY = WorkerRegistry(
+    ALL_OPS,
+    ping=ping_worker,
+    failure_threshold=FAILURE_THRESHOLD,
+    open_timeout=OPEN_TIMEOUT,
+    heartbeat_interval=HEARTBEAT_INTERVAL
+)
+
+# 1 si el circuito del worker está cerrado (sano), 0 si no
+metricas.callback(
+    "coordinator_worker_up", "Worker disponible según el registro de salud",
+    lambda: {op_name: int(info["state"] == "closed") for op_name, info in REGISTRY.snapshot().items()},
+    labels=["worker"])
+
+
+# =====================================================
+# MEMBRESÍA (workers que se registran solos)
+# =====================================================
+
+MEMBERSHIP_LOCK = threading.Lock()
+
+
+# Se llama con el conjunto completo cada vez que alguien entra o sale:
+# rearma roles, heartbeats, capacidades y conexiones
+def apply_membership(servers, capacities):
+
+    with MEMBERSHIP_LOCK:
+
+        removed = [op_name for op_name in ALL_OPS if op_name not in servers]
+        ops = list(servers)
+
+        # Direcciones antes que heartbeats: el primer ping ya sabe a dónde ir
+        configure_workers(servers, extend_roles(FIXED_ROLES, ops) if FIXED_ROLES else None)
+        REGISTRY.set_ops(ops)
+
+        for op_name, capacity in capacities.items():
+            ROUTER.stats.set_capacity(op_name, capacity)
+
+        for op_name in removed:
+            POOL.drop(op_name)
+
+    print(f"[MEMBERS] Workers: {ALL_OPS}")
+
+
+MEMBERSHIP = Membership(lease=MEMBER_LEASE, on_change=apply_membership)
+
+
+def register_worker(payload):
+
+    name = payload.get("name")
+    host = payload.get("host")
+
+    if not isinstance(name, str) or not name or not isinstance(host, str) or not host:
+        return {"ok": False, "error": "Faltan name y host"}
+
+    try:
+        port = int(payload.get("port"))
+        capacity = float(payload.get("capacity", 1))
+    except (TypeError, ValueError):
+        return {"ok": False, "error": "port y capacity deben ser numéricos"}
+
+    if capacity <= 0:
+        return {"ok": False, "error": "capacity debe ser mayor que 0"}
+
+    MEMBERSHIP.register(name, (host, port), capacity)
+
+    return {"ok": True, "lease": MEMBERSHIP.lease, "workers": list(ALL_OPS)}
+
+
+def deregister_worker(payload):
+
+    removed = MEMBERSHIP.deregister(payload.get("name"))
+
+    return {"ok": True, "removed": removed, "workers": list(ALL_OPS)}
 
 
 # =====================================================
 # LÓGICA PARA FALLBACK
 # =====================================================
 
+# Conecta a la vez con los workers vivos que no tienen conexión abierta.
+# Los que no aceptan quedan en dead_ops (y como caídos en el registro)
+# antes de empezar, así se sabe de entrada si queda uno solo.
+def probe_workers(dead_ops):
+
+    candidates = [op_name for op_name in ALL_OPS if op_name not in dead_ops]
+
+    for op_name in POOL.probe(candidates):
+        print(f"[FAIL] {op_name} no acepta conexiones")
+        FAILOVERS.inc(worker=op_name)
+        REGISTRY.record_failure(op_name)
+        dead_ops.add(op_name)
+
+    return dead_ops
+
+
 # Si solo queda un worker vivo, ese hace todo (full_quadratic)
-def try_full_quadratic(a, b, c, request_id, dead_ops):
+# Con batch=True, a, b y c son listas y el worker resuelve todo el lote
+def try_full_quadratic(a, b, c, request_id, dead_ops, batch=False):
 
     alive = [op for op in ALL_OPS if op not in dead_ops]
 
@@ -94,55 +524,341 @@ def try_full_quadratic(a, b, c, request_id, dead_ops):
 
     op_name = alive[0]
 
+    # Vencido no se llama a nadie (ni se toma la prueba de half_open)
+    if admision.expired(admision.current_deadline()):
+        return deadline_response()
+
+    if not REGISTRY.allow(op_name):
+        dead_ops.add(op_name)
+        return {"ok": False, "error": "Perdona la demora, intenta más tarde"}
+
+    FULL_QUADRATIC_FALLBACKS.inc()
+
     try:
         print(f"[INFO] Solo queda {op_name}, usando full_quadratic")
 
-        resp = call_worker(op_name, {
+        payload = {
             "request_id": request_id,
             "op": "full_quadratic",
             "a": a,
             "b": b,
             "c": c
-        })
+        }
+
+        if batch:
+            payload["batch"] = True
+
+        resp = call_worker(op_name, payload)
 
         return resp
 
+    except DeadlineExceeded:
+        return deadline_response()
+
     except Exception:
+        FAILOVERS.inc(worker=op_name)
         dead_ops.add(op_name)
         return {"ok": False, "error": "Perdona la demora, intenta más tarde"}
 
 
-# Ejecuta una etapa intentando principal y luego sustitutos
-def run_stage(stage_key, payload, request_id, dead_ops, a, b, c):
+# Ejecuta una etapa intentando principal y luego sustitutos.
+# Si se pasa hedges (dict) y HEDGE_ENABLED, la etapa puede ir con hedging
+# y ahí queda anotado quién era el principal, el respaldo y quién ganó.
+# lane: rama del grafo; la 1 empieza por el segundo candidato vivo para
+# no caer en el mismo worker que su rama hermana
+def run_stage(stage_key, payload, request_id, dead_ops, a, b, c, hedges=None, lane=0):
+
+    started = time.monotonic()
+
+    try:
+        return _run_stage(stage_key, payload, request_id, dead_ops, a, b, c, hedges, lane)
+    finally:
+        ended = time.monotonic()
+        STAGE_SECONDS.observe(ended - started, stage=stage_key)
+
+        tracer = trazas.current()
+        if tracer is not None:
+            tracer.add(f"stage {stage_key}", started, ended)
+
+
+def _run_stage(stage_key, payload, request_id, dead_ops, a, b, c, hedges, lane):
 
     # Primero verificamos si ya solo queda uno vivo
-    fq = try_full_quadratic(a, b, c, request_id, dead_ops)
+    fq = try_full_quadratic(a, b, c, request_id, dead_ops,
+                            batch=payload.get("batch", False))
 
     if fq is not None:
         return fq, "full_quadratic"
 
-    # Intentamos principal y sustitutos
-    for op_name in ROLE_PLAN[stage_key]:
+    if HEDGE_ENABLED and hedges is not None and not payload.get("batch"):
+        return run_stage_hedged(stage_key, payload, request_id, dead_ops, hedges)
+
+    # Respuesta "overloaded" del último worker saturado (si ninguno pudo)
+    busy = None
+
+    # STAGE_LATENCY lleva lo que tardó la etapa entera, con los intentos
+    # fallidos incluidos: es lo que espera quien la pidió
+    stage_started = time.monotonic()
+
+    # Intentamos principal y sustitutos (en el orden que diga el enrutamiento)
+    for op_name in lane_order(ROUTER.order(ROLE_PLAN[stage_key]), dead_ops, lane):
 
         if op_name in dead_ops:
             continue
 
+        # Vencido no se llama a nadie (ni se toma la prueba de half_open)
+        if admision.expired(admision.current_deadline()):
+            return deadline_response(), None
+
+        # El registro lo tiene como caído: se salta sin esperar TIMEOUT
+        if not REGISTRY.allow(op_name):
+            dead_ops.add(op_name)
+            continue
+
         try:
             print(f"[TRY] {stage_key} -> {op_name}")
 
             resp = call_worker(op_name, dict(payload, request_id=request_id))
 
+            if not payload.get("batch"):
+                STAGE_LATENCY[stage_key].record(time.monotonic() - stage_started)
+
             # Si el worker responde ok, listo
             if resp.get("ok"):
                 return resp, op_name
 
+            # Saturado (pero vivo): probamos con el siguiente
+            if resp.get("error") == admision.OVERLOADED:
+                print(f"[BUSY] {op_name} saturado")
+                BUSY_WORKERS.inc(worker=op_name)
+                busy = resp
+                continue
+
             # Si el error es matemático (no de red), devolvemos de una
             return resp, op_name
 
+        except DeadlineExceeded:
+            return deadline_response(), None
+
         except Exception as e:
 
             print(f"[FAIL] {op_name} no respondió ({e})")
+            FAILOVERS.inc(worker=op_name)
+            dead_ops.add(op_name)
+
+            # Puede que no sea el único caído: se prueba a los demás a la
+            # vez y, si queda uno solo, ese resuelve todo
+            probe_workers(dead_ops)
+
+            fq = try_full_quadratic(a, b, c, request_id, dead_ops,
+                                    batch=payload.get("batch", False))
+
+            if fq is not None:
+                return fq, "full_quadratic"
+
+    if busy is not None:
+        return overloaded_response(busy), None
+
+    # Si nadie respondió
+    return {"ok": False, "error": "Perdona la demora, intenta más tarde"}, None
+
+
+# Candidatos vivos de la etapa, empezando por el número lane
+def lane_order(candidates, dead_ops, lane):
+
+    alive = [op_name for op_name in candidates if op_name not in dead_ops]
+
+    if lane == 0 or len(alive) < 2:
+        return alive
+
+    k = lane % len(alive)
+    return alive[k:] + alive[:k]
+
+
+# Todos los candidatos estaban saturados: el cliente debe reintentar
+def overloaded_response(resp):
+    return {"ok": False, "error": admision.OVERLOADED,
+            "retry_after": resp.get("retry_after", RETRY_AFTER)}
+
+
+def deadline_response():
+    DEADLINE_DROPS.inc()
+    return admision.deadline_exceeded()
+
+
+# =====================================================
+# HEDGING
+# =====================================================
+
+# Latencias recientes de cada etapa (solicitudes individuales)
+STAGE_LATENCY = {stage_key: LatencyWindow() for stage_key in STAGES}
+
+
+# Cuánto esperar al principal antes de mandar el respaldo
+def hedge_delay(stage_key):
+
+    window = STAGE_LATENCY[stage_key]
+
+    if window.count() < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+
+    return max(HEDGE_MIN_DELAY, window.percentile(HEDGE_PERCENTILE))
+
+
+def stage_failed(op_name, error, dead_ops):
+    print(f"[FAIL] {op_name} no respondió ({error})")
+    FAILOVERS.inc(worker=op_name)
+    dead_ops.add(op_name)
+    REGISTRY.record_failure(op_name)
+
+
+def run_stage_hedged(stage_key, payload, request_id, dead_ops, hedges):
+
+    candidates = [op for op in ROUTER.order(ROLE_PLAN[stage_key]) if op not in dead_ops]
+
+    # future -> (op_name, llamada, inicio)
+    running = {}
+
+    tracer = trazas.current()
+    if tracer is not None:
+        payload = dict(payload, trace=True)
+
+    deadline = admision.current_deadline()
+    if admision.expired(deadline):
+        return deadline_response(), None
+
+    def trace_failed(op_name, started, error):
+        if tracer is not None:
+            tracer.add(f"{stage_key} -> {op_name}", started, time.monotonic(),
+                       ok=False, error=str(error) or type(error).__name__)
+
+    def launch(op_name):
+
+        if op_name in dead_ops or admision.expired(deadline):
+            return False
+
+        if not REGISTRY.allow(op_name):
             dead_ops.add(op_name)
+            return False
+
+        print(f"[TRY] {stage_key} -> {op_name}")
+
+        started = ROUTER.stats.begin(op_name)
+
+        try:
+            call = POOL.start_call(op_name, admision.with_budget(
+                dict(payload, request_id=request_id), deadline))
+        except Exception as e:
+            ROUTER.stats.end(op_name, started, ok=False)
+            trace_failed(op_name, started, e)
+            stage_failed(op_name, e, dead_ops)
+            return False
+
+        running[call.future] = (op_name, call, started)
+        return True
+
+    # Desde la primera copia: si gana el respaldo, su latencia sola
+    # achicaría el percentil y los respaldos saldrían cada vez antes
+    stage_started = time.monotonic()
+
+    # Principal (si ni siquiera conecta, pasamos al siguiente)
+    primary = None
+    while candidates and primary is None:
+        op_name = candidates.pop(0)
+        if launch(op_name):
+            primary = op_name
+
+    hedge = None
+    hedge_at = time.monotonic() + hedge_delay(stage_key)
+
+    while running:
+
+        now = time.monotonic()
+        wait_until = min(started + TIMEOUT for _, _, started in running.values())
+
+        if hedge is None and candidates:
+            wait_until = min(wait_until, hedge_at)
+
+        if deadline is not None:
+            wait_until = min(wait_until, deadline)
+
+        done, _ = wait(list(running), timeout=max(0.0, wait_until - now),
+                       return_when=FIRST_COMPLETED)
+
+        for future in done:
+
+            op_name, call, started = running.pop(future)
+            error = future.exception()
+
+            if error is not None:
+                try:
+                    if call.resubmit_if_stale(error):
+                        running[call.future] = (op_name, call, started)
+                        continue
+                except Exception as e:
+                    error = e
+
+                ROUTER.stats.end(op_name, started, ok=False)
+                trace_failed(op_name, started, error)
+                stage_failed(op_name, error, dead_ops)
+                continue
+
+            resp = call.result(0)
+            ROUTER.stats.end(op_name, started)
+            REGISTRY.record_success(op_name)
+            STAGE_LATENCY[stage_key].record(time.monotonic() - stage_started)
+            trace_worker_reply(tracer, f"{stage_key} -> {op_name}", op_name, started, resp)
+
+            # Gana la primera respuesta; la otra copia se abandona.
+            # Lo que lleva esperando cuenta como su latencia (al menos eso
+            # tardó), así el enrutamiento se entera de que está lento.
+            for other_op, other_call, other_started in running.values():
+                other_call.cancel()
+                REGISTRY.release(other_op)
+                ROUTER.stats.end(other_op, other_started)
+                if tracer is not None:
+                    tracer.add(f"{stage_key} -> {other_op}", other_started, time.monotonic(),
+                               ok=False, error="descartado (hedging)")
+                print(f"[HEDGE] {stage_key}: ganó {op_name}, se descarta {other_op}")
+
+            if hedge is not None:
+                hedges[stage_key] = {"primary": primary, "hedge": hedge, "winner": op_name}
+
+            return resp, op_name
+
+        now = time.monotonic()
+
+        # Se acabó el plazo de la solicitud: se abandona lo que esté en vuelo
+        if admision.expired(deadline):
+            for op_name, call, started in running.values():
+                call.cancel()
+                REGISTRY.release(op_name)
+                ROUTER.stats.end(op_name, started)
+                trace_failed(op_name, started, DeadlineExceeded("plazo vencido"))
+            return deadline_response(), None
+
+        # Llamadas que ya pasaron TIMEOUT
+        for future, (op_name, call, started) in list(running.items()):
+            if now - started >= TIMEOUT:
+                del running[future]
+                call.cancel()
+                ROUTER.stats.end(op_name, started, ok=False)
+                error = TimeoutError(f"sin respuesta en {TIMEOUT}s")
+                trace_failed(op_name, started, error)
+                stage_failed(op_name, error, dead_ops)
+
+        # El principal está lento (no caído): mandamos el respaldo
+        if hedge is None and running and now >= hedge_at:
+            while candidates and hedge is None:
+                op_name = candidates.pop(0)
+                if launch(op_name):
+                    hedge = op_name
+                    HEDGES.inc(stage=stage_key)
+                    print(f"[HEDGE] {stage_key}: {primary} lento, respaldo en {op_name}")
+
+        # Todo lo que estaba en vuelo falló: failover normal al siguiente
+        while not running and candidates:
+            launch(candidates.pop(0))
 
     # Si nadie respondió
     return {"ok": False, "error": "Perdona la demora, intenta más tarde"}, None
@@ -152,141 +868,1062 @@ def run_stage(stage_key, payload, request_id, dead_ops, a, b, c):
 # PIPELINE PRINCIPAL
 # =====================================================
 
+CACHE = ResultCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+
+# Sin NumPy el cálculo local es un ciclo de Python por elemento
+PLANNER = ExecutionPlanner(
+    EXECUTION_PLAN,
+    local_item=3e-8 if motor_vectorial.AVAILABLE else 1.5e-6,
+    alpha=EWMA_ALPHA,
+    explore=PLANNER_EXPLORE
+)
+
+
+metricas.callback(
+    "coordinator_cache_hits_total", "Aciertos en la cache de resultados",
+    lambda: CACHE.stats()["hits"], kind="counter")
+metricas.callback(
+    "coordinator_cache_misses_total", "Fallos en la cache de resultados",
+    lambda: CACHE.stats()["misses"], kind="counter")
+metricas.callback(
+    "coordinator_cache_entries", "Entradas guardadas en la cache",
+    lambda: CACHE.stats()["entries"])
+
+
+# Solo se guarda lo que no depende del estado de la red
+def cacheable(result):
+    return result.get("ok") or result.get("error") in CACHEABLE_ERRORS
+
+
+# Hilos para los nodos del grafo que corren a la vez
+DAG_POOL = ThreadPoolExecutor(max_workers=DAG_THREADS, thread_name_prefix="grafo")
+
+
+# Envuelve fn para que corra con la traza y el plazo de la solicitud que
+# la lanzó (los dos son por hilo), esté en el hilo que esté
+def in_request_context(fn):
+
+    tracer = trazas.current()
+    deadline = admision.current_deadline()
+
+    def run(*args):
+
+        previous = trazas.current(), admision.current_deadline()
+        trazas.activate(tracer)
+        admision.set_deadline(deadline)
+
+        try:
+            return fn(*args)
+        finally:
+            trazas.activate(previous[0])
+            admision.set_deadline(previous[1])
+
+    return run
+
+
 def process(a, b, c, request_id):
 
-    dead_ops = set()
+    # Un acierto en cache evita las tres etapas
+    key = CACHE.key(a, b, c)
+    cached = CACHE.get(key)
+
+    if cached is not None:
+        if cached["ok"]:
+            return dict(cached, mode="cache")
+        return dict(cached)
 
     # Validaciones centrales (para no mandar basura a workers)
     if abs(a) < EPS:
-        return {"ok": False, "error": "Valor inválido: a no puede ser 0"}
-
-    disc = b*b - 4*a*c
-
-    if disc < 0:
-        return {"ok": False, "error": "No hay raíces reales"}
-
-    # ---- ETAPA 1: sqrt_discriminant ----
-    r1, who1 = run_stage(
-        "sqrt_discriminant",
-        {"op": "sqrt_discriminant", "a": a, "b": b, "c": c},
-        request_id,
-        dead_ops,
-        a,
-        b,
-        c
-    )
-
-    if not r1.get("ok"):
-        return r1
-
-    if who1 == "full_quadratic":
-        return {"ok": True, "mode": "single_node", "x1": r1["x1"], "x2": r1["x2"]}
-
-    sqrt_d = r1["sqrt_d"]
-
-    # ---- ETAPA 2: numerator ----
-    r2, who2 = run_stage(
-        "numerator",
-        {"op": "numerator", "b": b, "sqrt_d": sqrt_d},
-        request_id,
-        dead_ops,
-        a,
-        b,
-        c
-    )
-
-    if not r2.get("ok"):
-        return r2
-
-    if who2 == "full_quadratic":
-        return {"ok": True, "mode": "single_node", "x1": r2["x1"], "x2": r2["x2"]}
-
-    # ---- ETAPA 3: division ----
-    r3, who3 = run_stage(
-        "division",
-        {
-            "op": "division",
-            "a": a,
-            "num_plus": r2["num_plus"],
-            "num_minus": r2["num_minus"]
-        },
-        request_id,
-        dead_ops,
-        a,
-        b,
-        c
-    )
-
-    if not r3.get("ok"):
-        return r3
-
-    if who3 == "full_quadratic":
-        return {"ok": True, "mode": "single_node", "x1": r3["x1"], "x2": r3["x2"]}
+        result = {"ok": False, "error": "Valor inválido: a no puede ser 0"}
+    elif b*b - 4*a*c < 0:
+        result = {"ok": False, "error": "No hay raíces reales"}
+    else:
+        result = run_planned(a, b, c, request_id)
+
+    if cacheable(result):
+        if result["ok"]:
+            CACHE.put(key, {"ok": True, "x1": result["x1"], "x2": result["x2"]})
+        else:
+            CACHE.put(key, {"ok": False, "error": result["error"]})
+
+    return result
+
+
+# Ejecuta (a, b, c) ya validados con el plan que elija el planificador
+# y le pasa el tiempo que tardó para afinar sus estimaciones
+def run_planned(a, b, c, request_id):
+
+    plan = PLANNER.choose(1)
+    PLANS.inc(plan=plan)
+    started = time.monotonic()
+
+    if plan == LOCAL:
+        result = solve_local(a, b, c)
+    elif plan == SINGLE_HOP:
+        result = run_single_hop(a, b, c, request_id)
+    else:
+        result = run_pipeline(a, b, c, request_id)
+
+    if result.get("ok"):
+        PLANNER.observe(plan, 1, time.monotonic() - started)
+
+    tracer = trazas.current()
+    if tracer is not None:
+        tracer.add(f"plan {plan}", started, time.monotonic())
+
+    return result
+
+
+def run_pipeline(a, b, c, request_id):
+
+    # Arrancamos con los workers que el registro ya sabe caídos
+    # y los que no aceptan conexión ahora
+    dead_ops = probe_workers(REGISTRY.unavailable())
+
+    # Etapas que fueron con hedging (para el trace)
+    hedges = {}
+
+    # Nodo del grafo -> worker que lo resolvió
+    who = {}
+
+    values = {"a": a, "b": b, "c": c}
+
+    def run_node(node):
+
+        payload = {"op": node.op}
+        payload.update((name, values[name]) for name in node.inputs)
+
+        resp, op_name = run_stage(node.stage, payload, request_id, dead_ops,
+                                  a, b, c, hedges=hedges, lane=node.lane)
+
+        if not resp.get("ok"):
+            return None, resp
+
+        if op_name == "full_quadratic":
+            return None, {"ok": True, "mode": "single_node", "x1": resp["x1"], "x2": resp["x2"]}
+
+        who[node.name] = op_name
+        return {name: resp[name] for name in node.outputs}, None
+
+    # Una sola ecuación: las ramas separadas no acortan el camino crítico
+    # y serían más mensajes, así que siempre en serie
+    final = run_dag(SERIAL, values, in_request_context(run_node), DAG_POOL)
+
+    if final is not None:
+        return final
+
+    trace = dict(who)
+
+    if hedges:
+        trace["hedged"] = hedges
 
     # Resultado normal pipeline
     return {
         "ok": True,
         "mode": "pipeline",
-        "x1": r3["x1"],
-        "x2": r3["x2"],
-        "trace": {
-            "sqrt": who1,
-            "numerator": who2,
-            "division": who3
-        },
+        "x1": values["x1"],
+        "x2": values["x2"],
+        "trace": trace,
         "dead_ops": list(dead_ops)
     }
 
 
 # =====================================================
-# MANEJO CLIENTE
+# EJECUCIÓN LOCAL Y DE UN SOLO SALTO
 # =====================================================
 
-def handle_client(conn, addr):
+# Mismas cuentas que full_quadratic en los workers (mismo resultado,
+# bit a bit). Se llama con a, b, c ya validados.
+def solve_local(a, b, c):
+
+    sqrt_d = math.sqrt(b*b - 4*a*c)
+    den = 2*a
+
+    return {
+        "ok": True,
+        "mode": "local",
+        "x1": ((-b) + sqrt_d)/den,
+        "x2": ((-b) - sqrt_d)/den
+    }
+
+
+# Versión por lotes, con la misma forma de respuesta que un worker
+def solve_local_batch(a, b, c):
+
+    resp = motor_vectorial.handle_batch("full_quadratic", {"a": a, "b": b, "c": c})
+
+    if resp is not None:
+        resp["x1"], resp["x2"] = resp["x1"].tolist(), resp["x2"].tolist()
+        return resp
+
+    x1, x2 = [], []
+
+    for ai, bi, ci in zip(a, b, c):
+        r = solve_local(ai, bi, ci)
+        x1.append(r["x1"])
+        x2.append(r["x2"])
+
+    return {"ok": True, "x1": x1, "x2": x2, "errors": []}
+
+
+# full_quadratic completo en el primer worker vivo (según el enrutamiento).
+# Devuelve (respuesta, worker, dead_ops)
+def call_full_quadratic(a, b, c, request_id, batch=False):
+
+    dead_ops = probe_workers(REGISTRY.unavailable())
+
+    payload = {"request_id": request_id, "op": "full_quadratic", "a": a, "b": b, "c": c}
+
+    if batch:
+        payload["batch"] = True
 
-    payload = recv_json(conn)
+    busy = None
 
-    if not payload:
+    for op_name in ROUTER.order([op for op in ALL_OPS if op not in dead_ops]):
+
+        if admision.expired(admision.current_deadline()):
+            return deadline_response(), None, dead_ops
+
+        if not REGISTRY.allow(op_name):
+            dead_ops.add(op_name)
+            continue
+
+        try:
+            print(f"[TRY] full_quadratic -> {op_name}")
+            resp = call_worker(op_name, payload)
+
+        except DeadlineExceeded:
+            return deadline_response(), None, dead_ops
+
+        except Exception as e:
+            print(f"[FAIL] {op_name} no respondió ({e})")
+            FAILOVERS.inc(worker=op_name)
+            dead_ops.add(op_name)
+            continue
+
+        if resp.get("error") == admision.OVERLOADED:
+            print(f"[BUSY] {op_name} saturado")
+            BUSY_WORKERS.inc(worker=op_name)
+            busy = resp
+            continue
+
+        return resp, op_name, dead_ops
+
+    if busy is not None:
+        return overloaded_response(busy), None, dead_ops
+
+    return {"ok": False, "error": "Perdona la demora, intenta más tarde"}, None, dead_ops
+
+
+def run_single_hop(a, b, c, request_id):
+
+    resp, who, dead_ops = call_full_quadratic(a, b, c, request_id)
+
+    if not resp.get("ok"):
+        return resp
+
+    return {
+        "ok": True,
+        "mode": "single_hop",
+        "x1": resp["x1"],
+        "x2": resp["x2"],
+        "trace": {"full_quadratic": who},
+        "dead_ops": list(dead_ops)
+    }
+
+
+# =====================================================
+# PIPELINE POR LOTES
+# =====================================================
+#
+# Mismo pipeline de 3 etapas, pero cada etapa viaja con listas de
+# coeficientes en una sola llamada al worker. Cada elemento tiene su
+# propio ok/error: un discriminante negativo no tumba el lote entero.
+
+# Toma solo las posiciones indicadas de una lista.
+# Si no se descartó nada devolvemos la misma lista (o vista binaria)
+# sin copiar.
+def take(values, positions):
+
+    if len(positions) == len(values):
+        return values
+
+    return [values[j] for j in positions]
+
+
+# Pasa los errores por elemento de una etapa a results y
+# devuelve las posiciones que siguen vivas para la siguiente etapa
+def collect_errors(results, idx, resp):
+
+    failed = set()
+
+    for j, error in resp["errors"]:
+        results[idx[j]] = {"ok": False, "error": error}
+        failed.add(j)
+
+    if not failed:
+        return range(len(idx))
+
+    return [j for j in range(len(idx)) if j not in failed]
+
+
+# Última etapa (division o full_quadratic): arma el resultado de cada elemento
+def finish_batch(results, idx, resp):
+
+    x1, x2 = resp["x1"], resp["x2"]
+
+    for j, i in enumerate(idx):
+        results[i] = {"ok": True, "x1": x1[j], "x2": x2[j]}
+
+    for j, error in resp["errors"]:
+        results[idx[j]] = {"ok": False, "error": error}
+
+
+def process_batch(a_list, b_list, c_list, request_id):
+
+    results = [None] * len(a_list)
+
+    # Validaciones centrales por elemento (los inválidos no viajan)
+    # y consulta a la cache (los que ya conocemos tampoco)
+    idx, a, b, c = [], [], [], []
+    keys = {}
+
+    for i, (ai, bi, ci) in enumerate(zip(a_list, b_list, c_list)):
+
+        try:
+            ai, bi, ci = float(ai), float(bi), float(ci)
+        except (TypeError, ValueError):
+            results[i] = {"ok": False, "error": "a,b,c deben ser numéricos"}
+            continue
+
+        if abs(ai) < EPS:
+            results[i] = {"ok": False, "error": "Valor inválido: a no puede ser 0"}
+            continue
+
+        if bi*bi - 4*ai*ci < 0:
+            results[i] = {"ok": False, "error": "No hay raíces reales"}
+            continue
+
+        key = CACHE.key(ai, bi, ci)
+        cached = CACHE.get(key)
+
+        if cached is not None:
+            results[i] = cached
+            continue
+
+        keys[i] = key
+        idx.append(i)
+        a.append(ai)
+        b.append(bi)
+        c.append(ci)
+
+    if not idx:
+        return {"ok": True, "results": results}
+
+    plan = PLANNER.choose(len(idx))
+    started = time.monotonic()
+
+    if plan == LOCAL:
+        finish_batch(results, idx, solve_local_batch(a, b, c))
+        response = {"ok": True, "mode": "local", "results": results}
+    elif plan == SINGLE_HOP:
+        response = run_single_hop_batch(results, idx, a, b, c, request_id)
+    else:
+        response = run_batch_pipeline(results, idx, a, b, c, request_id)
+
+    if response.get("ok"):
+        PLANNER.observe(plan, len(idx), time.monotonic() - started)
+
+    # Guardamos en cache los elementos que se resolvieron bien
+    if response.get("ok"):
+        for i, key in keys.items():
+            if results[i] is not None and results[i]["ok"]:
+                CACHE.put(key, results[i])
+
+    return response
+
+
+def run_single_hop_batch(results, idx, a, b, c, request_id):
+
+    resp, who, dead_ops = call_full_quadratic(a, b, c, request_id, batch=True)
+
+    if not resp.get("ok"):
+        return resp
+
+    finish_batch(results, idx, resp)
+
+    return {
+        "ok": True,
+        "mode": "single_hop",
+        "results": results,
+        "trace": {"full_quadratic": who},
+        "dead_ops": list(dead_ops)
+    }
+
+
+# Columna de un lote como (posiciones, valores), restringida a positions.
+# positions siempre está dentro de las posiciones de la columna (solo se
+# van descartando elementos con error), así que si el largo coincide es
+# la misma lista y no se copia nada.
+def align(column, positions):
+
+    column_positions, values = column
+
+    if len(column_positions) == len(positions):
+        return values
+
+    where = {i: j for j, i in enumerate(column_positions)}
+    return [values[where[i]] for i in positions]
+
+
+# Lleva las posiciones idx (con sus a, b, c) por el grafo de etapas y
+# completa results; devuelve la respuesta final del lote
+def run_batch_pipeline(results, idx, a, b, c, request_id):
+
+    dead_ops = probe_workers(REGISTRY.unavailable())
+
+    alive = [op_name for op_name in ALL_OPS if op_name not in dead_ops]
+    split = DAG_SPLIT_MIN > 0 and len(idx) >= DAG_SPLIT_MIN and len(alive) >= 2
+    nodes = SPLIT if split else SERIAL
+
+    # Cada valor va con las posiciones a las que corresponde: las ramas
+    # pueden ir descartando elementos con error cada una por su lado
+    values = {"a": (idx, a), "b": (idx, b), "c": (idx, c)}
+    live = list(idx)
+    lock = threading.Lock()
+    who = {}
+
+    def run_node(node):
+
+        with lock:
+            positions = list(live)
+
+        payload = {"op": node.op, "batch": True}
+        payload.update((name, align(values[name], positions)) for name in node.inputs)
+
+        fa, fb, fc = (align(values[name], positions) for name in ("a", "b", "c"))
+
+        resp, op_name = run_stage(node.stage, payload, request_id, dead_ops,
+                                  fa, fb, fc, lane=node.lane)
+
+        if not resp.get("ok"):
+            return None, resp
+
+        with lock:
+
+            if op_name == "full_quadratic":
+                finish_batch(results, positions, resp)
+                return None, {"ok": True, "mode": "single_node", "results": results}
+
+            keep = collect_errors(results, positions, resp)
+
+            if len(keep) != len(positions):
+                failed = {positions[j] for j, _ in resp["errors"]}
+                live[:] = [i for i in live if i not in failed]
+
+        who[node.name] = op_name
+        kept = take(positions, keep)
+
+        return {name: (kept, take(resp[name], keep)) for name in node.outputs}, None
+
+    final = run_dag(nodes, values, in_request_context(run_node), DAG_POOL)
+
+    if final is not None:
+        return final
+
+    x1, x2 = align(values["x1"], live), align(values["x2"], live)
+
+    for j, i in enumerate(live):
+        results[i] = {"ok": True, "x1": x1[j], "x2": x2[j]}
+
+    return {
+        "ok": True,
+        "mode": "pipeline",
+        "results": results,
+        "trace": who,
+        "dead_ops": list(dead_ops)
+    }
+
+
+# =====================================================
+# LOTES EN STREAMING
+# =====================================================
+#
+# {"op": "batch", "stream": true, "chunk_size": N, "a": [...], ...}
+#
+# El trabajo se parte en trozos y cada trozo pasa por process_batch en
+# un hilo de STREAM_POOL. Con varios trozos en vuelo, el trozo k puede
+# estar en numerator mientras el k+1 está en sqrt_discriminant. Cada
+# trozo se responde apenas termina (en orden), así el primer resultado
+# no depende del tamaño del trabajo:
+#
+#   {"ok": true, "chunk": k, "offset": i, "count": n, "mode": ...,
+#    "x1": [...], "x2": [...], "errors": [[pos, msg], ...]}
+#
+# (x1/x2 en None/NaN donde hay error; pos es relativa al trozo) y al
+# final {"ok": true, "done": true, "chunks": ..., "count": ...}.
+#
+# Si el mensaje trae "more": true, los coeficientes siguen en los
+# mensajes siguientes de la misma conexión (mismo formato, sin "op"),
+# hasta uno sin "more". Solo se lee un mensaje nuevo cuando hay lugar
+# en la ventana: la memoria queda acotada aunque el trabajo sea enorme.
+# Cada mensaje tiene que llegar en KEEPALIVE_TIMEOUT segundos y el
+# "deadline_ms" del primero vale para todo el trabajo.
+
+STREAM_POOL = ThreadPoolExecutor(max_workers=STREAM_THREADS,
+                                 thread_name_prefix="stream")
+
+
+class StreamError(ValueError):
+    pass
+
+
+# Trozos (a, b, c) del trabajo, leyendo más mensajes si hacen falta
+def stream_chunks(reader, payload, chunk_size):
+
+    while True:
+
+        a_list, b_list, c_list = payload.get("a"), payload.get("b"), payload.get("c")
+
+        error = batch_fields_error(a_list, b_list, c_list)
+        if error:
+            raise StreamError(error)
+
+        for start in range(0, len(a_list), chunk_size):
+            end = start + chunk_size
+            yield a_list[start:end], b_list[start:end], c_list[start:end]
+
+        if not payload.get("more"):
+            return
+
+        try:
+            payload, _ = read_message(reader)
+        except socket.timeout:
+            raise StreamError(f"Sin datos del cliente en {KEEPALIVE_TIMEOUT}s") from None
+
+        if payload is None:
+            raise StreamError("El cliente cerró antes de terminar el trabajo")
+
+
+# Resultado de un trozo en columnas (como responde un worker a un lote)
+def chunk_message(response, k, offset, count):
+
+    message = {"ok": response.get("ok", False), "chunk": k, "offset": offset, "count": count}
+
+    if not response.get("ok"):
+        message["error"] = response.get("error")
+        return message
+
+    x1, x2, errors = [], [], []
+
+    for j, r in enumerate(response["results"]):
+        if r["ok"]:
+            x1.append(r["x1"])
+            x2.append(r["x2"])
+        else:
+            x1.append(None)
+            x2.append(None)
+            errors.append([j, r["error"]])
+
+    if "mode" in response:
+        message["mode"] = response["mode"]
+
+    message.update({"x1": x1, "x2": x2, "errors": errors})
+    return message
+
+
+# Todo sale por client.write: si en la misma conexión quedaban respuestas
+# del pool en camino, no se meten en medio de un trozo
+def handle_stream(client, reader, payload, binary, request_id, deadline=None):
+
+    try:
+        chunk_size = min(MAX_BATCH, max(1, int(payload.get("chunk_size", STREAM_CHUNK))))
+    except (TypeError, ValueError):
+        client.write({"ok": False, "done": True, "error": "chunk_size debe ser un entero",
+                      "request_id": request_id}, binary)
         return
 
+    # (trozo, posición inicial, tamaño, future) en el orden del trabajo
+    pending = deque()
+    chunks = count = 0
+
+    def send_next():
+        k, offset, n, future = pending.popleft()
+        message = chunk_message(future.result(), k, offset, n)
+        message["request_id"] = request_id
+        client.write(message, binary)
+
+    # Los trozos corren en STREAM_POOL con el plazo de la solicitud
+    admision.set_deadline(deadline)
+    solve_chunk = in_request_context(process_batch)
+    admision.set_deadline(None)
+
+    try:
+        for a, b, c in stream_chunks(reader, payload, chunk_size):
+
+            # Ventana llena: esperamos al más viejo antes de leer más
+            while len(pending) >= STREAM_WINDOW:
+                send_next()
+
+            if admision.expired(deadline):
+                raise StreamError(deadline_response()["error"])
+
+            future = STREAM_POOL.submit(solve_chunk, a, b, c, f"{request_id}-{chunks}")
+            pending.append((chunks, count, len(a), future))
+
+            chunks += 1
+            count += len(a)
+
+            # Los que ya terminaron salen sin esperar al resto
+            while pending and pending[0][3].done():
+                send_next()
+
+        while pending:
+            send_next()
+
+        final = {"ok": True, "done": True, "chunks": chunks, "count": count}
+
+    except StreamError as e:
+
+        while pending:
+            send_next()
+
+        final = {"ok": False, "done": True, "chunks": chunks, "count": count, "error": str(e)}
+
+    final["request_id"] = request_id
+    client.write(final, binary)
+
+
+# =====================================================
+# MANEJO CLIENTE
+# =====================================================
+
+# Conexión con un cliente. El hilo lector (serve_connection) manda cada
+# mensaje al pool de hilos; las respuestas salen en el orden en que
+# terminan, cada una con el request_id de su solicitud. Un cliente de una
+# sola solicitud no nota la diferencia.
+#
+# El socket se cierra cuando ya no se lee más y no queda ninguna
+# respuesta pendiente.
+class ClientConnection:
+
+    def __init__(self, conn, addr):
+
+        self.conn = conn
+        self.addr = addr
+
+        self.send_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.reading = True
+
+    # Un mensaje entero por vez; si falla el socket lanza OSError
+    def write(self, message, binary):
+        with self.send_lock:
+            send_message(self.conn, message, binary)
+
+    def send(self, message, binary):
+
+        try:
+            self.write(message, binary)
+        except OSError as e:
+            print(f"[ERROR] Cliente {self.addr}: {e}")
+
+    def begin(self):
+        with self.lock:
+            self.pending += 1
+
+    def end(self):
+
+        with self.lock:
+            self.pending -= 1
+            done = not self.reading and self.pending == 0
+
+        if done:
+            self.conn.close()
+
+    def stop_reading(self):
+
+        with self.lock:
+            self.reading = False
+            done = self.pending == 0
+
+        if done:
+            self.conn.close()
+
+
+# Lee mensajes mientras el cliente mantenga la conexión abierta. Cada
+# solicitud pide su propio cupo de admisión: sin cupo se responde
+# "overloaded" a esa sola solicitud y la conexión sigue.
+def serve_connection(conn, addr, accepted_at, pool):
+
+    client = ClientConnection(conn, addr)
+    reader = open_reader(conn)
+
+    # La espera en la cola del kernel cuenta solo para el primer mensaje
+    arrived_at = accepted_at
+
+    # Con varias solicitudes en vuelo las respuestas salen una detrás de
+    # otra: sin esto Nagle retiene cada una hasta el ACK de la anterior
+    # (~40 ms de ACK diferido del cliente)
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    try:
+        conn.settimeout(KEEPALIVE_TIMEOUT)
+
+        while True:
+
+            payload, binary = read_message(reader)
+            received_at = time.monotonic()
+
+            if payload is None:
+                return
+
+            if not isinstance(payload, dict):
+                client.send({"ok": False, "error": NOT_AN_OBJECT}, binary)
+                continue
+
+            if not ADMISSION.try_admit():
+                print(f"[REJECT] {addr} coordinador saturado")
+                REJECTED.inc()
+                client.send(ADMISSION.overloaded(payload.get("request_id")), binary)
+                continue
+
+            # Streaming: sigue leyendo de esta misma conexión hasta el final
+            if payload.get("op") == "batch" and payload.get("stream"):
+                request_id = payload.get("request_id", f"req-{int(time.time())}")
+                deadline = admision.deadline_from(
+                    payload, arrived_at if arrived_at is not None else received_at)
+                try:
+                    handle_stream(client, reader, payload, binary, request_id, deadline)
+                finally:
+                    ADMISSION.release()
+                return
+
+            client.begin()
+            pool.submit(serve_message, client, payload, binary,
+                        arrived_at if arrived_at is not None else received_at, received_at)
+            arrived_at = None
+
+    except socket.timeout:
+        pass
+
+    except Exception as e:
+        print(f"[ERROR] Cliente {addr}: {e}")
+
+    finally:
+        client.stop_reading()
+
+
+# Atiende una solicitud dentro del pool de hilos y libera su cupo al terminar
+def serve_message(client, payload, binary, arrived_at, received_at):
+
+    QUEUE_WAIT_SECONDS.observe(time.monotonic() - received_at)
+
+    try:
+        client.send(handle_message(payload, client.addr, arrived_at, received_at), binary)
+    except Exception as e:
+        print(f"[ERROR] Cliente {client.addr}: {e}")
+    finally:
+        ADMISSION.release()
+        client.end()
+
+
+# Resuelve un mensaje y devuelve la respuesta (con su request_id).
+# arrived_at: cuándo llegó (accept() para el primer mensaje de la
+# conexión); received_at: cuándo se terminó de leer.
+def handle_message(payload, addr, arrived_at, received_at):
+
+    if not isinstance(payload, dict):
+        return {"ok": False, "error": NOT_AN_OBJECT}
+
+    started = time.monotonic()
+
+    # "deadline_ms" cuenta desde que llegó: si ya venció esperando un
+    # hilo, ni se empieza
+    deadline = admision.deadline_from(payload, arrived_at)
+
+    if admision.expired(deadline):
+        print(f"[DROP] {addr} plazo vencido antes de empezar")
+        result = deadline_response()
+
+    else:
+        # "trace": true -> los tramos de esta solicitud vuelven en "spans"
+        tracer = None
+        if payload.get("trace"):
+            tracer = trazas.Tracer(origin=arrived_at)
+            tracer.add("queue", arrived_at, received_at)
+            tracer.add("receive", received_at, started)
+            trazas.activate(tracer)
+
+        admision.set_deadline(deadline)
+
+        try:
+            result = handle_request(payload)
+        finally:
+            trazas.activate(None)
+            admision.set_deadline(None)
+
+        ended = time.monotonic()
+
+        REQUEST_SECONDS.observe(ended - started,
+                                op=metricas.known_label(payload.get("op", "solve"), REQUEST_OPS),
+                                mode=result.get("mode", "error"))
+
+        if tracer is not None:
+            tracer.add("process", started, ended)
+            result = dict(result, spans=tracer.export())
+
+    # Con varias solicitudes por conexión, el cliente empareja por request_id
+    if "request_id" in payload:
+        result = dict(result, request_id=payload["request_id"])
+
+    return result
+
+
+def handle_request(payload):
+
     request_id = payload.get("request_id", f"req-{int(time.time())}")
 
+    if payload.get("op") == "batch":
+        return handle_batch(payload, request_id)
+
+    if payload.get("op") == "register":
+        return register_worker(payload)
+
+    # Los clientes pueden hablar binario (ver protocolo.py): se responde
+    # en el formato de cada mensaje, así que basta con confirmarlo
+    if payload.get("op") == "hello":
+        return {"ok": True, "wire": "binary" if payload.get("wire") == "binary" else "json"}
+
+    if payload.get("op") == "deregister":
+        return deregister_worker(payload)
+
+    # Estado interno del coordinador (cache y salud de workers)
+    if payload.get("op") == "stats":
+        return {
+            "ok": True,
+            "cache": CACHE.stats(),
+            "workers": REGISTRY.snapshot(),
+            "routing": ROUTER.snapshot(),
+            "planner": PLANNER.snapshot(),
+            "admission": ADMISSION.snapshot(),
+            "members": MEMBERSHIP.snapshot()
+        }
+
     try:
         a = float(payload.get("a"))
         b = float(payload.get("b"))
         c = float(payload.get("c"))
     except Exception:
-        send_json(conn, {"ok": False, "error": "a,b,c deben ser numéricos"})
-        return
+        return {"ok": False, "error": "a,b,c deben ser numéricos"}
+
+    return process(a, b, c, request_id)
+
+
+def batch_fields_error(a_list, b_list, c_list):
+
+    if not all(isinstance(v, (list, memoryview)) for v in (a_list, b_list, c_list)) \
+            or not len(a_list) == len(b_list) == len(c_list):
+        return "a,b,c deben ser listas del mismo tamaño"
 
-    result = process(a, b, c, request_id)
+    return None
 
-    send_json(conn, result)
+
+# Solicitud por lotes: {"op": "batch", "a": [...], "b": [...], "c": [...]}
+# (en binario las listas llegan como memoryview de float64)
+def handle_batch(payload, request_id):
+
+    a_list = payload.get("a")
+    b_list = payload.get("b")
+    c_list = payload.get("c")
+
+    error = batch_fields_error(a_list, b_list, c_list)
+    if error:
+        return {"ok": False, "error": error}
+
+    if len(a_list) > MAX_BATCH:
+        return {"ok": False, "error": f"Máximo {MAX_BATCH} ecuaciones por lote"}
+
+    return process_batch(a_list, b_list, c_list, request_id)
 
 
 # =====================================================
 # MAIN LOOP
 # =====================================================
 
-def main():
+def serve_client_connection(conn, addr, accepted_at, pool, connections):
+    try:
+        serve_connection(conn, addr, accepted_at, pool)
+    finally:
+        connections.release()
 
-    print(f"[START] Coordinador en {COORDINATOR_HOST}:{COORDINATOR_PORT}")
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+# Demasiadas conexiones abiertas: leemos la solicitud (para no cortar la
+# conexión con RST) y respondemos "overloaded" sin pasar por el pipeline.
+# rejecting es el cupo de REJECT_QUEUE que tomó quien lo encoló.
+def reject_client(conn, addr, rejecting):
 
-        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        conn.settimeout(REJECT_READ_TIMEOUT)
+        _, binary = read_message(open_reader(conn))
+        send_message(conn, ADMISSION.overloaded(), binary)
+    except Exception:
+        pass
+    finally:
+        conn.close()
+        rejecting.release()
+
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description="Coordinador cálculo cuadrático")
+    parser.add_argument("--host", default=COORDINATOR_HOST)
+    parser.add_argument("--port", type=int, default=COORDINATOR_PORT)
+    parser.add_argument("--max-inflight", "--workers", type=int, default=MAX_INFLIGHT,
+                        help="solicitudes en proceso a la vez (un hilo cada una)")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE,
+                        help="solicitudes esperando un hilo libre antes de rechazar")
+    parser.add_argument("--retry-after", type=float, default=RETRY_AFTER,
+                        help="segundos sugeridos al cliente cuando se rechaza")
+    parser.add_argument("--backlog", type=int, default=BACKLOG,
+                        help="tamaño de la cola de listen()")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS,
+                        help="conexiones de clientes abiertas a la vez")
+    parser.add_argument("--keepalive", type=float, default=KEEPALIVE_TIMEOUT,
+                        help="segundos que una conexión puede quedar sin mensajes")
+    parser.add_argument("--routing", choices=sorted(STRATEGIES), default=ROUTING_STRATEGY,
+                        help="estrategia para elegir el worker de cada etapa")
+    parser.add_argument("--hedge", action="store_true", default=HEDGE_ENABLED,
+                        help="activar hedging de etapas lentas")
+    parser.add_argument("--plan", choices=PLAN_MODES, default=EXECUTION_PLAN,
+                        help="cómo resolver cada solicitud (auto = el plan más barato)")
+    parser.add_argument("--worker", action="append", default=[],
+                        metavar="NOMBRE=HOST:PUERTO",
+                        help="worker de operaciones (repetir por cada uno); reemplaza OP_SERVERS")
+    parser.add_argument("--roles", default=None,
+                        metavar="ETAPA=op,op;...",
+                        help="orden de workers por etapa (por defecto se rotan los workers)")
+    parser.add_argument("--dynamic", action="store_true",
+                        help="sin workers fijos: solo los que se registren")
+    parser.add_argument("--member-lease", type=float, default=MEMBER_LEASE,
+                        help="segundos que dura el registro de un worker sin renovarlo")
+    parser.add_argument("--dag-split", type=int, default=DAG_SPLIT_MIN,
+                        help="lotes desde este tamaño van con x1 y x2 en ramas separadas "
+                             "(0 = siempre en serie)")
+    parser.add_argument("--cache-size", type=int, default=CACHE_MAX_ENTRIES,
+                        help="entradas como máximo en la cache de resultados (0 = sin cache)")
+    parser.add_argument("--connect-timeout", type=float, default=CONNECT_TIMEOUT,
+                        help="segundos para conectar con un worker")
+    parser.add_argument("--read-timeout", type=float, default=TIMEOUT,
+                        help="segundos para esperar la respuesta de un worker")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="puerto HTTP de métricas Prometheus (0 = desactivado)")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+
+    args = parse_args(argv)
+
+    global HEDGE_ENABLED, TIMEOUT, FIXED_ROLES, DAG_SPLIT_MIN, KEEPALIVE_TIMEOUT
+
+    if args.roles:
+        FIXED_ROLES = parse_role_plan(args.roles)
+
+    if args.dynamic:
+        servers = {}
+    elif args.worker:
+        servers = parse_servers(",".join(args.worker))
+    else:
+        servers = dict(OP_SERVERS)
+
+    # Los fijos entran como miembros que no vencen (valida los roles)
+    configure_workers(servers, FIXED_ROLES)
+    MEMBERSHIP.lease = args.member_lease
+    MEMBERSHIP.set_static(servers)
+
+    CACHE.max_entries = args.cache_size
+    HEDGE_ENABLED = args.hedge
+    DAG_SPLIT_MIN = args.dag_split
+    KEEPALIVE_TIMEOUT = args.keepalive
+    TIMEOUT = args.read_timeout
+    POOL.connect_timeout = args.connect_timeout
+    ROUTER.set_strategy(args.routing)
+    PLANNER.set_mode(args.plan)
+
+    ADMISSION.max_inflight = args.max_inflight
+    ADMISSION.max_queue = args.max_queue
+    ADMISSION.retry_after = args.retry_after
+
+    print(f"[START] Coordinador en {args.host}:{args.port} "
+          f"(max_inflight={args.max_inflight}, max_queue={args.max_queue}, "
+          f"backlog={args.backlog}, cache={args.cache_size}, "
+          f"hedge={HEDGE_ENABLED}, routing={args.routing}, plan={args.plan}, "
+          f"dag_split={DAG_SPLIT_MIN}, "
+          f"timeouts={args.connect_timeout}s conexión / {args.read_timeout}s respuesta)")
+    print(f"[START] Workers: {OP_SERVERS}")
+    print(f"[START] Roles: {ROLE_PLAN}")
+
+    # Un hilo por solicitud en proceso; las admitidas de más esperan en
+    # la cola del pool (como mucho max_queue, lo controla ADMISSION)
+    pool = ThreadPoolExecutor(max_workers=args.max_inflight,
+                              thread_name_prefix="cliente")
+
+    # Heartbeats en segundo plano hacia cada worker
+    REGISTRY.start()
+    MEMBERSHIP.start()
+
+    metricas.serve(args.metrics_port, args.host)
+
+    # Un hilo lector por conexión abierta, como mucho max_connections
+    connections = threading.BoundedSemaphore(args.max_connections)
+
+    # Pool pequeño solo para responder rechazos sin frenar el accept()
+    reject_pool = ThreadPoolExecutor(max_workers=2,
+                                     thread_name_prefix="rechazo")
+    rejecting = threading.BoundedSemaphore(REJECT_QUEUE)
 
-        server.bind((COORDINATOR_HOST, COORDINATOR_PORT))
-        server.listen(5)
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
 
-        while True:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-            conn, addr = server.accept()
+        server.bind((args.host, args.port))
+        server.listen(args.backlog)
 
-            # Solo un cliente a la vez (simplificado)
-            handle_client(conn, addr)
-            conn.close()
+        try:
+            while True:
+
+                conn, addr = server.accept()
+                accepted_at = time.monotonic()
+
+                # Demasiadas conexiones abiertas: rechazo inmediato
+                if not connections.acquire(blocking=False):
+                    print(f"[REJECT] {addr} demasiadas conexiones abiertas")
+                    REJECTED.inc()
+                    if rejecting.acquire(blocking=False):
+                        reject_pool.submit(reject_client, conn, addr, rejecting)
+                    else:
+                        conn.close()
+                    continue
+
+                threading.Thread(
+                    target=serve_client_connection,
+                    args=(conn, addr, accepted_at, pool, connections),
+                    name=f"conexion-{addr[0]}:{addr[1]}",
+                    daemon=True
+                ).start()
+
+        finally:
+            pool.shutdown(wait=False)
+            reject_pool.shutdown(wait=False)
+            STREAM_POOL.shutdown(wait=False)
+            DAG_POOL.shutdown(wait=False)
+            REGISTRY.stop()
+            MEMBERSHIP.stop()
+            POOL.close_all()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,180 @@
+import time
+import random
+import threading
+
+# ==========================================
+# ENRUTAMIENTO DE ETAPAS
+# ==========================================
+#
+# Decide en qué orden se prueban los candidatos de una etapa. ROLE_PLAN
+# sigue diciendo quiénes pueden hacerla; la estrategia decide a quién ir
+# primero según la carga de cada worker:
+#
+#   static            -> el orden de ROLE_PLAN (comportamiento original)
+#   least_outstanding -> primero el que tiene menos solicitudes en vuelo
+#   ewma              -> primero el de menor latencia promedio (EWMA),
+#                        multiplicada por (en vuelo + 1) para no mandar
+#                        todo al más rápido cuando se empieza a cargar
+#   p2c               -> "power of two choices": se comparan dos al azar
+#                        y va primero el menos cargado
+#
+# Las estadísticas (en vuelo + latencia) las alimenta call_worker.
+#
+# Cada worker puede tener una capacidad (peso relativo, 1 por defecto):
+# la carga que comparan las estrategias es en vuelo / capacidad, así un
+# worker con el doble de capacidad recibe cerca del doble de tráfico.
+
+
+class WorkerStats:
+
+    def __init__(self):
+        self.in_flight = 0
+        self.ewma = None
+        self.calls = 0
+        self.failures = 0
+
+
+class WorkerStatsTable:
+
+    def __init__(self, alpha=0.2):
+
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.workers = {}
+        self.capacity = {}
+
+    # Llamar con self.lock tomado
+    def _get(self, op_name):
+
+        stats = self.workers.get(op_name)
+
+        if stats is None:
+            stats = self.workers[op_name] = WorkerStats()
+
+        return stats
+
+    # Marca el inicio de una llamada; devuelve el instante para end()
+    def begin(self, op_name):
+
+        with self.lock:
+            self._get(op_name).in_flight += 1
+
+        return time.monotonic()
+
+    def end(self, op_name, started, ok=True):
+
+        elapsed = time.monotonic() - started
+
+        with self.lock:
+            stats = self._get(op_name)
+            stats.in_flight = max(0, stats.in_flight - 1)
+            stats.calls += 1
+
+            if not ok:
+                stats.failures += 1
+                return
+
+            if stats.ewma is None:
+                stats.ewma = elapsed
+            else:
+                stats.ewma = self.alpha * elapsed + (1 - self.alpha) * stats.ewma
+
+    def in_flight(self, op_name):
+        stats = self.workers.get(op_name)
+        return 0 if stats is None else stats.in_flight
+
+    def set_capacity(self, op_name, capacity):
+        self.capacity[op_name] = max(float(capacity), 1e-3)
+
+    # En vuelo relativo a la capacidad del worker
+    def load(self, op_name):
+        return self.in_flight(op_name) / self.capacity.get(op_name, 1.0)
+
+    # Un worker sin medir cuenta como el más rápido, para que reciba
+    # tráfico y se pueda medir
+    def latency(self, op_name):
+        stats = self.workers.get(op_name)
+        return 0.0 if stats is None or stats.ewma is None else stats.ewma
+
+    def snapshot(self):
+
+        with self.lock:
+            return {
+                op_name: {
+                    "in_flight": stats.in_flight,
+                    "ewma_ms": None if stats.ewma is None else stats.ewma * 1000,
+                    "calls": stats.calls,
+                    "failures": stats.failures,
+                    "capacity": self.capacity.get(op_name, 1.0)
+                }
+                for op_name, stats in self.workers.items()
+            }
+
+
+# ==========================================
+# ESTRATEGIAS
+# ==========================================
+#
+# Todas reciben los candidatos en el orden de ROLE_PLAN y devuelven una
+# lista con los mismos workers reordenados. Los empates respetan ROLE_PLAN.
+
+def order_static(candidates, stats):
+    return list(candidates)
+
+
+def order_least_outstanding(candidates, stats):
+    return sorted(candidates, key=stats.load)
+
+
+def order_ewma(candidates, stats):
+
+    def cost(op_name):
+        return stats.latency(op_name) * (stats.in_flight(op_name) + 1) \
+            / stats.capacity.get(op_name, 1.0)
+
+    return sorted(candidates, key=cost)
+
+
+def order_power_of_two(candidates, stats):
+
+    if len(candidates) < 2:
+        return list(candidates)
+
+    first, second = random.sample(list(candidates), 2)
+
+    def load(op_name):
+        return (stats.load(op_name), stats.latency(op_name))
+
+    best = first if load(first) <= load(second) else second
+
+    return [best] + [op for op in candidates if op != best]
+
+
+STRATEGIES = {
+    "static": order_static,
+    "least_outstanding": order_least_outstanding,
+    "ewma": order_ewma,
+    "p2c": order_power_of_two,
+}
+
+
+class RoutingPolicy:
+
+    def __init__(self, strategy="static", alpha=0.2):
+
+        self.stats = WorkerStatsTable(alpha=alpha)
+        self.set_strategy(strategy)
+
+    def set_strategy(self, strategy):
+
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Estrategia desconocida: {strategy}")
+
+        self.strategy = strategy
+        self.order_fn = STRATEGIES[strategy]
+
+    def order(self, candidates):
+        return self.order_fn(candidates, self.stats)
+
+    def snapshot(self):
+        return {"strategy": self.strategy, "workers": self.stats.snapshot()}
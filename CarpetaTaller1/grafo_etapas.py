@@ -0,0 +1,105 @@
+from concurrent.futures import wait, FIRST_COMPLETED
+
+# ==========================================
+# GRAFO DE ETAPAS (DAG)
+# ==========================================
+#
+# El pipeline es un grafo chico: cada nodo es una operación de un worker
+# con entradas y salidas con nombre. Un nodo sale apenas están todas sus
+# entradas, así los que no dependen entre sí van a la vez (y a workers
+# distintos).
+#
+# SERIAL: las tres etapas de siempre, una detrás de otra
+#
+#   sqrt_discriminant(a, b, c) -> numerator(b, sqrt_d) -> division(a, num_plus, num_minus)
+#
+# SPLIT: x1 y x2 no dependen entre sí; cada rama va por su lado
+#
+#                          numerator_plus(b, sqrt_d)  -> division_plus(a, num_plus)   -> x1
+#   sqrt_discriminant  <
+#                          numerator_minus(b, sqrt_d) -> division_minus(a, num_minus) -> x2
+#
+# Cada valor depende del anterior, así que el camino crítico sigue
+# siendo de tres saltos; lo que se gana es que en un lote cada rama
+# mueve y calcula la mitad, en dos workers a la vez. El denominador
+# (2a) solo depende de a, que está desde el principio: cada división lo
+# calcula con su a y no espera a nadie más que a su numerador.
+#
+# lane elige el worker: la rama 0 prefiere el primero de la lista de la
+# etapa y la rama 1 el segundo, así las dos no caen en el mismo.
+
+
+class DagNode:
+
+    def __init__(self, name, stage, op, inputs, outputs, lane=0):
+        self.name = name          # nombre en el trace de la respuesta
+        self.stage = stage        # etapa de ROLE_PLAN (quiénes pueden hacerlo)
+        self.op = op              # operación del worker
+        self.inputs = inputs
+        self.outputs = outputs
+        self.lane = lane
+
+
+SERIAL = (
+    DagNode("sqrt", "sqrt_discriminant", "sqrt_discriminant", ("a", "b", "c"), ("sqrt_d",)),
+    DagNode("numerator", "numerator", "numerator", ("b", "sqrt_d"), ("num_plus", "num_minus")),
+    DagNode("division", "division", "division", ("a", "num_plus", "num_minus"), ("x1", "x2")),
+)
+
+SPLIT = (
+    DagNode("sqrt", "sqrt_discriminant", "sqrt_discriminant", ("a", "b", "c"), ("sqrt_d",)),
+    DagNode("numerator_plus", "numerator", "numerator_plus", ("b", "sqrt_d"), ("num_plus",)),
+    DagNode("numerator_minus", "numerator", "numerator_minus", ("b", "sqrt_d"), ("num_minus",), lane=1),
+    DagNode("division_plus", "division", "division_plus", ("a", "num_plus"), ("x1",)),
+    DagNode("division_minus", "division", "division_minus", ("a", "num_minus"), ("x2",), lane=1),
+)
+
+
+# Ejecuta el grafo. values trae las entradas iniciales (a, b, c) y se va
+# completando con las salidas de cada nodo.
+#
+# run_node(node) -> (salidas, final): salidas es un dict con los valores
+# que produjo; final, si no es None, termina el grafo con esa respuesta
+# (error, plazo vencido o full_quadratic) sin esperar a los demás nodos.
+#
+# Si hay un solo nodo listo y nada en vuelo se ejecuta en este mismo
+# hilo: el grafo SERIAL no paga ningún cambio de hilo.
+def run_dag(nodes, values, run_node, executor):
+
+    pending = list(nodes)
+    running = {}
+
+    while pending or running:
+
+        ready = [node for node in pending if all(name in values for name in node.inputs)]
+
+        for node in ready:
+            pending.remove(node)
+
+        if len(ready) == 1 and not running:
+            outputs, final = run_node(ready[0])
+            if final is not None:
+                return final
+            values.update(outputs)
+            continue
+
+        for node in ready:
+            running[executor.submit(run_node, node)] = node
+
+        if not running:
+            raise ValueError(f"Nodos sin entradas: {[node.name for node in pending]}")
+
+        done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+
+        for future in done:
+
+            del running[future]
+            outputs, final = future.result()
+
+            # Lo que siga en vuelo termina solo; su resultado se descarta
+            if final is not None:
+                return final
+
+            values.update(outputs)
+
+    return None
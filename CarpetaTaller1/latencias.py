@@ -0,0 +1,37 @@
+import threading
+from collections import deque
+
+# ==========================================
+# VENTANA DE LATENCIAS
+# ==========================================
+#
+# Guarda las últimas N latencias (en segundos) y calcula percentiles
+# sobre ellas. Sirve para decidir cuánto esperar antes de mandar una
+# solicitud de respaldo (hedging).
+
+
+class LatencyWindow:
+
+    def __init__(self, size=1024):
+
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def count(self):
+        return len(self.samples)
+
+    # Percentil p (0-100) de la ventana; None si todavía no hay muestras
+    def percentile(self, p):
+
+        with self.lock:
+            ordered = sorted(self.samples)
+
+        if not ordered:
+            return None
+
+        pos = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[pos]
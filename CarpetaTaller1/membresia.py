@@ -0,0 +1,137 @@
+import time
+import threading
+
+# ==========================================
+# MEMBRESÍA DE WORKERS
+# ==========================================
+#
+# Además de los workers configurados (OP_SERVERS / --worker), cualquier
+# worker puede anunciarse al coordinador al arrancar:
+#
+#   {"op": "register", "name": "op4", "host": "10.43.99.140", "port": 5001,
+#    "capacity": 2}
+#
+# El registro dura "lease" segundos: el worker lo renueva mientras está
+# vivo (cada lease / 3) y al apagarse manda "deregister". Si se cae sin
+# avisar, deja de renovar y sale solo cuando vence. Los configurados a
+# mano no vencen.
+#
+# capacity es un peso relativo (1 = un proceso normal) que usa el
+# enrutamiento para repartir la carga.
+#
+# Cada cambio en el conjunto llama a on_change(servidores, capacidades)
+# con todos los workers (primero los configurados, después los
+# registrados en el orden en que llegaron).
+
+
+class Membership:
+
+    def __init__(self, lease=15.0, on_change=None):
+
+        self.lease = lease
+        self.on_change = on_change
+
+        self.lock = threading.Lock()
+        self.static = {}     # nombre -> (host, puerto)
+        self.members = {}    # nombre -> {"address", "capacity", "expires"}
+
+        self.stop_event = threading.Event()
+
+    def set_static(self, servers):
+
+        with self.lock:
+            self.static = dict(servers)
+
+        self._changed()
+
+    def register(self, name, address, capacity=1.0):
+
+        with self.lock:
+
+            current = self.members.get(name)
+            changed = current is None or current["address"] != address \
+                or current["capacity"] != capacity
+
+            self.members[name] = {
+                "address": address,
+                "capacity": capacity,
+                "expires": time.monotonic() + self.lease
+            }
+
+        if changed:
+            print(f"[MEMBERS] {name} registrado en {address[0]}:{address[1]} (capacidad {capacity})")
+            self._changed()
+
+        return changed
+
+    def deregister(self, name, reason="se dio de baja"):
+
+        with self.lock:
+            removed = self.members.pop(name, None) is not None
+
+        if removed:
+            print(f"[MEMBERS] {name} {reason}")
+            self._changed()
+
+        return removed
+
+    # Quita los registros que no se renovaron a tiempo
+    def expire(self):
+
+        now = time.monotonic()
+
+        with self.lock:
+            expired = [name for name, member in self.members.items() if member["expires"] <= now]
+
+        for name in expired:
+            self.deregister(name, reason="no renovó su registro (se asume caído)")
+
+        return expired
+
+    def servers(self):
+
+        with self.lock:
+            servers = dict(self.static)
+            servers.update({name: m["address"] for name, m in self.members.items()})
+            return servers
+
+    def capacities(self):
+
+        with self.lock:
+            capacities = {name: 1.0 for name in self.static}
+            capacities.update({name: m["capacity"] for name, m in self.members.items()})
+            return capacities
+
+    def snapshot(self):
+
+        now = time.monotonic()
+
+        with self.lock:
+            return {
+                "lease": self.lease,
+                "static": sorted(self.static),
+                "registered": {
+                    name: {
+                        "address": f"{m['address'][0]}:{m['address'][1]}",
+                        "capacity": m["capacity"],
+                        "expires_in": round(m["expires"] - now, 1)
+                    }
+                    for name, m in self.members.items()
+                }
+            }
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self.servers(), self.capacities())
+
+    # Hilo que revisa los vencimientos
+    def start(self):
+
+        def loop():
+            while not self.stop_event.wait(self.lease / 3):
+                self.expire()
+
+        threading.Thread(target=loop, name="membresia", daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
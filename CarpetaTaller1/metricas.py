@@ -0,0 +1,256 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==========================================
+# MÉTRICAS (formato de texto de Prometheus)
+# ==========================================
+#
+# Contadores e histogramas en memoria del proceso. Registrar un valor
+# cuesta una búsqueda binaria y un lock corto; armar el texto solo pasa
+# cuando alguien consulta el puerto de métricas (GET /metrics), en un
+# hilo aparte.
+#
+# Los histogramas usan buckets logarítmicos (cada uno el doble del
+# anterior, de 1 µs a ~67 s): error relativo acotado en todo el rango
+# con pocos buckets.
+#
+# Cada métrica se crea una sola vez por nombre: pedirla de nuevo con el
+# mismo nombre devuelve la misma (así varios módulos pueden compartirla).
+
+LOG_BUCKETS = tuple(1e-6 * 2 ** k for k in range(27))
+
+# Etiqueta para los valores que no están en la lista de conocidos
+UNKNOWN = "unknown"
+
+
+# Un valor que viene de afuera (p. ej. el "op" de un mensaje) solo se
+# usa como etiqueta si es uno de los conocidos: cada valor distinto es
+# una serie nueva y un cliente podría crear todas las que quisiera
+def known_label(value, known):
+    return value if isinstance(value, str) and value in known else UNKNOWN
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+
+    if extra:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+
+        key = tuple(labels.get(name, "") for name in self.labels)
+
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+
+        with self.lock:
+            items = list(self.values.items())
+
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}"
+                for key, value in items]
+
+
+class Histogram:
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LOG_BUCKETS):
+
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+
+        self.lock = threading.Lock()
+        self.values = {}    # etiquetas -> [conteo por bucket, suma, total]
+
+    def observe(self, seconds, **labels):
+
+        key = tuple(labels.get(name, "") for name in self.labels)
+        pos = bisect.bisect_left(self.buckets, seconds)
+
+        with self.lock:
+
+            entry = self.values.get(key)
+
+            if entry is None:
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+            entry[0][pos] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    def render(self):
+
+        with self.lock:
+            items = [(key, list(counts), total, n) for key, (counts, total, n) in self.values.items()]
+
+        lines = []
+
+        for key, counts, total, n in items:
+
+            cumulative = 0
+
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labels, key, f'le="{bound:.6g}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {n}")
+
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {n}")
+
+        return lines
+
+
+# Valor que se calcula recién al consultar (no cuesta nada en el camino
+# caliente). fn() devuelve un número o un dict {valores de etiquetas: número}.
+class Callback:
+
+    def __init__(self, name, help, fn, labels=(), kind="gauge"):
+
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def render(self):
+
+        try:
+            values = self.fn()
+        except Exception:
+            return []
+
+        if not isinstance(values, dict):
+            values = {(): values}
+
+        return [f"{self.name}{_format_labels(self.labels, key if isinstance(key, tuple) else (key,))} {value}"
+                for key, value in values.items()]
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+
+        with self.lock:
+
+            metric = self.metrics.get(name)
+
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get_or_create(Counter, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=LOG_BUCKETS):
+        return self._get_or_create(Histogram, name, help, labels, buckets)
+
+    def callback(self, name, help, fn, labels=(), kind="gauge"):
+        return self._get_or_create(Callback, name, help, fn, labels, kind)
+
+    def render(self):
+
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+# Registro del proceso (como el de prometheus_client)
+REGISTRY = MetricsRegistry()
+
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+callback = REGISTRY.callback
+
+
+# ==========================================
+# PUERTO DE MÉTRICAS
+# ==========================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    registry = REGISTRY
+
+    def do_GET(self):
+
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = self.registry.render().encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Sin una línea por consulta en la consola
+    def log_message(self, format, *args):
+        pass
+
+
+# Sirve /metrics en un hilo aparte. port = 0 lo desactiva. Si el puerto
+# está ocupado se avisa y se sigue sin métricas (no tumba al proceso).
+def serve(port, host="0.0.0.0", registry=REGISTRY):
+
+    if not port:
+        return None
+
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        print(f"[METRICS] No se pudo abrir el puerto {port} ({e})")
+        return None
+
+    server.daemon_threads = True
+
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+
+    print(f"[METRICS] http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,207 @@
+# ==========================================
+# MOTOR VECTORIAL (NumPy)
+# ==========================================
+#
+# Mismas operaciones que handle_operation() de los workers, pero sobre
+# arreglos float64 contiguos: una sola pasada de NumPy por etapa en vez
+# de un ciclo de Python por elemento.
+#
+# Cada elemento lleva un código de estado (uint8). 0 = ok, otro valor =
+# error de ese elemento; los demás elementos del lote no se ven afectados.
+#
+# NumPy es opcional: si no está instalado AVAILABLE queda en False y los
+# workers siguen usando el camino escalar. Solo se revisa si está
+# instalado; el import de verdad (lento) se hace con el primer lote,
+# así un worker arranca rápido aunque nunca reciba lotes.
+
+import importlib.util
+
+np = None
+
+AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+
+def _load_numpy():
+
+    global np
+
+    if np is None:
+        import numpy
+        np = numpy
+
+
+EPS = 1e-12
+
+# Códigos de estado por elemento
+STATUS_OK = 0
+STATUS_A_ZERO = 1
+STATUS_NEGATIVE_DISC = 2
+STATUS_DIV_ZERO = 3
+
+# Mismos mensajes que el camino escalar
+ERROR_MESSAGES = {
+    STATUS_A_ZERO: "a no puede ser 0",
+    STATUS_NEGATIVE_DISC: "No hay raíces reales",
+    STATUS_DIV_ZERO: "División por cero",
+}
+
+
+# ==========================================
+# OPERACIONES VECTORIALES
+# ==========================================
+
+# Arreglo float64 contiguo. Si hay valores no numéricos (None, texto)
+# lanza ValueError: float64 los convertiría en NaN sin avisar.
+def as_array(values):
+
+    arr = np.asarray(values)
+
+    if arr.dtype.kind not in "biuf":
+        raise ValueError("Valores no numéricos en el lote")
+
+    return np.ascontiguousarray(arr, dtype=np.float64)
+
+
+def sqrt_discriminant(a, b, c):
+
+    status = np.zeros(a.shape, dtype=np.uint8)
+
+    disc = b*b - 4*a*c
+
+    status[disc < 0] = STATUS_NEGATIVE_DISC
+    status[np.abs(a) < EPS] = STATUS_A_ZERO
+
+    # Solo sacamos raíz donde el elemento es válido; el resto queda NaN
+    sqrt_d = np.full(a.shape, np.nan)
+    np.sqrt(disc, out=sqrt_d, where=status == STATUS_OK)
+
+    return {"sqrt_d": sqrt_d, "disc": disc}, status
+
+
+def numerator(b, sqrt_d):
+
+    status = np.zeros(b.shape, dtype=np.uint8)
+
+    return {"num_plus": sqrt_d - b, "num_minus": -b - sqrt_d}, status
+
+
+def numerator_plus(b, sqrt_d):
+    return {"num_plus": sqrt_d - b}, np.zeros(b.shape, dtype=np.uint8)
+
+
+def numerator_minus(b, sqrt_d):
+    return {"num_minus": -b - sqrt_d}, np.zeros(b.shape, dtype=np.uint8)
+
+
+# 2a y el estado de cada elemento (división por cero)
+def denominator(a):
+
+    status = np.zeros(a.shape, dtype=np.uint8)
+
+    den = 2*a
+    status[np.abs(den) < EPS] = STATUS_DIV_ZERO
+
+    return den, status
+
+
+# num / den donde el elemento es válido; el resto queda NaN
+def divide(num, den, status):
+
+    out = np.full(num.shape, np.nan)
+    np.divide(num, den, out=out, where=status == STATUS_OK)
+
+    return out
+
+
+def division(a, num_plus, num_minus):
+
+    den, status = denominator(a)
+
+    return {"x1": divide(num_plus, den, status), "x2": divide(num_minus, den, status)}, status
+
+
+def division_plus(a, num_plus):
+
+    den, status = denominator(a)
+
+    return {"x1": divide(num_plus, den, status)}, status
+
+
+def division_minus(a, num_minus):
+
+    den, status = denominator(a)
+
+    return {"x2": divide(num_minus, den, status)}, status
+
+
+def full_quadratic(a, b, c):
+
+    r1, status = sqrt_discriminant(a, b, c)
+    r2, _ = numerator(b, r1["sqrt_d"])
+
+    # Si a es 0 el elemento ya quedó marcado en sqrt_discriminant
+    r3, _ = division(a, r2["num_plus"], r2["num_minus"])
+
+    r3["x1"][status != STATUS_OK] = np.nan
+    r3["x2"][status != STATUS_OK] = np.nan
+
+    return r3, status
+
+
+# Operación -> (función, campos de entrada en orden)
+OPERATIONS = {
+    "sqrt_discriminant": (sqrt_discriminant, ("a", "b", "c")),
+    "numerator": (numerator, ("b", "sqrt_d")),
+    "division": (division, ("a", "num_plus", "num_minus")),
+    "numerator_plus": (numerator_plus, ("b", "sqrt_d")),
+    "numerator_minus": (numerator_minus, ("b", "sqrt_d")),
+    "division_plus": (division_plus, ("a", "num_plus")),
+    "division_minus": (division_minus, ("a", "num_minus")),
+    "full_quadratic": (full_quadratic, ("a", "b", "c")),
+}
+
+
+# ==========================================
+# ADAPTADOR PARA EL WORKER
+# ==========================================
+
+# Convierte salidas + estado al formato de respuesta por lotes.
+# Las salidas quedan como arreglos (NaN donde el elemento falló) para
+# que el protocolo binario las envíe sin copiar; "errors" solo lista
+# los elementos con error como [posición, mensaje].
+def to_response(outputs, status):
+
+    result = {"ok": True}
+    result.update(outputs)
+
+    result["errors"] = [
+        [int(i), ERROR_MESSAGES[int(status[i])]]
+        for i in np.flatnonzero(status)
+    ]
+
+    return result
+
+
+# Ejecuta una operación por lotes. Devuelve None si no se puede usar el
+# motor (NumPy no instalado o datos no numéricos) para que el worker
+# caiga al camino escalar.
+def handle_batch(op, payload):
+
+    if not AVAILABLE or op not in OPERATIONS:
+        return None
+
+    _load_numpy()
+
+    func, inputs = OPERATIONS[op]
+
+    try:
+        columns = [as_array(payload[name]) for name in inputs]
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    if any(col.ndim != 1 or col.shape != columns[0].shape for col in columns):
+        return None
+
+    outputs, status = func(*columns)
+
+    return to_response(outputs, status)
@@ -0,0 +1,257 @@
+import os
+import time
+import signal
+import socket
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+# ==========================================
+# WORKER MULTIPROCESO (SO_REUSEPORT)
+# ==========================================
+#
+# Un proceso de Python usa un solo núcleo (GIL). En este modo un proceso
+# supervisor arranca N procesos hijos y cada uno abre su propio socket
+# en el MISMO puerto con SO_REUSEPORT: el kernel reparte las conexiones
+# entre ellos. El supervisor no atiende tráfico:
+#
+#   - si un hijo se cae, arranca otro en su lugar
+#   - SIGHUP  -> reinicio ordenado: arranca una generación nueva de hijos
+#                (que cargan el código del disco de nuevo), espera a que
+#                estén escuchando y recién ahí pide a los viejos que
+#                terminen lo que tienen en vuelo y salgan
+#   - SIGTERM / Ctrl+C -> apaga a todos los hijos de forma ordenada
+#
+# Los hijos se crean con "spawn" (intérprete nuevo), así que el destino
+# debe ser una función de módulo y sus argumentos deben poder copiarse
+# a otro proceso.
+
+# Campos por proceso en la memoria compartida
+FIELDS = ("pid", "ready_at", "requests", "errors", "batch_items", "busy_seconds")
+
+PID, READY_AT, REQUESTS, ERRORS, BATCH_ITEMS, BUSY_SECONDS = range(len(FIELDS))
+
+# Campos que se suman entre procesos
+COUNTERS = (REQUESTS, ERRORS, BATCH_ITEMS, BUSY_SECONDS)
+
+
+class SharedStats:
+
+    # Una fila por proceso más una fila final donde se acumula lo de los
+    # procesos que ya terminaron (para que los totales no retrocedan).
+    # Cada fila tiene un solo escritor: su proceso, o el supervisor
+    # cuando la fila no tiene dueño.
+    def __init__(self, slots=1):
+
+        self.slots = slots
+        self.values = RawArray("d", (slots + 1) * len(FIELDS))
+        self.slot = 0
+
+    def _base(self, slot):
+        return slot * len(FIELDS)
+
+    def get(self, slot, field):
+        return self.values[self._base(slot) + field]
+
+    # (supervisor) Pasa lo de la fila al acumulado y la deja en cero
+    def reset_slot(self, slot):
+
+        base = self._base(slot)
+        retired = self._base(self.slots)
+
+        for field in COUNTERS:
+            self.values[retired + field] += self.values[base + field]
+
+        for field in range(len(FIELDS)):
+            self.values[base + field] = 0
+
+    # (hijo) Toma una fila como propia
+    def bind(self, slot):
+        self.slot = slot
+        self.values[self._base(slot) + PID] = os.getpid()
+
+    # (hijo) Ya está escuchando
+    def mark_ready(self):
+        self.values[self._base(self.slot) + READY_AT] = time.time()
+
+    def record(self, ok, items, seconds):
+
+        base = self._base(self.slot)
+
+        self.values[base + REQUESTS] += 1
+        self.values[base + BATCH_ITEMS] += items
+        self.values[base + BUSY_SECONDS] += seconds
+
+        if not ok:
+            self.values[base + ERRORS] += 1
+
+    def snapshot(self):
+
+        processes = []
+        totals = {FIELDS[field]: self.get(self.slots, field) for field in COUNTERS}
+
+        for slot in range(self.slots):
+
+            pid = int(self.get(slot, PID))
+
+            if not pid:
+                continue
+
+            entry = {"slot": slot, "pid": pid, "ready": self.get(slot, READY_AT) > 0}
+
+            for field in COUNTERS:
+                entry[FIELDS[field]] = self.get(slot, field)
+                totals[FIELDS[field]] += entry[FIELDS[field]]
+
+            processes.append(entry)
+
+        for entry in processes + [totals]:
+            for name in ("requests", "errors", "batch_items"):
+                entry[name] = int(entry[name])
+
+        return {"processes": processes, "totals": totals}
+
+
+# Punto de entrada de cada hijo. Ctrl+C llega a todo el grupo de
+# procesos: los hijos lo ignoran y esperan el SIGTERM del supervisor.
+def _child(target, args, stats, slot):
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    stats.bind(slot)
+    target(*args, stats=stats)
+
+
+class Supervisor:
+
+    # target(*args, stats=...) corre el servidor de un hijo con SO_REUSEPORT
+    # grace: segundos que tiene un hijo para terminar lo que está en vuelo
+    def __init__(self, name, target, args, processes, grace=10.0):
+
+        self.name = name
+        self.target = target
+        self.args = args
+        self.processes = processes
+        self.grace = grace
+
+        self.ctx = multiprocessing.get_context("spawn")
+
+        # Dos juegos de filas: uno por generación (el reinicio ordenado
+        # tiene a las dos generaciones vivas a la vez por un momento)
+        self.stats = SharedStats(2 * processes)
+        self.generation = 0
+        self.children = {}
+
+        self.stopping = False
+        self.restart_requested = False
+
+    def current_slots(self):
+        start = self.generation * self.processes
+        return range(start, start + self.processes)
+
+    def spawn(self, slot):
+
+        self.stats.reset_slot(slot)
+
+        child = self.ctx.Process(
+            target=_child,
+            args=(self.target, self.args, self.stats, slot),
+            name=f"{self.name}-{slot}"
+        )
+        child.start()
+
+        self.children[slot] = child
+
+    # Pide a los hijos que terminen (SIGTERM) y espera hasta grace;
+    # al que no alcance se lo mata
+    def retire(self, slots):
+
+        retiring = [(slot, self.children.pop(slot)) for slot in slots if slot in self.children]
+
+        for slot, child in retiring:
+            if child.is_alive():
+                child.terminate()
+
+        deadline = time.monotonic() + self.grace
+
+        for slot, child in retiring:
+            child.join(max(0.0, deadline - time.monotonic()))
+            if child.is_alive():
+                print(f"[{self.name}] {child.name} no terminó a tiempo, se mata")
+                child.kill()
+                child.join()
+
+            # Sus contadores pasan al acumulado
+            self.stats.reset_slot(slot)
+
+    def graceful_restart(self):
+
+        old = list(self.current_slots())
+        self.generation ^= 1
+
+        print(f"[{self.name}] Reinicio ordenado: arrancando generación nueva")
+
+        for slot in self.current_slots():
+            self.spawn(slot)
+
+        # Los viejos siguen atendiendo hasta que los nuevos escuchan
+        deadline = time.monotonic() + self.grace
+
+        while time.monotonic() < deadline:
+            pending = [slot for slot in self.current_slots()
+                       if self.children[slot].is_alive() and self.stats.get(slot, READY_AT) == 0]
+            if not pending:
+                break
+            time.sleep(0.05)
+
+        self.retire(old)
+
+        print(f"[{self.name}] Reinicio ordenado completo")
+
+    def run(self):
+
+        def on_stop(signum, frame):
+            self.stopping = True
+
+        def on_restart(signum, frame):
+            self.restart_requested = True
+
+        signal.signal(signal.SIGTERM, on_stop)
+        signal.signal(signal.SIGINT, on_stop)
+        signal.signal(signal.SIGHUP, on_restart)
+
+        print(f"[{self.name}] Supervisor pid={os.getpid()} con {self.processes} procesos "
+              f"(SIGHUP = reinicio ordenado)")
+
+        for slot in self.current_slots():
+            self.spawn(slot)
+
+        try:
+            while not self.stopping:
+
+                time.sleep(0.2)
+
+                if self.restart_requested:
+                    self.restart_requested = False
+                    self.graceful_restart()
+                    continue
+
+                # Hijos caídos: se reemplazan en la misma fila
+                for slot in self.current_slots():
+                    child = self.children[slot]
+                    if not child.is_alive() and not self.stopping:
+                        print(f"[{self.name}] {child.name} terminó "
+                              f"(código {child.exitcode}), arrancando otro")
+                        self.spawn(slot)
+
+        finally:
+            self.retire(list(self.children))
+
+
+# Arranca el supervisor y no vuelve hasta que se apaga
+def run_prefork(name, target, args, processes, grace=10.0):
+
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("El modo multiproceso necesita SO_REUSEPORT (Linux/BSD)")
+
+    Supervisor(name, target, args, processes, grace=grace).run()
@@ -0,0 +1,126 @@
+import random
+import threading
+
+# ==========================================
+# PLANIFICADOR DE EJECUCIÓN
+# ==========================================
+#
+# Elige cómo resolver una solicitud de n ecuaciones:
+#
+#   pipeline   -> las 3 etapas repartidas entre workers (3 idas y vueltas)
+#   single_hop -> full_quadratic completo en un solo worker (1 ida y vuelta)
+#   local      -> el coordinador lo calcula él mismo (sin red)
+#
+# Cada plan se estima como costo fijo + costo por elemento * n. Los
+# valores arrancan en estimaciones iniciales y se van corrigiendo (EWMA)
+# con lo que de verdad tarda cada ejecución (y, para el costo fijo de los
+# planes remotos, con el RTT de los heartbeats). En modo "auto" se elige el
+# plan más barato; de vez en cuando (explore) se prueba un plan remoto
+# para que su estimación no quede vieja.
+
+PIPELINE = "pipeline"
+SINGLE_HOP = "single_hop"
+LOCAL = "local"
+
+PLANS = (PIPELINE, SINGLE_HOP, LOCAL)
+MODES = ("auto",) + PLANS
+
+# Hasta este tamaño una medición se usa para corregir el costo fijo;
+# por encima, el costo por elemento
+SMALL_REQUEST = 8
+
+
+class PlanCost:
+
+    def __init__(self, fixed, per_item):
+        self.fixed = fixed
+        self.per_item = per_item
+        self.samples = 0
+
+    def estimate(self, n):
+        return self.fixed + self.per_item * n
+
+
+class ExecutionPlanner:
+
+    # rtt: ida y vuelta estimada a un worker (s)
+    # remote_item: costo por elemento en un worker, incluida la transferencia
+    # local_item: costo por elemento calculando en el coordinador
+    def __init__(self, mode="pipeline", rtt=0.0005, remote_item=5e-7,
+                 local_item=1.5e-6, alpha=0.2, explore=0.01):
+
+        self.alpha = alpha
+        self.explore = explore
+        self.lock = threading.Lock()
+
+        self.costs = {
+            PIPELINE: PlanCost(3 * rtt, 3 * remote_item),
+            SINGLE_HOP: PlanCost(rtt, remote_item),
+            LOCAL: PlanCost(0.0, local_item),
+        }
+
+        self.chosen = {plan: 0 for plan in PLANS}
+        self.set_mode(mode)
+
+    def set_mode(self, mode):
+
+        if mode not in MODES:
+            raise ValueError(f"Modo de planificación desconocido: {mode}")
+
+        self.mode = mode
+
+    def choose(self, n):
+
+        if self.mode != "auto":
+            plan = self.mode
+
+        elif random.random() < self.explore:
+            plan = random.choice((PIPELINE, SINGLE_HOP))
+
+        else:
+            with self.lock:
+                plan = min(PLANS, key=lambda p: self.costs[p].estimate(n))
+
+        with self.lock:
+            self.chosen[plan] += 1
+
+        return plan
+
+    # Registra cuánto tardó de verdad un plan con n elementos
+    def observe(self, plan, n, seconds):
+
+        with self.lock:
+            cost = self.costs[plan]
+            cost.samples += 1
+
+            if n <= SMALL_REQUEST:
+                fixed = max(0.0, seconds - cost.per_item * n)
+                cost.fixed = self.alpha * fixed + (1 - self.alpha) * cost.fixed
+            else:
+                per_item = max(0.0, (seconds - cost.fixed) / n)
+                cost.per_item = self.alpha * per_item + (1 - self.alpha) * cost.per_item
+
+    # RTT medido fuera de las solicitudes (heartbeats): corrige el costo
+    # fijo de los planes remotos sin tener que ejecutarlos
+    def observe_rtt(self, seconds):
+
+        with self.lock:
+            for plan, hops in ((PIPELINE, 3), (SINGLE_HOP, 1)):
+                cost = self.costs[plan]
+                cost.fixed = self.alpha * hops * seconds + (1 - self.alpha) * cost.fixed
+
+    def snapshot(self):
+
+        with self.lock:
+            return {
+                "mode": self.mode,
+                "chosen": dict(self.chosen),
+                "costs": {
+                    plan: {
+                        "fixed_us": cost.fixed * 1e6,
+                        "per_item_ns": cost.per_item * 1e9,
+                        "samples": cost.samples
+                    }
+                    for plan, cost in self.costs.items()
+                }
+            }
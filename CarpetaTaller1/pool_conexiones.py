@@ -0,0 +1,343 @@
+import time
+import socket
+import threading
+import itertools
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from protocolo import send_json, send_message, open_reader, read_json, read_message
+import metricas
+
+# ==========================================
+# POOL DE CONEXIONES PERSISTENTES A WORKERS
+# ==========================================
+#
+# En vez de abrir un socket nuevo por cada etapa, el coordinador mantiene
+# unas pocas conexiones abiertas con cada worker. Por cada conexión pueden
+# ir varias solicitudes a la vez: cada una lleva un request_id único y un
+# hilo lector empareja las respuestas con quien las está esperando.
+#
+# Si se pide binary=True, al conectar se negocia el formato binario con
+# un "hello"; un worker que no lo entiende responde error y la conexión
+# sigue en JSON.
+
+
+CONNECT_SECONDS = metricas.histogram(
+    "pool_connect_seconds", "Tiempo abriendo una conexión a un worker (incluye hello)", ["worker"])
+CONNECT_FAILURES = metricas.counter(
+    "pool_connect_failures_total", "Conexiones a workers que no se pudieron abrir", ["worker"])
+
+
+class WorkerChannel:
+
+    def __init__(self, op_name, address, connect_timeout, binary=False):
+
+        self.op_name = op_name
+
+        # El timeout aplica al connect y a la negociación; después el hilo
+        # lector queda bloqueado esperando respuestas y cada llamada pone
+        # su propio timeout
+        started = time.perf_counter()
+
+        try:
+            self.sock = socket.create_connection(address, timeout=connect_timeout)
+        except OSError:
+            CONNECT_FAILURES.inc(worker=op_name)
+            raise
+
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self.reader = open_reader(self.sock)
+
+        try:
+            self.binary = binary and self._negotiate_binary()
+        except Exception:
+            CONNECT_FAILURES.inc(worker=op_name)
+            self.sock.close()
+            raise
+
+        CONNECT_SECONDS.observe(time.perf_counter() - started, worker=op_name)
+
+        self.sock.settimeout(None)
+
+        self.send_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        self.pending = {}
+        self.closed = False
+
+        self.thread = threading.Thread(
+            target=self._read_loop,
+            name=f"canal-{op_name}",
+            daemon=True
+        )
+        self.thread.start()
+
+    def _negotiate_binary(self):
+
+        send_json(self.sock, {"op": "hello", "wire": "binary", "request_id": "hello"})
+
+        reply = read_json(self.reader)
+
+        if reply is None:
+            raise ConnectionError("Worker cerró conexión durante la negociación")
+
+        return reply.get("ok", False) and reply.get("wire") == "binary"
+
+    def in_flight(self):
+        return len(self.pending)
+
+    # Registra la solicitud y la envía; devuelve un Future con la respuesta
+    def submit(self, wire_id, payload):
+
+        future = Future()
+
+        with self.pending_lock:
+            if self.closed:
+                raise ConnectionError(f"Conexión con {self.op_name} cerrada")
+            self.pending[wire_id] = future
+
+        try:
+            with self.send_lock:
+                send_message(self.sock, payload, self.binary)
+        except OSError as e:
+            self.close(e)
+            raise
+
+        return future
+
+    # Ya no esperamos esta respuesta (timeout); si llega se descarta
+    def forget(self, wire_id):
+        with self.pending_lock:
+            self.pending.pop(wire_id, None)
+
+    def _read_loop(self):
+
+        error = None
+
+        try:
+            while True:
+
+                msg, _ = read_message(self.reader)
+
+                if msg is None:
+                    error = ConnectionError("Worker cerró conexión sin responder")
+                    break
+
+                with self.pending_lock:
+                    future = self.pending.pop(msg.get("request_id"), None)
+
+                if future is not None and not future.done():
+                    future.set_result(msg)
+
+        except Exception as e:
+            error = e
+
+        self.close(error)
+
+    # Cierra la conexión y falla todas las solicitudes que seguían esperando
+    def close(self, error=None):
+
+        with self.pending_lock:
+            self.closed = True
+            pending = self.pending
+            self.pending = {}
+
+        if error is None:
+            error = ConnectionError(f"Conexión con {self.op_name} cerrada")
+
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        self.sock.close()
+
+
+class WorkerPool:
+
+    # resolve(op_name) -> (host, port); se consulta en cada conexión nueva
+    def __init__(self, resolve, size, connect_timeout, binary=False):
+
+        self.resolve = resolve
+        self.size = size
+        self.connect_timeout = connect_timeout
+        self.binary = binary
+
+        self.lock = threading.Lock()
+        self.channels = {}
+        self.opening = {}      # op_name -> conexiones que se están abriendo
+        self.opened = threading.Condition(self.lock)
+        self.seq = itertools.count(1)
+
+    # Elige la conexión menos ocupada; abre otra si todas tienen trabajo
+    # y aún no llegamos al tamaño máximo del pool. Las que se están
+    # abriendo ya ocupan su lugar: dos llamadas a la vez no pasan del tamaño.
+    def _get_channel(self, op_name):
+
+        with self.lock:
+
+            while True:
+
+                channels = [ch for ch in self.channels.get(op_name, []) if not ch.closed]
+                self.channels[op_name] = channels
+                opening = self.opening.get(op_name, 0)
+
+                best = min(channels, key=lambda ch: ch.in_flight()) if channels else None
+
+                if best is not None and (best.in_flight() == 0
+                                         or len(channels) + opening >= self.size):
+                    return best, False
+
+                if len(channels) + opening < self.size:
+                    self.opening[op_name] = opening + 1
+                    break
+
+                # Lleno y sin ninguna abierta todavía: esperamos a las
+                # que se están abriendo (o a que fallen)
+                self.opened.wait()
+
+        # Conectamos fuera del lock para no frenar a los demás workers
+        try:
+            channel = WorkerChannel(op_name, self.resolve(op_name),
+                                    self.connect_timeout, self.binary)
+        except BaseException:
+            with self.lock:
+                self.opening[op_name] -= 1
+                self.opened.notify_all()
+            raise
+
+        with self.lock:
+            self.opening[op_name] -= 1
+            self.channels.setdefault(op_name, []).append(channel)
+            self.opened.notify_all()
+
+        return channel, True
+
+    def connected(self, op_name):
+
+        with self.lock:
+            return any(not ch.closed for ch in self.channels.get(op_name, []))
+
+    # Abre a la vez una conexión con cada worker que no tenga ninguna
+    # abierta y devuelve los que no se pudieron conectar. Así varios
+    # workers caídos cuestan un connect_timeout en total, no uno por cada uno.
+    def probe(self, op_names):
+
+        missing = [op_name for op_name in op_names if not self.connected(op_name)]
+        failed = set()
+
+        def connect(op_name):
+            try:
+                self._get_channel(op_name)
+            except Exception:
+                failed.add(op_name)
+
+        threads = [threading.Thread(target=connect, args=(op_name,), daemon=True)
+                   for op_name in missing]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return failed
+
+    # Envía sin esperar la respuesta. Devuelve un PendingCall para
+    # esperarla (result) o abandonarla (cancel), por ejemplo cuando
+    # otra copia de la misma etapa respondió antes.
+    def start_call(self, op_name, payload):
+
+        request_id = payload.get("request_id")
+        wire_id = f"{request_id}#{next(self.seq)}"
+        message = dict(payload, request_id=wire_id)
+
+        channel, fresh = self._get_channel(op_name)
+
+        try:
+            future = channel.submit(wire_id, message)
+
+        except (ConnectionError, OSError):
+            # Una conexión reutilizada puede haber muerto sin que lo
+            # supiéramos (worker reiniciado): reintentamos una vez con
+            # una conexión nueva antes de darlo por caído
+            if fresh:
+                raise
+
+            channel, fresh = self._get_channel(op_name)
+            future = channel.submit(wire_id, message)
+
+        return PendingCall(self, op_name, channel, wire_id, message,
+                           future, request_id, fresh)
+
+    def call(self, op_name, payload, timeout):
+        return self.start_call(op_name, payload).result(timeout)
+
+    # El worker ya no forma parte del sistema: se cierran sus conexiones
+    def drop(self, op_name):
+
+        with self.lock:
+            channels = self.channels.pop(op_name, [])
+
+        for channel in channels:
+            channel.close()
+
+    def close_all(self):
+
+        with self.lock:
+            channels = [ch for chs in self.channels.values() for ch in chs]
+            self.channels = {}
+
+        for channel in channels:
+            channel.close()
+
+
+class PendingCall:
+
+    def __init__(self, pool, op_name, channel, wire_id, message, future,
+                 request_id, fresh):
+
+        self.pool = pool
+        self.op_name = op_name
+        self.channel = channel
+        self.wire_id = wire_id
+        self.message = message
+        self.future = future
+        self.request_id = request_id
+        self.fresh = fresh
+
+    def result(self, timeout):
+
+        try:
+            response = self.future.result(timeout)
+
+        except FutureTimeout:
+            self.cancel()
+            raise TimeoutError(f"{self.op_name} no respondió en {timeout}s")
+
+        except (ConnectionError, OSError) as e:
+            if not self.resubmit_if_stale(e):
+                raise
+            return self.result(timeout)
+
+        response["request_id"] = self.request_id
+        return response
+
+    # La conexión reutilizada se cayó con la solicitud en vuelo:
+    # la reenvía una sola vez por una conexión nueva
+    def resubmit_if_stale(self, error):
+
+        if self.fresh or not isinstance(error, (ConnectionError, OSError)):
+            return False
+
+        self.channel, _ = self.pool._get_channel(self.op_name)
+        self.fresh = True
+        self.future = self.channel.submit(self.wire_id, self.message)
+        return True
+
+    # Ya no nos interesa la respuesta; si llega, el lector la descarta
+    def cancel(self):
+        self.channel.forget(self.wire_id)
@@ -0,0 +1,455 @@
+import sys
+import json
+import math
+import time
+import struct
+from array import array
+
+import metricas
+
+# ==========================================
+# PROTOCOLO COMÚN (coordinador + workers)
+# ==========================================
+#
+# Formato por defecto: cada mensaje es un JSON terminado en "\n".
+# Las conexiones pueden ser de una sola solicitud (cliente -> coordinador)
+# o persistentes (coordinador -> worker), donde viajan muchos mensajes
+# uno detrás de otro por el mismo socket.
+#
+# Formato binario (opcional, se negocia con "hello"):
+#
+#   MAGIC (1 byte) | largo encabezado (uint32) | largo datos (uint32)
+#   encabezado JSON (campos que no son float + índice de floats)
+#   datos: los campos float empaquetados como float64 seguidos y, al
+#          final, los campos de bytes (BYTE_FIELDS) tal cual
+#
+# El primer byte de un JSON nunca es MAGIC, así que en la misma conexión
+# se puede distinguir un mensaje de otro sin estado adicional.
+
+MAGIC = b"\xb1"
+FRAME_HEADER = struct.Struct("<II")
+
+# Tiempo de serialización (sin contar la red), por formato
+ENCODE_SECONDS = metricas.histogram(
+    "protocol_encode_seconds", "Tiempo armando un mensaje", ["format"])
+DECODE_SECONDS = metricas.histogram(
+    "protocol_decode_seconds", "Tiempo interpretando un mensaje", ["format"])
+
+# Campos que viajan empaquetados como float64 (escalares o listas)
+FLOAT_FIELDS = frozenset([
+    "a", "b", "c", "disc", "sqrt_d",
+    "num_plus", "num_minus", "x1", "x2",
+    "rows", "roots",
+])
+
+# Campos que son arreglos de bytes (un código por fila en los trabajos
+# masivos): en binario viajan crudos, en JSON como lista de enteros
+BYTE_FIELDS = frozenset(["row_status"])
+
+# Orden de bytes de esta máquina; el receptor invierte si no coincide
+BYTE_ORDER = "<" if sys.byteorder == "little" else ">"
+
+
+# Para json.dumps: arreglos (array, memoryview, NumPy) pasan a lista.
+# NaN marca elementos con error en los lotes y en JSON viaja como null.
+def _json_default(obj):
+
+    if hasattr(obj, "tolist"):
+        values = obj.tolist()
+        if isinstance(values, list):
+            return [None if v != v else v for v in values]
+        return values
+
+    raise TypeError(f"{type(obj).__name__} no es serializable a JSON")
+
+
+# Enviamos JSON terminando en \n para saber cuándo termina el mensaje
+def encode_json(data):
+    return (json.dumps(data, default=_json_default) + "\n").encode("utf-8")
+
+
+def send_json(conn, data):
+    conn.sendall(encode_message(data))
+
+
+# Lee un solo mensaje JSON (conexiones de una sola solicitud)
+def recv_json(conn):
+    return read_json(FramedReader(conn))
+
+
+# ==========================================
+# FORMATO BINARIO
+# ==========================================
+
+# Vista float64 de una lista o arreglo, sin copiar si ya es float64 contiguo
+def _float_view(values):
+
+    try:
+        view = memoryview(values)
+        if view.format == "d" and view.c_contiguous:
+            return view
+    except TypeError:
+        pass
+
+    try:
+        packed = array("d", values)
+    except TypeError:
+        # Listas con None (elementos con error): viajan como NaN
+        packed = array("d", [math.nan if v is None else v for v in values])
+
+    return memoryview(packed)
+
+
+def encode_frame(data):
+
+    header = {}
+    scalars = []
+    vectors = []
+    raw = []
+
+    for name, value in data.items():
+
+        if name in BYTE_FIELDS and value is not None:
+            raw.append((name, memoryview(value).cast("B")))
+            continue
+
+        if name in FLOAT_FIELDS and isinstance(value, float):
+            scalars.append(name)
+            continue
+
+        if name in FLOAT_FIELDS and not isinstance(value, (int, str, bool)) \
+                and value is not None:
+            vectors.append((name, _float_view(value)))
+            continue
+
+        header[name] = value
+
+    header["_s"] = scalars
+    header["_v"] = [[name, len(view)] for name, view in vectors]
+    header["_o"] = BYTE_ORDER
+
+    if raw:
+        header["_b"] = [[name, len(view)] for name, view in raw]
+
+    head = json.dumps(header, default=_json_default).encode("utf-8")
+
+    parts = [array("d", [data[name] for name in scalars]).tobytes()]
+    parts.extend(view.cast("B") for name, view in vectors)
+    parts.extend(view for name, view in raw)
+
+    body_len = sum(len(p) for p in parts)
+
+    return b"".join([MAGIC, FRAME_HEADER.pack(len(head), body_len), head] + parts)
+
+
+# Reconstruye el mensaje. Las listas float quedan como memoryview sobre
+# el buffer recibido (sin copiar): se indexan e iteran como una lista y
+# NumPy las toma directo con np.asarray().
+def decode_frame(head, body):
+
+    data = json.loads(head.decode("utf-8"))
+
+    scalars = data.pop("_s", [])
+    vectors = data.pop("_v", [])
+    raw = data.pop("_b", [])
+    swap = data.pop("_o", BYTE_ORDER) != BYTE_ORDER
+
+    view = memoryview(body)
+    float_bytes = 8 * (len(scalars) + sum(count for _, count in vectors))
+    floats = view[:float_bytes]
+
+    if swap:
+        # Otra arquitectura: hay que copiar para invertir bytes
+        fixed = array("d")
+        fixed.frombytes(floats)
+        fixed.byteswap()
+        floats = memoryview(fixed).cast("B")
+
+    floats = floats.cast("d")
+
+    for i, name in enumerate(scalars):
+        data[name] = floats[i]
+
+    offset = len(scalars)
+    for name, count in vectors:
+        data[name] = floats[offset:offset + count]
+        offset += count
+
+    offset = float_bytes
+    for name, count in raw:
+        data[name] = view[offset:offset + count]
+        offset += count
+
+    return data
+
+
+def send_frame(conn, data):
+    conn.sendall(encode_frame(data))
+
+
+# Bytes del mensaje en el formato pedido (binario o JSON)
+def encode_message(data, binary=False):
+
+    started = time.perf_counter()
+    out = encode_frame(data) if binary else encode_json(data)
+    ENCODE_SECONDS.observe(time.perf_counter() - started, format="binary" if binary else "json")
+
+    return out
+
+
+def _decode_frame_timed(head, body):
+
+    started = time.perf_counter()
+    data = decode_frame(head, body)
+    DECODE_SECONDS.observe(time.perf_counter() - started, format="binary")
+
+    return data
+
+
+def _decode_json_timed(line):
+
+    started = time.perf_counter()
+    data = json.loads(line)
+    DECODE_SECONDS.observe(time.perf_counter() - started, format="json")
+
+    # None queda reservado para "se cerró la conexión": un "null" se
+    # entrega como lista vacía, que tampoco es un objeto
+    return [] if data is None else data
+
+
+# Envía en el formato pedido (binario o JSON)
+def send_message(conn, data, binary=False):
+    conn.sendall(encode_message(data, binary))
+
+
+# ==========================================
+# LECTOR DE MENSAJES
+# ==========================================
+#
+# Un solo buffer (bytearray) por conexión que se reutiliza: recv_into
+# escribe directo en él, la búsqueda del "\n" continúa donde quedó la
+# vez anterior (no se vuelve a recorrer lo ya revisado) y lo que llegue
+# después de un mensaje queda guardado para el siguiente. Así un mensaje
+# grande cuesta lineal y se pueden encadenar varios por el mismo socket.
+
+# Tamaño máximo de un mensaje (JSON o frame binario)
+MAX_MESSAGE_SIZE = 64 * 1024 * 1024
+
+# Respuesta a un JSON válido que no es un objeto ([1, 2], 3, "x"...)
+NOT_AN_OBJECT = "El mensaje debe ser un objeto JSON"
+
+# Tamaño inicial del buffer y de cada lectura
+RECV_SIZE = 64 * 1024
+
+
+class MessageTooLarge(ValueError):
+    pass
+
+
+class FramedReader:
+
+    def __init__(self, conn, max_size=MAX_MESSAGE_SIZE):
+
+        self.conn = conn
+        self.max_size = max_size
+
+        self.buf = bytearray(RECV_SIZE)
+        self.start = 0      # inicio del próximo mensaje
+        self.end = 0        # fin de los datos recibidos
+        self.scanned = 0    # hasta dónde ya buscamos "\n"
+
+    def buffered(self):
+        return self.end - self.start
+
+    # Trae más datos del socket. Devuelve False si el otro lado cerró.
+    def _fill(self):
+
+        # Todo lo recibido ya se consumió: volvemos al inicio del buffer
+        if self.start == self.end:
+            self.start = self.end = self.scanned = 0
+
+        if self.end == len(self.buf):
+
+            pending = self.end - self.start
+
+            if self.start > 0:
+                # Movemos lo pendiente al inicio en vez de crecer
+                self.buf[:pending] = self.buf[self.start:self.end]
+                self.scanned -= self.start
+                self.start = 0
+                self.end = pending
+            else:
+                self.buf.extend(bytes(len(self.buf)))
+
+        view = memoryview(self.buf)[self.end:]
+        try:
+            n = self.conn.recv_into(view)
+        finally:
+            view.release()
+
+        if n == 0:
+            return False
+
+        self.end += n
+        return True
+
+    # Primer byte del próximo mensaje (b"" si se cerró la conexión)
+    def peek(self):
+
+        if self.start == self.end and not self._fill():
+            return b""
+
+        return self.buf[self.start:self.start + 1]
+
+    # Siguiente línea sin el "\n" (None si se cerró la conexión)
+    def read_line(self):
+
+        while True:
+
+            pos = self.buf.find(b"\n", self.scanned, self.end)
+
+            if pos >= 0:
+                line = self.buf[self.start:pos]
+                self.start = pos + 1
+                self.scanned = self.start
+                return line
+
+            self.scanned = self.end
+
+            if self.end - self.start > self.max_size:
+                raise MessageTooLarge(f"Mensaje de más de {self.max_size} bytes")
+
+            if not self._fill():
+                return None
+
+    # Exactamente n bytes en un buffer propio (None si se cerró antes).
+    # Lo que ya estaba en el buffer se copia y el resto se recibe directo
+    # en el destino, sin pasar por el buffer compartido.
+    def read_exact(self, n):
+
+        if n > self.max_size:
+            raise MessageTooLarge(f"Mensaje de más de {self.max_size} bytes")
+
+        out = bytearray(n)
+        got = min(n, self.end - self.start)
+
+        out[:got] = self.buf[self.start:self.start + got]
+        self.start += got
+        self.scanned = max(self.scanned, self.start)
+
+        view = memoryview(out)
+        try:
+            while got < n:
+                received = self.conn.recv_into(view[got:])
+                if received == 0:
+                    return None
+                got += received
+        finally:
+            view.release()
+
+        return out
+
+
+def open_reader(conn):
+    return FramedReader(conn)
+
+
+# Lee el siguiente mensaje JSON (las líneas en blanco se saltean).
+# Devuelve None cuando el otro lado cerró la conexión.
+def read_json(reader):
+
+    while True:
+
+        line = reader.read_line()
+
+        if line is None:
+            return None
+
+        if line.strip():
+            return _decode_json_timed(line)
+
+
+# Lee el siguiente mensaje en cualquiera de los dos formatos.
+# Devuelve (mensaje, binario) o (None, False) si se cerró la conexión.
+def read_message(reader):
+
+    # Líneas en blanco entre mensajes: se saltean, como en read_json
+    while True:
+
+        first = reader.peek()
+
+        if not first:
+            return None, False
+
+        if first == MAGIC:
+            break
+
+        line = reader.read_line()
+
+        if line is None:
+            return None, False
+
+        if line.strip():
+            return _decode_json_timed(line), False
+
+    prefix = reader.read_exact(1 + FRAME_HEADER.size)
+    if prefix is None:
+        return None, False
+
+    head_len, body_len = FRAME_HEADER.unpack(prefix[1:])
+
+    if head_len + body_len > reader.max_size:
+        raise MessageTooLarge(f"Mensaje de más de {reader.max_size} bytes")
+
+    head = reader.read_exact(head_len)
+    body = reader.read_exact(body_len)
+
+    if head is None or body is None:
+        return None, False
+
+    return _decode_frame_timed(head, body), True
+
+
+# ==========================================
+# LECTURA CON ASYNCIO
+# ==========================================
+#
+# Lo mismo que read_message() pero sobre un asyncio.StreamReader. El
+# StreamReader se debe crear con limit=MAX_MESSAGE_SIZE para que una
+# línea JSON larga no se corte antes de tiempo.
+
+async def read_message_async(reader, max_size=MAX_MESSAGE_SIZE):
+
+    # asyncio solo lo necesita quien ya lo está usando: no se importa
+    # arriba para no alargar el arranque de los demás
+    import asyncio
+
+    try:
+        first = await reader.readexactly(1)
+
+        # Líneas en blanco entre mensajes: se saltean, como en read_json
+        while first != MAGIC:
+
+            line = first if first == b"\n" else first + await reader.readuntil(b"\n")
+
+            if line.strip():
+                return _decode_json_timed(line), False
+
+            first = await reader.readexactly(1)
+
+        prefix = await reader.readexactly(FRAME_HEADER.size)
+        head_len, body_len = FRAME_HEADER.unpack(prefix)
+
+        if head_len + body_len > max_size:
+            raise MessageTooLarge(f"Mensaje de más de {max_size} bytes")
+
+        head = await reader.readexactly(head_len)
+        body = await reader.readexactly(body_len)
+
+    except asyncio.IncompleteReadError:
+        return None, False
+
+    except asyncio.LimitOverrunError:
+        raise MessageTooLarge(f"Mensaje de más de {max_size} bytes")
+
+    return _decode_frame_timed(head, body), True
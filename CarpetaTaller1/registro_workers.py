@@ -0,0 +1,213 @@
+import time
+import threading
+
+# ==========================================
+# REGISTRO DE WORKERS (salud + circuit breaker)
+# ==========================================
+#
+# Vive todo lo que dura el coordinador, no una solicitud. Cada worker
+# tiene un circuit breaker:
+#
+#   closed    -> el worker responde, el tráfico pasa normal
+#   open      -> falló: se salta de inmediato (sin esperar TIMEOUT)
+#                hasta que pasen open_timeout segundos
+#   half_open -> se deja pasar UNA prueba; si sale bien vuelve a closed,
+#                si falla vuelve a open
+#
+# Un hilo de heartbeat por worker hace ping cada heartbeat_interval
+# segundos, también a los caídos: detecta caídas antes de que las sufra
+# una solicitud y recupera a un worker en cuanto vuelve, sin que una
+# solicitud real tenga que pagar el TIMEOUT de prueba. Sin heartbeats
+# (intervalo 0) la prueba de half_open la hace el tráfico normal.
+#
+# El conjunto de workers puede cambiar en marcha (set_ops): los nuevos
+# arrancan en closed con su propio heartbeat y los que salen dejan de
+# recibir pings. Un worker que ya no está cuenta como no disponible.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class WorkerHealth:
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.last_ok = None
+
+
+class WorkerRegistry:
+
+    # ping(op_name) lanza excepción si el worker no responde
+    def __init__(self, ops, ping, failure_threshold=1, open_timeout=5.0,
+                 heartbeat_interval=1.0):
+
+        self.ping = ping
+        self.failure_threshold = failure_threshold
+        self.open_timeout = open_timeout
+        self.heartbeat_interval = heartbeat_interval
+
+        self.lock = threading.Lock()
+        self.health = {op: WorkerHealth() for op in ops}
+        self.stop_event = threading.Event()
+        self.threads = {}
+        self.started = False
+
+    # Cambia el conjunto de workers: los que siguen conservan su estado
+    def set_ops(self, ops):
+
+        with self.lock:
+            self.health = {op: self.health.get(op) or WorkerHealth() for op in ops}
+
+        if self.started:
+            self._start_heartbeats()
+
+    def _timer_expired(self, health):
+        return time.monotonic() - health.opened_at >= self.open_timeout
+
+    # ¿Se le puede mandar tráfico ahora? En half_open solo deja pasar
+    # una prueba a la vez (quien recibe True debe reportar el resultado)
+    def allow(self, op_name):
+
+        with self.lock:
+            health = self.health.get(op_name)
+
+            if health is None:
+                return False
+
+            if health.state == CLOSED:
+                return True
+
+            if health.state == OPEN and self._timer_expired(health):
+                health.state = HALF_OPEN
+                health.probing = False
+
+            if health.state == HALF_OPEN and not health.probing:
+                health.probing = True
+                return True
+
+            return False
+
+    def record_success(self, op_name):
+
+        with self.lock:
+            health = self.health.get(op_name)
+
+            if health is None:
+                return
+
+            if health.state != CLOSED:
+                print(f"[HEALTH] {op_name} volvió a responder")
+
+            health.state = CLOSED
+            health.failures = 0
+            health.probing = False
+            health.last_ok = time.time()
+
+    # Quien recibió True de allow() y no llegó a saber si el worker anda
+    # (se le venció el plazo o descartó la llamada): la prueba de
+    # half_open queda libre para la próxima solicitud
+    def release(self, op_name):
+
+        with self.lock:
+            health = self.health.get(op_name)
+
+            if health is not None:
+                health.probing = False
+
+    def record_failure(self, op_name):
+
+        with self.lock:
+            health = self.health.get(op_name)
+
+            if health is None:
+                return
+
+            health.failures += 1
+            health.probing = False
+
+            if health.state == HALF_OPEN or health.failures >= self.failure_threshold:
+                if health.state != OPEN:
+                    print(f"[HEALTH] {op_name} marcado como caído")
+                health.state = OPEN
+                health.opened_at = time.monotonic()
+
+    # Workers a los que hoy no se les manda tráfico
+    def unavailable(self):
+
+        with self.lock:
+            down = set()
+
+            for op_name, health in self.health.items():
+                if health.state == OPEN and not self._timer_expired(health):
+                    down.add(op_name)
+                elif health.state == HALF_OPEN and health.probing:
+                    down.add(op_name)
+
+            return down
+
+    def snapshot(self):
+
+        with self.lock:
+            return {
+                op_name: {
+                    "state": health.state,
+                    "failures": health.failures,
+                    "last_ok": health.last_ok
+                }
+                for op_name, health in self.health.items()
+            }
+
+    # ==========================================
+    # HEARTBEATS
+    # ==========================================
+
+    # Termina sola cuando el worker sale del registro
+    def _heartbeat_loop(self, op_name):
+
+        while not self.stop_event.is_set() and op_name in self.health:
+
+            try:
+                self.ping(op_name)
+                self.record_success(op_name)
+            except Exception:
+                self.record_failure(op_name)
+
+            self.stop_event.wait(self.heartbeat_interval)
+
+        with self.lock:
+            if self.threads.get(op_name) is threading.current_thread():
+                del self.threads[op_name]
+
+    def start(self):
+
+        if self.heartbeat_interval <= 0:
+            return
+
+        self.started = True
+        self._start_heartbeats()
+
+    # Un hilo por worker que todavía no tenga el suyo
+    def _start_heartbeats(self):
+
+        with self.lock:
+
+            for op_name in self.health:
+
+                if op_name in self.threads:
+                    continue
+
+                thread = threading.Thread(
+                    target=self._heartbeat_loop,
+                    args=(op_name,),
+                    name=f"heartbeat-{op_name}",
+                    daemon=True
+                )
+                self.threads[op_name] = thread
+                thread.start()
+
+    def stop(self):
+        self.stop_event.set()
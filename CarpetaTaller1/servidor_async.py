@@ -0,0 +1,278 @@
+import time
+import signal
+import socket
+import asyncio
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from protocolo import MAX_MESSAGE_SIZE, encode_json, encode_message, read_message_async
+from protocolo import NOT_AN_OBJECT
+from multiproceso import SharedStats
+import metricas
+import trazas
+import admision
+from admision import AdmissionControl
+
+# ==========================================
+# SERVIDOR ASÍNCRONO PARA WORKERS
+# ==========================================
+#
+# Un solo hilo con asyncio atiende todas las conexiones. Cada mensaje
+# que llega se atiende en su propia tarea, así que los mensajes
+# encadenados en una misma conexión (el pool del coordinador manda
+# varios sin esperar) se procesan a la vez y cada respuesta sale en
+# cuanto está lista, con su request_id.
+#
+#   max_concurrency -> mensajes en proceso a la vez (entre todas las
+#                      conexiones)
+#   max_queue       -> mensajes esperando turno. Lo que no entra se
+#                      responde "overloaded" con retry_after, y lo que
+#                      venció su plazo ("deadline_ms") mientras esperaba
+#                      se responde "deadline_exceeded" sin calcularlo
+#                      (ver admision.py)
+#   process_workers -> procesos para los lotes grandes (0 = sin procesos,
+#                      los lotes grandes van a un hilo aparte)
+#   heavy_batch     -> desde cuántos elementos un lote cuenta como grande
+#   stats           -> contadores del proceso (SharedStats); el op "stats"
+#                      devuelve los de todos los procesos del worker
+#   grace           -> al recibir SIGTERM se deja de aceptar y se esperan
+#                      hasta grace segundos los mensajes en vuelo
+#   observe         -> observe(payload, result, segundos, espera) después
+#                      de cada mensaje (métricas del worker); espera es lo
+#                      que el mensaje esperó desde que se leyó hasta empezar
+#
+# Si el mensaje trae "trace": true, la respuesta lleva "timing" con la
+# espera y el cálculo (ver trazas.py).
+#   metrics_port    -> puerto HTTP de métricas (0 = desactivado)
+#
+# Las operaciones escalares y los lotes chicos se resuelven directo en
+# el hilo de asyncio: tardan microsegundos y pasarlos a otro hilo o
+# proceso costaría más que hacerlos.
+
+
+# Las vistas (memoryview) que deja el protocolo binario no se pueden
+# mandar a otro proceso: pasan a array("d")
+def _picklable(payload):
+
+    return {
+        name: array("d", value.tobytes()) if isinstance(value, memoryview) else value
+        for name, value in payload.items()
+    }
+
+
+def _warm_up():
+    return True
+
+
+def _batch_size(payload):
+
+    # Trabajo masivo: filas del rango
+    if payload.get("op") == "bulk":
+        return payload.get("count", 0)
+
+    if not payload.get("batch"):
+        return 0
+
+    for value in payload.values():
+        if isinstance(value, (list, memoryview)):
+            return len(value)
+
+    return 0
+
+
+class AsyncWorkerServer:
+
+    # handle(payload) -> respuesta; es el handle_operation del worker
+    def __init__(self, name, handle, max_concurrency=64, process_workers=0,
+                 heavy_batch=50000, stats=None, grace=10.0, observe=None, metrics_port=0,
+                 max_queue=256, retry_after=0.2):
+
+        self.name = name
+        self.handle = handle
+        self.max_concurrency = max_concurrency
+        self.process_workers = process_workers
+        self.heavy_batch = heavy_batch
+        self.stats = stats if stats is not None else SharedStats()
+        self.grace = grace
+        self.observe = observe
+        self.metrics_port = metrics_port
+        self.admission = AdmissionControl(max_concurrency, max_queue, retry_after)
+
+        self.processes = None
+        self.slots = None
+        self.active = set()
+
+    async def run_operation(self, payload):
+
+        if _batch_size(payload) < self.heavy_batch:
+            return self.handle(payload)
+
+        loop = asyncio.get_running_loop()
+
+        if self.processes is not None:
+            return await loop.run_in_executor(self.processes, self.handle, _picklable(payload))
+
+        # NumPy suelta el GIL en las cuentas grandes: un hilo alcanza
+        # para no frenar a las demás conexiones
+        return await loop.run_in_executor(None, self.handle, payload)
+
+    # received_at: cuándo se terminó de leer el mensaje (time.monotonic)
+    async def serve_message(self, payload, binary, writer, received_at):
+
+        try:
+            async with self.slots:
+                await self.reply(payload, binary, writer, received_at)
+        finally:
+            self.admission.release()
+
+    async def reply(self, payload, binary, writer, received_at):
+
+        try:
+            if payload.get("op") != "ping":
+                print(f"[{self.name}] Recibido: {payload.get('op')}")
+
+            started = time.monotonic()
+            deadline = admision.deadline_from(payload, received_at)
+
+            if payload.get("op") == "stats":
+                result = {"ok": True, "worker": self.name, "admission": self.admission.snapshot()}
+                result.update(self.stats.snapshot())
+            elif admision.expired(deadline):
+                # Venció esperando turno: quien lo pidió ya no lo espera
+                result = admision.deadline_exceeded()
+            else:
+                try:
+                    result = await self.run_operation(payload)
+                except Exception as e:
+                    result = {"ok": False, "error": f"Error interno: {e}"}
+
+                finished = time.monotonic()
+
+                if payload.get("op") != "ping":
+                    seconds = finished - started
+                    self.stats.record(result.get("ok", False), _batch_size(payload), seconds)
+                    if self.observe is not None:
+                        self.observe(payload, result, seconds, started - received_at)
+
+                if payload.get("trace"):
+                    result["timing"] = trazas.worker_timing(payload.get("op"), received_at,
+                                                            started, finished)
+
+            if "request_id" in payload:
+                result["request_id"] = payload["request_id"]
+
+            if not writer.is_closing():
+                writer.write(encode_message(result, binary))
+                await writer.drain()
+
+        except (ConnectionError, OSError):
+            pass
+
+    async def handle_connection(self, reader, writer):
+
+        addr = writer.get_extra_info("peername")
+
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        tasks = set()
+
+        try:
+            while True:
+
+                payload, binary = await read_message_async(reader)
+
+                if payload is None:
+                    break
+
+                if not isinstance(payload, dict):
+                    writer.write(encode_message({"ok": False, "error": NOT_AN_OBJECT}, binary))
+                    await writer.drain()
+                    continue
+
+                # Negociación: el coordinador pregunta si entendemos binario
+                if payload.get("op") == "hello":
+                    wire = "binary" if payload.get("wire") == "binary" else "json"
+                    writer.write(encode_json({
+                        "ok": True,
+                        "wire": wire,
+                        "request_id": payload.get("request_id")
+                    }))
+                    await writer.drain()
+                    continue
+
+                received_at = time.monotonic()
+
+                # Sin lugar ni en la cola: se responde sin calcular nada
+                if not self.admission.try_admit():
+                    writer.write(encode_message(
+                        self.admission.overloaded(payload.get("request_id")), binary))
+                    await writer.drain()
+                    continue
+
+                task = asyncio.create_task(self.serve_message(payload, binary, writer, received_at))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                self.active.add(task)
+                task.add_done_callback(self.active.discard)
+
+            # El otro lado dejó de mandar: terminamos lo que quedó en vuelo
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        except asyncio.CancelledError:
+            # El worker se está apagando
+            pass
+
+        except Exception as e:
+            print(f"[{self.name}] Conexión {addr} terminada ({e})")
+
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, backlog=128, reuse_port=False):
+
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+
+        server = await asyncio.start_server(
+            self.handle_connection,
+            host,
+            port,
+            backlog=backlog,
+            limit=MAX_MESSAGE_SIZE,
+            reuse_address=True,
+            reuse_port=reuse_port or None
+        )
+
+        self.stats.mark_ready()
+
+        # Con SIGTERM (kill) se deja de aceptar y se sale ordenadamente,
+        # así también se apagan los procesos hijos
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+        async with server:
+            await stop.wait()
+
+        # Puerto cerrado: terminamos lo que quedó en vuelo
+        if self.active:
+            await asyncio.wait(set(self.active), timeout=self.grace)
+
+    def run(self, host, port, backlog=128, reuse_port=False):
+
+        # Los procesos se crean antes de abrir el puerto: si se crearan
+        # después heredarían el socket de escucha y lo dejarían ocupado
+        # aunque el worker principal ya no esté
+        if self.process_workers > 0:
+            self.processes = ProcessPoolExecutor(max_workers=self.process_workers)
+            self.processes.submit(_warm_up).result()
+
+        # Por lo mismo, el puerto de métricas se abre después de los procesos
+        metricas.serve(self.metrics_port, host)
+
+        try:
+            asyncio.run(self.serve(host, port, backlog, reuse_port))
+        finally:
+            if self.processes is not None:
+                self.processes.shutdown(wait=True, cancel_futures=True)
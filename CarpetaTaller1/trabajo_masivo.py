@@ -0,0 +1,579 @@
+import os
+import sys
+import json
+import math
+import mmap
+import time
+import argparse
+import itertools
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import motor_vectorial
+from motor_vectorial import EPS, STATUS_OK, STATUS_A_ZERO, STATUS_NEGATIVE_DISC, STATUS_DIV_ZERO
+
+# ==========================================
+# TRABAJOS MASIVOS (archivos mapeados en memoria)
+# ==========================================
+#
+# Para cargas offline de cientos de millones de ecuaciones no sirve
+# mandar (a, b, c) de a uno ni en listas JSON. Acá todo son archivos
+# binarios que se mapean con mmap:
+#
+#   entrada  ecuaciones.f64         a, b, c como float64 seguidos (24 bytes por fila)
+#   salida   raices.f64             x1, x2 como float64 (16 bytes por fila, NaN si falló)
+#   estado   raices.f64.status      un byte por fila: los códigos de motor_vectorial
+#                                   (0 ok, 1 a = 0, 2 discriminante < 0, 3 división por cero)
+#
+# La fila i de los tres archivos es la misma ecuación. Los float64 van en
+# el orden de bytes de la máquina, que en la práctica es little-endian
+# (x86 y ARM); en otra arquitectura el programa no arranca.
+#
+# El trabajo se parte en rangos de filas (--range). Cada rango se
+# resuelve sobre vistas de los archivos mapeados: NumPy lee a, b y c
+# directo de la entrada (columnas de una matriz de 3, sin copiar) y
+# escribe x1, x2 y el estado directo en la salida. Por dentro va en
+# bloques de BLOCK filas para que los intermedios queden en cache.
+# Con NumPy un proceso resuelve del orden de 30 millones de filas por
+# segundo (~1 GB/s entre lo que lee y lo que escribe).
+#
+# Dónde se resuelve cada rango:
+#
+#   local (por defecto)   --processes N procesos en esta máquina; cada
+#                         uno mapea los archivos por su cuenta
+#   --worker H:P          workers remotos (op "bulk"). Por valor: el
+#                         rango sale en binario tal como está en el
+#                         archivo y la respuesta (raíces + estado) se
+#                         escribe en la salida mapeada
+#   --shared-dir DIR      además, los workers ven los mismos archivos
+#                         (disco compartido, --bulk-dir en el worker):
+#                         solo viajan las rutas y el rango, cada worker
+#                         lee y escribe su parte en el archivo
+#
+#   python3 trabajo_masivo.py pack ecuaciones.csv ecuaciones.f64
+#   python3 trabajo_masivo.py run ecuaciones.f64 raices.f64 --processes 4
+#   python3 trabajo_masivo.py run ecuaciones.f64 raices.f64 --worker 10.43.99.136:5001 --worker 10.43.99.139:5001
+
+ROW_BYTES = 24
+ROOT_BYTES = 16
+
+# Filas por rango (24 MB de entrada)
+RANGE_ROWS = 1 << 20
+
+# Filas por pasada de NumPy dentro de un rango (los 6 buffers de trabajo
+# ocupan 6 * 8 * BLOCK bytes: entran en la cache L2)
+BLOCK = 1 << 14
+
+# Rangos en vuelo por worker remoto
+WINDOW = 2
+
+
+def status_path_for(output_path):
+    return output_path + ".status"
+
+
+def count_rows(path):
+
+    size = os.path.getsize(path)
+
+    if size % ROW_BYTES:
+        raise ValueError(f"{path}: {size} bytes no es múltiplo de {ROW_BYTES} (a, b, c float64)")
+
+    return size // ROW_BYTES
+
+
+def ranges(rows, size):
+    for start in range(0, rows, size):
+        yield start, min(size, rows - start)
+
+
+# ==========================================
+# CÁLCULO SOBRE VISTAS
+# ==========================================
+
+# Una ecuación -> (estado, x1, x2), las mismas cuentas que el motor
+def solve_one(a, b, c):
+
+    if abs(a) < EPS:
+        return STATUS_A_ZERO, math.nan, math.nan
+
+    disc = b*b - 4*a*c
+
+    if disc < 0:
+        return STATUS_NEGATIVE_DISC, math.nan, math.nan
+
+    sqrt_d = math.sqrt(disc)
+    den = 2*a
+
+    if abs(den) < EPS:
+        return STATUS_DIV_ZERO, math.nan, math.nan
+
+    return STATUS_OK, (sqrt_d - b) / den, (-b - sqrt_d) / den
+
+
+# Las mismas cuentas que motor_vectorial.full_quadratic y en el mismo
+# orden (resultados idénticos bit a bit), pero por bloques sobre buffers
+# que se reusan: a, b y c se copian a columnas contiguas (la entrada
+# tiene las tres intercaladas) y no se crea ningún arreglo por bloque.
+def _solve_numpy(rows, roots, status):
+
+    np = motor_vectorial.np
+
+    coefficients = np.frombuffer(rows, dtype=np.float64).reshape(-1, 3)
+    out = np.frombuffer(roots, dtype=np.float64).reshape(-1, 2)
+    codes = np.frombuffer(status, dtype=np.uint8)
+
+    size = min(BLOCK, len(coefficients))
+    a_buf, b_buf, c_buf, d_buf, t_buf, den_buf = (np.empty(size) for _ in range(6))
+    mask_buf = np.empty(size, dtype=bool)
+
+    # Los inválidos dan NaN/inf por el camino y después se pisan con NaN
+    with np.errstate(all="ignore"):
+
+        for start in range(0, len(coefficients), BLOCK):
+
+            part = coefficients[start:start + BLOCK]
+            n = len(part)
+
+            a, b, c, d, t, den, mask = (buf[:n] for buf in
+                                        (a_buf, b_buf, c_buf, d_buf, t_buf, den_buf, mask_buf))
+            code = codes[start:start + n]
+
+            a[:] = part[:, 0]
+            b[:] = part[:, 1]
+            c[:] = part[:, 2]
+
+            # disc = b*b - 4*a*c
+            np.multiply(a, 4, out=t)
+            t *= c
+            np.multiply(b, b, out=d)
+            d -= t
+
+            np.less(d, 0, out=mask)
+            np.copyto(code, mask)
+            code *= STATUS_NEGATIVE_DISC
+
+            np.abs(a, out=t)
+            np.less(t, EPS, out=mask)
+            code[mask] = STATUS_A_ZERO
+
+            np.sqrt(d, out=d)
+            np.multiply(a, 2, out=den)
+            np.not_equal(code, STATUS_OK, out=mask)
+
+            # x1 = (sqrt_d - b) / 2a
+            np.subtract(d, b, out=t)
+            t /= den
+            t[mask] = np.nan
+            out[start:start + n, 0] = t
+
+            # x2 = (-b - sqrt_d) / 2a
+            np.negative(b, out=t)
+            t -= d
+            t /= den
+            t[mask] = np.nan
+            out[start:start + n, 1] = t
+
+    return int(np.count_nonzero(codes))
+
+
+def _solve_scalar(rows, roots, status):
+
+    values = rows.cast("d")
+    out = roots.cast("d")
+    errors = 0
+
+    for i in range(len(status)):
+
+        code, out[2*i], out[2*i + 1] = solve_one(values[3*i], values[3*i + 1], values[3*i + 2])
+        status[i] = code
+        errors += code != STATUS_OK
+
+    return errors
+
+
+# rows: bytes de n filas (a, b, c); roots y status: destinos escribibles
+# de 16*n y n bytes. Devuelve cuántas filas quedaron con error.
+def solve_rows(rows, roots, status, engine="auto"):
+
+    if engine != "scalar" and motor_vectorial.AVAILABLE:
+        motor_vectorial._load_numpy()
+        return _solve_numpy(rows, roots, status)
+
+    return _solve_scalar(rows, roots, status)
+
+
+# Rango que llegó por la red (op "bulk" por valor): float64 a, b, c
+# seguidos, como memoryview del protocolo binario o lista en JSON.
+# Devuelve (raíces, estado, errores) listos para responder.
+def solve_values(values, engine="auto"):
+
+    if isinstance(values, memoryview):
+        rows = values.cast("B")
+    else:
+        rows = memoryview(array("d", values)).cast("B")
+
+    if len(rows) % ROW_BYTES:
+        raise ValueError("rows debe traer a, b, c por fila")
+
+    count = len(rows) // ROW_BYTES
+    roots = array("d", bytes(count * ROOT_BYTES))
+    status = bytearray(count)
+
+    errors = solve_rows(rows, memoryview(roots).cast("B"), memoryview(status), engine)
+
+    return roots, memoryview(status), errors
+
+
+# ==========================================
+# ARCHIVOS MAPEADOS
+# ==========================================
+
+class BulkFiles:
+
+    # create=True: crea (o trunca) la salida y el estado del tamaño justo
+    def __init__(self, input_path, output_path, status_path=None, create=False):
+
+        self.rows = count_rows(input_path)
+        status_path = status_path or status_path_for(output_path)
+
+        if create:
+            for path, size in ((output_path, self.rows * ROOT_BYTES), (status_path, self.rows)):
+                with open(path, "wb") as f:
+                    f.truncate(size)
+
+        self.files = []
+        self.input = self._map(input_path, self.rows * ROW_BYTES, writable=False)
+        self.output = self._map(output_path, self.rows * ROOT_BYTES, writable=True)
+        self.status = self._map(status_path, self.rows, writable=True)
+
+    def _map(self, path, size, writable):
+
+        f = open(path, "r+b" if writable else "rb")
+        self.files.append(f)
+
+        if os.fstat(f.fileno()).st_size != size:
+            raise ValueError(f"{path}: se esperaban {size} bytes")
+
+        if size == 0:
+            return bytearray()
+
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+
+    # Vistas (sin copiar) de las filas [start, start + count)
+    def views(self, start, count):
+
+        end = start + count
+
+        return (memoryview(self.input)[start * ROW_BYTES:end * ROW_BYTES],
+                memoryview(self.output)[start * ROOT_BYTES:end * ROOT_BYTES],
+                memoryview(self.status)[start:end])
+
+    def solve(self, start, count, engine="auto"):
+
+        views = self.views(start, count)
+
+        try:
+            return solve_rows(*views, engine=engine)
+        finally:
+            for view in views:
+                view.release()
+
+    # Escribe en su lugar lo que respondió un worker remoto
+    def store(self, start, count, roots, status):
+
+        _, out, codes = views = self.views(start, count)
+
+        try:
+            out[:] = memoryview(roots).cast("B") if isinstance(roots, memoryview) \
+                else memoryview(array("d", [math.nan if v is None else v for v in roots])).cast("B")
+            codes[:] = status if isinstance(status, memoryview) else bytes(status)
+        finally:
+            for view in views:
+                view.release()
+
+    def close(self):
+
+        for m in (self.input, self.output, self.status):
+            if isinstance(m, mmap.mmap):
+                m.close()
+
+        for f in self.files:
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Un rango por rutas; lo usan los procesos locales y el worker con --bulk-dir
+def solve_range(input_path, output_path, status_path, start, count, engine="auto"):
+
+    with BulkFiles(input_path, output_path, status_path) as files:
+
+        if start < 0 or count < 0 or start + count > files.rows:
+            raise ValueError(f"Rango fuera del archivo ({files.rows} filas)")
+
+        return files.solve(start, count, engine)
+
+
+# Ruta pedida por un cliente, dentro del directorio que habilitó el worker
+def resolve_shared(base, relative):
+
+    base = os.path.realpath(base)
+    path = os.path.realpath(os.path.join(base, relative))
+
+    if os.path.commonpath([base, path]) != base:
+        raise ValueError(f"Ruta fuera de --bulk-dir: {relative}")
+
+    return path
+
+
+# ==========================================
+# EJECUCIÓN
+# ==========================================
+
+def run_local(files, paths, range_rows, processes, engine):
+
+    if processes <= 1:
+        return sum(files.solve(start, count, engine) for start, count in ranges(files.rows, range_rows))
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        jobs = [executor.submit(solve_range, *paths, start, count, engine)
+                for start, count in ranges(files.rows, range_rows)]
+        return sum(job.result() for job in jobs)
+
+
+# Reparte los rangos entre los workers, hasta window en vuelo por cada
+# uno. Un worker que falla sale del reparto y su rango vuelve a la cola.
+def run_remote(files, paths, range_rows, workers, window, timeout, shared_dir=None):
+
+    from pool_conexiones import WorkerPool
+    from balanceo_coordinadores import parse_address
+
+    pool = WorkerPool(lambda worker: parse_address(worker, 5001), window, 2.0, binary=True)
+    alive = list(workers)
+    turn = itertools.count()
+
+    todo = deque(ranges(files.rows, range_rows))
+    in_flight = deque()
+    errors = 0
+
+    # Vistas de la entrada de los rangos en vuelo: se liberan cuando el
+    # rango vuelve (o al final, si el trabajo termina con error) para
+    # que el mmap se pueda cerrar
+    sent = {}
+
+    def release(start):
+        for view in sent.pop(start, ()):
+            view.release()
+
+    if shared_dir is not None:
+        relative = [os.path.relpath(os.path.abspath(p), os.path.abspath(shared_dir)) for p in paths]
+        if any(r.startswith(os.pardir) for r in relative):
+            raise ValueError(f"Los archivos tienen que estar dentro de {shared_dir}")
+
+    def drop(worker, reason):
+
+        if worker in alive:
+            alive.remove(worker)
+            pool.drop(worker)
+            print(f"[BULK] {worker} fuera del trabajo ({reason})", file=sys.stderr)
+
+        if not alive:
+            raise RuntimeError("Ningún worker disponible para el trabajo")
+
+    def payload(start, count):
+
+        message = {"request_id": f"bulk-{start}", "op": "bulk", "start": start, "count": count}
+
+        if shared_dir is not None:
+            message.update(zip(("input", "output", "status"), relative))
+        else:
+            rows, output, status = files.views(start, count)
+            output.release()
+            status.release()
+            sent[start] = (rows.cast("d"), rows)
+            message["rows"] = sent[start][0]
+
+        return message
+
+    try:
+        while todo or in_flight:
+
+            while todo and len(in_flight) < window * len(alive):
+
+                start, count = todo.popleft()
+                worker = alive[next(turn) % len(alive)]
+
+                try:
+                    call = pool.start_call(worker, payload(start, count))
+                except (OSError, ValueError) as e:
+                    release(start)
+                    todo.appendleft((start, count))
+                    drop(worker, e)
+                    continue
+
+                in_flight.append((worker, start, count, call))
+
+            worker, start, count, call = in_flight.popleft()
+
+            try:
+                response = call.result(timeout)
+            except (OSError, ValueError) as e:
+                release(start)
+                todo.append((start, count))
+                drop(worker, e)
+                continue
+
+            release(start)
+
+            if response.get("error") == "overloaded":
+                todo.append((start, count))
+                time.sleep(response.get("retry_after", 0.2))
+                continue
+
+            if not response.get("ok"):
+                raise RuntimeError(f"{worker}: {response.get('error')}")
+
+            if shared_dir is None:
+                files.store(start, count, response["roots"], response["row_status"])
+
+            errors += response["errors"]
+
+    finally:
+        in_flight.clear()
+        pool.close_all()
+        for start in list(sent):
+            release(start)
+
+    return errors
+
+
+def run(args):
+
+    status = args.status or status_path_for(args.output)
+    paths = (args.input, args.output, status)
+
+    started = time.perf_counter()
+
+    with BulkFiles(*paths, create=True) as files:
+
+        if args.worker:
+            errors = run_remote(files, paths, args.range, args.worker, args.window,
+                                args.timeout, args.shared_dir)
+        else:
+            errors = run_local(files, paths, args.range, args.processes, args.engine)
+
+        rows = files.rows
+
+    elapsed = time.perf_counter() - started
+    moved = rows * (ROW_BYTES + ROOT_BYTES + 1)
+
+    print(f"{rows} filas, {errors} con error, {elapsed:.2f}s "
+          f"({rows / elapsed if elapsed else 0:.0f} filas/s, "
+          f"{moved / elapsed / 1e6 if elapsed else 0:.0f} MB/s)")
+
+
+# CSV "a,b,c" (o JSONL) -> archivo de entrada. Una fila que no es
+# numérica corta todo con su número de línea: un trabajo offline no
+# debería correr a medias. a = 0 o discriminante negativo sí pasan, su
+# estado lo dice después.
+def pack(args):
+
+    from api_cliente import parse_number, InvalidInput
+
+    count = 0
+    buffer = array("d")
+
+    with open(args.source, encoding="utf-8") as source, open(args.target, "wb") as target:
+
+        for line_no, line in enumerate(source, 1):
+
+            text = line.strip()
+
+            if not text or text.startswith("#"):
+                continue
+
+            try:
+                if text.startswith("{"):
+                    obj = json.loads(text)
+                    row = [obj.get(name) for name in ("a", "b", "c")]
+                else:
+                    row = text.replace(";", ",").split(",")
+                if len(row) != 3:
+                    raise InvalidInput("Se esperaban 3 valores: a, b, c")
+                buffer.extend(parse_number(name, value) for name, value in zip("abc", row))
+            except (InvalidInput, ValueError, AttributeError) as e:
+                if line_no == 1 and not text.startswith("{"):
+                    continue   # encabezado a,b,c
+                raise SystemExit(f"{args.source}:{line_no}: {e}")
+
+            count += 1
+
+            if len(buffer) >= 3 * BLOCK:
+                buffer.tofile(target)
+                buffer = array("d")
+
+        buffer.tofile(target)
+
+    print(f"{count} filas escritas en {args.target}")
+
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description="Trabajos masivos sobre archivos mapeados")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("pack", help="convertir CSV/JSONL al formato de entrada")
+    p.add_argument("source")
+    p.add_argument("target")
+
+    r = commands.add_parser("run", help="resolver un archivo de entrada")
+    r.add_argument("input")
+    r.add_argument("output")
+    r.add_argument("--status", default=None,
+                   help="archivo de estado (por defecto SALIDA.status)")
+    r.add_argument("--range", type=int, default=RANGE_ROWS,
+                   help="filas por rango")
+    r.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                   help="procesos locales (sin --worker)")
+    r.add_argument("--engine", choices=["auto", "numpy", "scalar"], default="auto")
+    r.add_argument("--worker", action="append", default=[], metavar="HOST:PUERTO",
+                   help="resolver en workers remotos (repetir por cada uno)")
+    r.add_argument("--window", type=int, default=WINDOW,
+                   help="rangos en vuelo por worker")
+    r.add_argument("--timeout", type=float, default=120.0,
+                   help="segundos esperando cada rango")
+    r.add_argument("--shared-dir", default=None,
+                   help="directorio que los workers también ven (su --bulk-dir)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run" and args.range < 1:
+        parser.error("--range debe ser al menos 1")
+
+    return args
+
+
+def main(argv=None):
+
+    if sys.byteorder != "little":
+        raise SystemExit("Los archivos son float64 little-endian; esta máquina no lo es")
+
+    args = parse_args(argv)
+
+    try:
+        if args.command == "pack":
+            pack(args)
+        else:
+            run(args)
+    except (OSError, ValueError, RuntimeError) as e:
+        raise SystemExit(f"[BULK] {e}")
+
+
+if __name__ == "__main__":
+    main()
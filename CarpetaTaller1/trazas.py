@@ -0,0 +1,136 @@
+import json
+import time
+import threading
+
+# ==========================================
+# TRAZAS POR SOLICITUD
+# ==========================================
+#
+# Si la solicitud trae "trace": true, el coordinador anota un tramo
+# (span) por cada paso: espera en cola, lectura de la solicitud, cada
+# etapa y cada intento con un worker (también los que fallaron o se
+# vencieron). A los workers se les pide lo mismo ("trace": true) y
+# devuelven "timing" con su espera y su cálculo; el resto del intento
+# es red + serialización (ida y vuelta).
+#
+# Los tramos vuelven en la respuesta ("spans"), con inicio y duración
+# en milisegundos desde que se aceptó la conexión:
+#
+#   {"name": "numerator -> op2", "where": "coordinador",
+#    "start_ms": 0.41, "duration_ms": 0.38, "ok": true}
+#
+# to_chrome() los pasa al formato de trazas de Chrome, que se abre en
+# chrome://tracing o en https://ui.perfetto.dev
+#
+# Sin "trace" no se anota nada: cada paso solo pregunta si hay una
+# traza activa en su hilo.
+
+COORDINATOR = "coordinador"
+
+_local = threading.local()
+
+
+def current():
+    return getattr(_local, "tracer", None)
+
+
+def activate(tracer):
+    _local.tracer = tracer
+
+
+class Tracer:
+
+    # origin: instante (time.monotonic) desde el que se miden los tramos
+    def __init__(self, origin=None):
+
+        self.origin = origin if origin is not None else time.monotonic()
+
+        self.lock = threading.Lock()
+        self.spans = []
+
+    # start y end son time.monotonic(); attrs queda en el tramo tal cual
+    def add(self, name, start, end, where=COORDINATOR, **attrs):
+
+        span = {
+            "name": name,
+            "where": where,
+            "start_ms": round((start - self.origin) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+        }
+        span.update(attrs)
+
+        with self.lock:
+            self.spans.append(span)
+
+    # Ubica los tiempos que mandó un worker dentro del intento que los
+    # pidió. Los relojes de dos máquinas no se pueden comparar, así que
+    # se supone que la ida y la vuelta tardaron lo mismo.
+    def add_worker_timing(self, op_name, started, ended, timing):
+
+        elapsed = timing.get("elapsed", 0.0)
+        received = started + max(0.0, (ended - started) - elapsed) / 2
+
+        compute_at = received + timing.get("queue", 0.0)
+
+        self.add("queue", received, compute_at, where=op_name)
+        self.add(timing.get("op", "compute"), compute_at,
+                 compute_at + timing.get("compute", 0.0), where=op_name)
+
+    def export(self):
+
+        with self.lock:
+            return sorted(self.spans, key=lambda span: span["start_ms"])
+
+
+# Lo que un worker devuelve en "timing" (segundos): espera desde que
+# leyó el mensaje hasta empezar, cálculo y total antes de responder
+def worker_timing(op, received_at, started, finished):
+
+    return {
+        "op": op,
+        "queue": started - received_at,
+        "compute": finished - started,
+        "elapsed": finished - received_at,
+    }
+
+
+# ==========================================
+# FORMATO CHROME (chrome://tracing / Perfetto)
+# ==========================================
+
+def to_chrome(spans, name="solicitud"):
+
+    threads = {}
+    events = []
+
+    for span in spans:
+
+        tid = threads.setdefault(span["where"], len(threads) + 1)
+        args = {k: v for k, v in span.items()
+                if k not in ("name", "where", "start_ms", "duration_ms")}
+
+        events.append({
+            "name": span["name"],
+            "ph": "X",
+            "ts": span["start_ms"] * 1000,
+            "dur": span["duration_ms"] * 1000,
+            "pid": 1,
+            "tid": tid,
+            "args": args
+        })
+
+    # Nombres de las filas (coordinador, op1, op2, ...)
+    events.append({"name": "process_name", "ph": "M", "pid": 1, "tid": 0,
+                   "args": {"name": name}})
+
+    for where, tid in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid,
+                       "args": {"name": where}})
+
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_chrome(path, spans, name="solicitud"):
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_chrome(spans, name), f, ensure_ascii=False, indent=1)
@@ -0,0 +1,747 @@
+import os
+import time
+import socket
+import math
+import argparse
+import threading
+
+from protocolo import send_json, send_message, open_reader, read_message, recv_json
+from protocolo import NOT_AN_OBJECT
+import motor_vectorial
+import trabajo_masivo
+import metricas
+import trazas
+import admision
+
+# servidor_async (asyncio) y multiproceso se importan recién en el modo
+# que los usa: el arranque del worker queda rápido
+
+# ==========================================
+# CONFIGURACIÓN DEL WORKER
+# ==========================================
+#
+# Un solo worker para op1, op2 y op3: el nombre, el puerto y lo demás
+# salen de la línea de comandos o de variables de entorno (WORKER_NAME,
+# WORKER_HOST, WORKER_PORT, WORKER_ENGINE, WORKER_SERVER,
+# WORKER_CONCURRENCY, WORKER_MAX_QUEUE, WORKER_PROCESSES,
+# WORKER_METRICS_PORT, WORKER_COORDINATOR, WORKER_ADVERTISE,
+# WORKER_CAPACITY, WORKER_BULK_DIR). La línea de comandos manda.
+#
+#   python3 worker.py --name op2 --port 5001
+
+WORKER_NAME = os.environ.get("WORKER_NAME", "op1")
+HOST = os.environ.get("WORKER_HOST", "0.0.0.0")
+PORT = int(os.environ.get("WORKER_PORT", 5001))
+
+EPS = 1e-12
+
+# Motor para lotes: "numpy" (vectorial), "scalar" o "auto" (numpy si
+# está instalado). NumPy se importa recién con el primer lote.
+ENGINE = os.environ.get("WORKER_ENGINE", "auto")
+
+# Servidor: "async" (asyncio, muchos mensajes a la vez por conexión)
+# o "threads" (un hilo por conexión, un mensaje a la vez)
+SERVER = os.environ.get("WORKER_SERVER", "async")
+
+# Mensajes en proceso a la vez y esperando turno (servidor async). Con
+# todo lleno se responde "overloaded" y el coordinador prueba con otro.
+MAX_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", 64))
+MAX_QUEUE = int(os.environ.get("WORKER_MAX_QUEUE", 256))
+
+# Segundos sugeridos para reintentar cuando está saturado
+RETRY_AFTER = 0.2
+
+# Procesos para lotes grandes (0 = sin procesos) y desde cuántos
+# elementos un lote se manda a otro proceso
+PROCESS_WORKERS = 0
+HEAVY_BATCH = 50000
+
+# Cola de conexiones pendientes (listen)
+BACKLOG = 128
+
+# Procesos que comparten el puerto con SO_REUSEPORT (1 = un solo proceso).
+# Cada proceso usa su propio núcleo; con más de uno no se usa
+# PROCESS_WORKERS (los procesos ya son el paralelismo).
+PROCESSES = int(os.environ.get("WORKER_PROCESSES", 1))
+
+# Segundos para terminar lo que está en vuelo al apagar o reiniciar
+GRACE = 10.0
+
+# Coordinadores a los que anunciarse al arrancar ("host:puerto", varios
+# separados por comas; vacío = no se anuncia y el coordinador lo tiene
+# que tener configurado)
+COORDINATOR = os.environ.get("WORKER_COORDINATOR", "")
+
+# Dirección que se anuncia. Vacío = HOST, o si HOST es 0.0.0.0 la IP
+# con la que se llega al coordinador.
+ADVERTISE = os.environ.get("WORKER_ADVERTISE", "")
+
+# Peso relativo para repartir la carga (0 = la cantidad de procesos)
+CAPACITY = float(os.environ.get("WORKER_CAPACITY", 0))
+
+# Timeout de cada mensaje al coordinador
+REGISTER_TIMEOUT = 2.0
+
+# Puerto HTTP de métricas Prometheus (0 = desactivado). En modo
+# multiproceso cada hijo usa METRICS_PORT + su fila (0, 1, ... y tras un
+# reinicio ordenado PROCESSES, PROCESSES + 1, ...).
+METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", 9101))
+
+# Directorio compartido de los trabajos masivos (trabajo_masivo.py). Si
+# está, el op "bulk" puede leer y escribir los archivos de ahí adentro
+# por ruta; vacío = solo rangos por valor.
+BULK_DIR = os.environ.get("WORKER_BULK_DIR", "")
+
+# ==========================================
+# MÉTRICAS
+# ==========================================
+
+OPERATION_SECONDS = metricas.histogram(
+    "worker_operation_seconds", "Tiempo resolviendo una operación", ["op"])
+QUEUE_WAIT_SECONDS = metricas.histogram(
+    "worker_queue_wait_seconds", "Espera de un mensaje desde que se leyó hasta empezar")
+REQUESTS = metricas.counter(
+    "worker_requests_total", "Mensajes atendidos", ["op", "ok"])
+BATCH_ITEMS = metricas.counter(
+    "worker_batch_items_total", "Elementos resueltos en lotes", ["op"])
+
+
+def observe_operation(payload, result, seconds, waited=None):
+
+    op = metricas.known_label(payload.get("op"), OPERATIONS)
+
+    OPERATION_SECONDS.observe(seconds, op=op)
+    REQUESTS.inc(op=op, ok=str(bool(result.get("ok"))).lower())
+
+    if waited is not None:
+        QUEUE_WAIT_SECONDS.observe(waited)
+
+    if payload.get("batch") and result.get("ok") and op in BATCH_FIELDS:
+        BATCH_ITEMS.inc(len(payload[BATCH_FIELDS[op][0][0]]), op=op)
+
+    if op == "bulk" and result.get("ok"):
+        BATCH_ITEMS.inc(payload.get("count", 0), op=op)
+
+# ==========================================
+# LÓGICA DE OPERACIONES
+# ==========================================
+
+# Heartbeat del coordinador
+def op_ping(payload):
+    return {"ok": True, "worker": WORKER_NAME}
+
+
+# ---- RAÍZ DEL DISCRIMINANTE ----
+def op_sqrt_discriminant(payload):
+
+    a = payload.get("a")
+    b = payload.get("b")
+    c = payload.get("c")
+
+    if a is None or b is None or c is None:
+        return {"ok": False, "error": "Faltan parámetros"}
+
+    if abs(a) < EPS:
+        return {"ok": False, "error": "a no puede ser 0"}
+
+    disc = b*b - 4*a*c
+
+    if disc < 0:
+        return {"ok": False, "error": "No hay raíces reales"}
+
+    return {"ok": True, "sqrt_d": math.sqrt(disc), "disc": disc}
+
+
+# ---- NUMERADOR (+ y -) ----
+def op_numerator(payload):
+
+    b = payload.get("b")
+    sqrt_d = payload.get("sqrt_d")
+
+    if b is None or sqrt_d is None:
+        return {"ok": False, "error": "Faltan parámetros"}
+
+    return {
+        "ok": True,
+        "num_plus": (-b) + sqrt_d,
+        "num_minus": (-b) - sqrt_d
+    }
+
+
+# ---- DIVISIÓN FINAL ----
+def op_division(payload):
+
+    a = payload.get("a")
+    num_plus = payload.get("num_plus")
+    num_minus = payload.get("num_minus")
+
+    if a is None or num_plus is None or num_minus is None:
+        return {"ok": False, "error": "Faltan parámetros"}
+
+    den = 2*a
+
+    if abs(den) < EPS:
+        return {"ok": False, "error": "División por cero"}
+
+    return {
+        "ok": True,
+        "x1": num_plus/den,
+        "x2": num_minus/den
+    }
+
+
+# ---- UNA SOLA RAMA (x1 o x2) ----
+# El coordinador puede mandar cada rama de un lote a un worker distinto
+# (ver grafo_etapas.py): mismas cuentas que numerator y division, pero
+# solo el signo pedido.
+def op_numerator_plus(payload):
+
+    b = payload.get("b")
+    sqrt_d = payload.get("sqrt_d")
+
+    if b is None or sqrt_d is None:
+        return {"ok": False, "error": "Faltan parámetros"}
+
+    return {"ok": True, "num_plus": (-b) + sqrt_d}
+
+
+def op_numerator_minus(payload):
+
+    b = payload.get("b")
+    sqrt_d = payload.get("sqrt_d")
+
+    if b is None or sqrt_d is None:
+        return {"ok": False, "error": "Faltan parámetros"}
+
+    return {"ok": True, "num_minus": (-b) - sqrt_d}
+
+
+def op_division_plus(payload):
+
+    a = payload.get("a")
+    num_plus = payload.get("num_plus")
+
+    if a is None or num_plus is None:
+        return {"ok": False, "error": "Faltan parámetros"}
+
+    den = 2*a
+
+    if abs(den) < EPS:
+        return {"ok": False, "error": "División por cero"}
+
+    return {"ok": True, "x1": num_plus/den}
+
+
+def op_division_minus(payload):
+
+    a = payload.get("a")
+    num_minus = payload.get("num_minus")
+
+    if a is None or num_minus is None:
+        return {"ok": False, "error": "Faltan parámetros"}
+
+    den = 2*a
+
+    if abs(den) < EPS:
+        return {"ok": False, "error": "División por cero"}
+
+    return {"ok": True, "x2": num_minus/den}
+
+
+# ---- MODO FULL (cuando quedan 2 caídos) ----
+def op_full_quadratic(payload):
+
+    a = payload.get("a")
+    b = payload.get("b")
+    c = payload.get("c")
+
+    if a is None or b is None or c is None:
+        return {"ok": False, "error": "Faltan parámetros"}
+
+    if abs(a) < EPS:
+        return {"ok": False, "error": "a no puede ser 0"}
+
+    disc = b*b - 4*a*c
+
+    if disc < 0:
+        return {"ok": False, "error": "No hay raíces reales"}
+
+    sqrt_d = math.sqrt(disc)
+    num_plus = (-b) + sqrt_d
+    num_minus = (-b) - sqrt_d
+    den = 2*a
+
+    return {
+        "ok": True,
+        "x1": num_plus/den,
+        "x2": num_minus/den
+    }
+
+
+# ---- TRABAJO MASIVO (un rango de filas) ----
+#
+# Por valor: "rows" trae a, b, c seguidos y se responde "roots" (x1, x2
+# seguidos) y "row_status" (un byte por fila).
+# Por ruta (solo con --bulk-dir): "input", "output", "status" relativos
+# a BULK_DIR; el worker escribe su rango en el archivo y responde solo
+# la cantidad de errores.
+def op_bulk(payload):
+
+    try:
+        if payload.get("input") is not None:
+
+            if not BULK_DIR:
+                return {"ok": False, "error": "Este worker no tiene --bulk-dir"}
+
+            paths = [trabajo_masivo.resolve_shared(BULK_DIR, payload.get(name))
+                     for name in ("input", "output", "status")]
+
+            errors = trabajo_masivo.solve_range(*paths, int(payload.get("start", 0)),
+                                                int(payload.get("count", 0)), ENGINE)
+
+            return {"ok": True, "errors": errors}
+
+        rows = payload.get("rows")
+
+        if rows is None:
+            return {"ok": False, "error": "Faltan parámetros"}
+
+        roots, status, errors = trabajo_masivo.solve_values(rows, ENGINE)
+
+    except (OSError, TypeError, ValueError) as e:
+        return {"ok": False, "error": str(e)}
+
+    return {"ok": True, "roots": roots, "row_status": status, "errors": errors}
+
+
+# Nombre de operación -> función que la atiende
+OPERATIONS = {
+    "ping": op_ping,
+    "sqrt_discriminant": op_sqrt_discriminant,
+    "numerator": op_numerator,
+    "division": op_division,
+    "numerator_plus": op_numerator_plus,
+    "numerator_minus": op_numerator_minus,
+    "division_plus": op_division_plus,
+    "division_minus": op_division_minus,
+    "full_quadratic": op_full_quadratic,
+    "bulk": op_bulk,
+}
+
+
+def handle_operation(payload):
+
+    if not isinstance(payload, dict):
+        return {"ok": False, "error": NOT_AN_OBJECT}
+
+    # Un "op" que no es texto ([1], {...}) ni se puede buscar en la tabla
+    if not isinstance(payload.get("op"), str):
+        return {"ok": False, "error": "Operación no soportada"}
+
+    # Lote: a, b, c, ... vienen como listas
+    if payload.get("batch"):
+        return handle_batch(payload)
+
+    handler = OPERATIONS.get(payload.get("op"))
+
+    if handler is None:
+        return {"ok": False, "error": "Operación no soportada"}
+
+    return handler(payload)
+
+
+# ==========================================
+# OPERACIONES POR LOTES
+# ==========================================
+
+# Para cada operación: campos de entrada (listas) y campos de salida
+BATCH_FIELDS = {
+    "sqrt_discriminant": (("a", "b", "c"), ("sqrt_d", "disc")),
+    "numerator": (("b", "sqrt_d"), ("num_plus", "num_minus")),
+    "division": (("a", "num_plus", "num_minus"), ("x1", "x2")),
+    "numerator_plus": (("b", "sqrt_d"), ("num_plus",)),
+    "numerator_minus": (("b", "sqrt_d"), ("num_minus",)),
+    "division_plus": (("a", "num_plus"), ("x1",)),
+    "division_minus": (("a", "num_minus"), ("x2",)),
+    "full_quadratic": (("a", "b", "c"), ("x1", "x2")),
+}
+
+
+# Aplica la operación a cada elemento del lote. Un elemento con error
+# no afecta a los demás: su salida queda en None y "errors" lleva
+# [posición, mensaje] solo de los elementos que fallaron.
+def handle_batch(payload):
+
+    op = payload.get("op")
+
+    if op not in BATCH_FIELDS:
+        return {"ok": False, "error": "Operación no soportada"}
+
+    inputs, outputs = BATCH_FIELDS[op]
+    columns = [payload.get(name) for name in inputs]
+
+    if any(col is None for col in columns):
+        return {"ok": False, "error": "Faltan parámetros"}
+
+    # En JSON llegan listas y en binario memoryview de float64
+    if not all(isinstance(col, (list, tuple, memoryview)) for col in columns):
+        return {"ok": False, "error": f"{','.join(inputs)} deben ser listas"}
+
+    if len({len(col) for col in columns}) != 1:
+        return {"ok": False, "error": "Listas de distinto tamaño"}
+
+    # Camino rápido: todo el lote en una pasada de NumPy
+    if ENGINE != "scalar":
+        result = motor_vectorial.handle_batch(op, payload)
+        if result is not None:
+            return result
+
+    # Camino escalar (sin NumPy o con datos que NumPy no acepta)
+    result = {"ok": True, "errors": []}
+    for name in outputs:
+        result[name] = []
+
+    handler = OPERATIONS[op]
+
+    for i, values in enumerate(zip(*columns)):
+
+        r = handler(dict(zip(inputs, values)))
+
+        if not r.get("ok"):
+            result["errors"].append([i, r.get("error")])
+
+        for name in outputs:
+            result[name].append(r.get(name))
+
+    return result
+
+
+# ==========================================
+# MANEJO DE CONEXIÓN
+# ==========================================
+
+# La conexión queda abierta: atendemos mensajes hasta que el
+# coordinador la cierre. Cada respuesta lleva el request_id
+# de su solicitud para que el coordinador sepa a quién va, y
+# sale en el mismo formato (JSON o binario) que la solicitud.
+def handle_client(conn, addr):
+
+    reader = open_reader(conn)
+
+    while True:
+
+        payload, binary = read_message(reader)
+
+        if payload is None:
+            return
+
+        if not isinstance(payload, dict):
+            send_message(conn, {"ok": False, "error": NOT_AN_OBJECT}, binary)
+            continue
+
+        # Negociación: el coordinador pregunta si entendemos binario
+        if payload.get("op") == "hello":
+            wire = "binary" if payload.get("wire") == "binary" else "json"
+            send_json(conn, {
+                "ok": True,
+                "wire": wire,
+                "request_id": payload.get("request_id")
+            })
+            continue
+
+        if payload.get("op") != "ping":
+            print(f"[{WORKER_NAME}] Recibido: {payload.get('op')}")
+
+        started = time.monotonic()
+
+        # Plazo vencido en el camino: no se calcula
+        if admision.expired(admision.deadline_from(payload, started)):
+            result = admision.deadline_exceeded()
+        else:
+            result = handle_operation(payload)
+
+        finished = time.monotonic()
+
+        if payload.get("op") != "ping":
+            observe_operation(payload, result, finished - started)
+
+        if payload.get("trace"):
+            result["timing"] = trazas.worker_timing(payload.get("op"), started, started, finished)
+
+        if "request_id" in payload:
+            result["request_id"] = payload["request_id"]
+
+        send_message(conn, result, binary)
+
+
+def serve_connection(conn, addr):
+
+    try:
+        handle_client(conn, addr)
+    except Exception as e:
+        print(f"[{WORKER_NAME}] Conexión {addr} terminada ({e})")
+    finally:
+        conn.close()
+
+
+# ==========================================
+# REGISTRO EN EL COORDINADOR
+# ==========================================
+#
+# Con --coordinator el worker se anuncia solo (nombre, dirección y
+# capacidad) en cuanto su puerto está escuchando, renueva el registro
+# cada lease / 3 segundos y se da de baja al apagarse. Si el coordinador
+# se reinicia, lo vuelve a conocer en la siguiente renovación.
+#
+# Con varios coordinadores (--coordinator h1:5000,h2:5000) se registra
+# en cada uno por separado: todos comparten los mismos workers.
+
+def coordinators():
+    return [c.strip() for c in COORDINATOR.split(",") if c.strip()]
+
+
+def advertise_host(sock):
+
+    if ADVERTISE:
+        return ADVERTISE
+
+    if HOST not in ("", "0.0.0.0", "::"):
+        return HOST
+
+    # IP local con la que salimos hacia el coordinador
+    return sock.getsockname()[0]
+
+
+def send_to_coordinator(coordinator, op, **fields):
+
+    host, _, port = coordinator.rpartition(":")
+
+    with socket.create_connection((host, int(port)), timeout=REGISTER_TIMEOUT) as s:
+
+        payload = {"op": op, "request_id": f"{WORKER_NAME}-{op}", "name": WORKER_NAME}
+        payload.update(fields)
+
+        if op == "register":
+            payload["host"] = advertise_host(s)
+
+        send_json(s, payload)
+        return recv_json(s)
+
+
+def listening():
+
+    host = "127.0.0.1" if HOST in ("", "0.0.0.0") else HOST
+
+    try:
+        socket.create_connection((host, PORT), timeout=0.5).close()
+        return True
+    except OSError:
+        return False
+
+
+def registration_loop(coordinator, stop_event):
+
+    registered = False
+    interval = 1.0
+
+    while not stop_event.is_set():
+
+        if registered or listening():
+            try:
+                resp = send_to_coordinator(coordinator, "register", port=PORT,
+                                           capacity=CAPACITY or PROCESSES)
+                if not resp or not resp.get("ok"):
+                    raise ConnectionError((resp or {}).get("error", "sin respuesta"))
+
+                if not registered:
+                    print(f"[{WORKER_NAME}] Registrado en el coordinador {coordinator}")
+
+                registered = True
+                interval = resp.get("lease", 15.0) / 3
+
+            except Exception as e:
+                if registered:
+                    print(f"[{WORKER_NAME}] No se pudo renovar el registro en {coordinator} ({e})")
+                registered = False
+                interval = 1.0
+
+        stop_event.wait(interval)
+
+
+def start_registration():
+
+    if not coordinators():
+        return None
+
+    stop_event = threading.Event()
+
+    for coordinator in coordinators():
+        threading.Thread(target=registration_loop, args=(coordinator, stop_event),
+                         name=f"registro-{coordinator}", daemon=True).start()
+
+    return stop_event
+
+
+def stop_registration(stop_event):
+
+    if stop_event is None:
+        return
+
+    stop_event.set()
+
+    for coordinator in coordinators():
+        try:
+            send_to_coordinator(coordinator, "deregister")
+            print(f"[{WORKER_NAME}] Dado de baja en el coordinador {coordinator}")
+        except Exception:
+            pass
+
+
+# ==========================================
+# MAIN
+# ==========================================
+
+def parse_args(argv=None):
+
+    parser = argparse.ArgumentParser(description="Worker de operaciones")
+    parser.add_argument("--name", default=WORKER_NAME,
+                        help="nombre del worker (op1, op2, ...)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--engine", choices=["auto", "numpy", "scalar"], default=ENGINE,
+                        help="motor para lotes")
+    parser.add_argument("--server", choices=["async", "threads"], default=SERVER)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY,
+                        help="mensajes en proceso a la vez (servidor async)")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE,
+                        help="mensajes esperando turno antes de responder overloaded")
+    parser.add_argument("--process-workers", type=int, default=PROCESS_WORKERS,
+                        help="procesos para lotes grandes (0 = sin procesos)")
+    parser.add_argument("--processes", type=int, default=PROCESSES,
+                        help="procesos que comparten el puerto (SO_REUSEPORT)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="puerto HTTP de métricas Prometheus (0 = desactivado)")
+    parser.add_argument("--coordinator", default=COORDINATOR, metavar="HOST:PUERTO[,...]",
+                        help="coordinadores a los que anunciarse al arrancar")
+    parser.add_argument("--advertise", default=ADVERTISE,
+                        help="IP o nombre que se anuncia al coordinador")
+    parser.add_argument("--capacity", type=float, default=CAPACITY,
+                        help="peso relativo para repartir la carga (0 = cantidad de procesos)")
+    parser.add_argument("--bulk-dir", default=BULK_DIR,
+                        help="directorio compartido para el op bulk por ruta (trabajo_masivo.py)")
+
+    return parser.parse_args(argv)
+
+
+# Pasa la configuración a las variables del módulo. Se vuelve a llamar en
+# cada proceso hijo del modo multiproceso (arrancan con un intérprete nuevo).
+def configure(config):
+
+    global WORKER_NAME, HOST, PORT, ENGINE, SERVER, MAX_CONCURRENCY, MAX_QUEUE
+    global PROCESS_WORKERS, PROCESSES, METRICS_PORT, COORDINATOR, ADVERTISE, CAPACITY
+    global BULK_DIR
+
+    WORKER_NAME = config["name"]
+    HOST = config["host"]
+    PORT = config["port"]
+    SERVER = config["server"]
+    MAX_CONCURRENCY = config["concurrency"]
+    MAX_QUEUE = config["max_queue"]
+    PROCESS_WORKERS = config["process_workers"]
+    PROCESSES = config["processes"]
+    METRICS_PORT = config["metrics_port"]
+    COORDINATOR = config["coordinator"]
+    ADVERTISE = config["advertise"]
+    CAPACITY = config["capacity"]
+    BULK_DIR = config["bulk_dir"]
+
+    ENGINE = config["engine"]
+
+    if ENGINE == "numpy" and not motor_vectorial.AVAILABLE:
+        print(f"[{WORKER_NAME}] NumPy no está instalado, se usa el motor escalar")
+
+    if ENGINE != "scalar" and not motor_vectorial.AVAILABLE:
+        ENGINE = "scalar"
+    elif ENGINE == "auto":
+        ENGINE = "numpy"
+
+
+# Servidor async de un proceso. En modo multiproceso cada hijo llama
+# a esta función con su SharedStats y reuse_port=True.
+def run_async_server(config, reuse_port=False, stats=None):
+
+    configure(config)
+
+    from servidor_async import AsyncWorkerServer
+
+    metrics_port = METRICS_PORT
+    if reuse_port and metrics_port:
+        metrics_port += stats.slot
+
+    AsyncWorkerServer(
+        WORKER_NAME,
+        handle_operation,
+        max_concurrency=MAX_CONCURRENCY,
+        process_workers=0 if reuse_port else PROCESS_WORKERS,
+        heavy_batch=HEAVY_BATCH,
+        stats=stats,
+        grace=GRACE,
+        observe=observe_operation,
+        metrics_port=metrics_port,
+        max_queue=MAX_QUEUE,
+        retry_after=RETRY_AFTER
+    ).run(HOST, PORT, BACKLOG, reuse_port=reuse_port)
+
+
+def main(argv=None):
+
+    config = vars(parse_args(argv))
+    configure(config)
+
+    print(f"[START] {WORKER_NAME} escuchando en {HOST}:{PORT} "
+          f"(motor={ENGINE}, servidor={SERVER}, procesos={PROCESSES})")
+
+    registration = start_registration()
+
+    try:
+        serve(config)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_registration(registration)
+
+
+def serve(config):
+
+    if PROCESSES > 1:
+        from multiproceso import run_prefork
+        run_prefork(WORKER_NAME, run_async_server, (config, True),
+                    PROCESSES, grace=GRACE)
+        return
+
+    if SERVER == "async":
+        run_async_server(config)
+        return
+
+    metricas.serve(METRICS_PORT, HOST)
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((HOST, PORT))
+        server.listen(BACKLOG)
+
+        while True:
+            conn, addr = server.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            # Un hilo por conexión persistente para no bloquear a las demás
+            threading.Thread(
+                target=serve_connection,
+                args=(conn, addr),
+                daemon=True
+            ).start()
+
+
+if __name__ == "__main__":
+    main()